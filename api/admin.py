@@ -3,6 +3,7 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import Profile, Player, Team, Tournament, Round, Match, Event, Kozlemeny, Szankcio
+from .jegyzokonyv import refresh_jegyzokonyv_snapshots
 
 # Admin Site Customization
 admin.site.site_header = "Foci Liga Adminisztráció"
@@ -91,11 +92,24 @@ class RoundAdmin(admin.ModelAdmin):
         return obj.match_set.count()
     get_matches_count.short_description = 'Matches'
 
+class EventInline(admin.TabularInline):
+    model = Event
+    fk_name = 'match'
+    extra = 0
+    raw_id_fields = ('player',)
+
 class MatchAdmin(admin.ModelAdmin):
     list_display = ('get_match_title', 'datetime', 'tournament', 'round_obj', 'get_score', 'get_status_display', 'referee')
-    list_filter = ('tournament', 'round_obj', 'datetime', 'status')
+    list_filter = ('tournament', 'round_obj', 'datetime', 'status', 'phase')
     search_fields = ('team1__name', 'team2__name', 'tournament__name')
-    filter_horizontal = ('events',)
+    inlines = [EventInline]
+    readonly_fields = ('phase', 'phase_version')
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Events may have been added or removed by hand, keep the phase in sync
+        form.instance.refresh_phase()
+        refresh_jegyzokonyv_snapshots([form.instance.id])
     
     def get_match_title(self, obj):
         return f"{obj.team1} vs {obj.team2}"
@@ -117,9 +131,10 @@ class MatchAdmin(admin.ModelAdmin):
     get_status_display.short_description = 'Status'
 
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('event_type', 'player', 'minute', 'extra_time', 'exact_time')
+    list_display = ('event_type', 'match', 'player', 'minute', 'extra_time', 'exact_time')
     list_filter = ('event_type', 'exact_time')
     search_fields = ('player__name',)
+    raw_id_fields = ('match',)
 
 class KozlemenyAdmin(admin.ModelAdmin):
     list_display = ('title', 'get_priority_display', 'active', 'author', 'date_created', 'date_updated')
@@ -3,62 +3,87 @@ from .models import *
 from django.contrib.auth.models import User
 from .schemas import *
 from django.shortcuts import get_object_or_404
-from django.db import models
-from .utils import process_matches, get_goal_scorers, get_latest_tournament
+from django.db import models, transaction
+from .utils import process_matches, get_goal_scorers, get_latest_tournament, aprocess_matches, aget_latest_tournament
+from .public_reads import (
+    aget_tournament_matches, aget_tournament_teams, aget_tournament_top_scorers, aget_assigned_matches, CANCELLED_MATCH,
+    with_match_relations, get_events_of_matches, team_to_extended_schema, teams_to_extended_schema,
+    players_to_extended_schema, match_statuses,
+)
 from .referee_utils import (
     get_match_status, validate_event_data, get_half_time_score, 
     get_match_timeline, get_player_statistics, get_team_statistics,
     can_referee_edit_match, format_match_time, get_current_match_minute,
-    get_current_extra_time, get_first_half_end_minute, get_second_half_start_minute, get_match_end_minute
+    get_current_extra_time, get_first_half_end_minute, get_second_half_start_minute, get_match_end_minute,
+    get_clock_anchors, compute_match_minute, get_cached_match_roster, get_match_player, validate_event_batch,
+    get_undoable_events_analysis, get_match_statistics_summary, get_match_scores, local_date, iter_match_timelines
 )
+import io
+import json
+import zipfile
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.contrib.auth import authenticate
-from django.http import JsonResponse
-from .auth import JWTAuth, jwt_auth, jwt_cookie_auth, admin_auth, biro_auth
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.text import slugify
+from django.core.cache import cache
+from django.conf import settings
+from .auth import JWTAuth, jwt_auth, jwt_cookie_auth, admin_auth, biro_auth, async_biro_auth, get_request_token, token_cache
+from .timesync import resolve_event_time
+from .idempotency import idempotent
+from .write_coordinator import serialize_match_writes
+from .query_budget import query_budget
+from .throttling import check_login_throttle, reset_username_throttle, get_throttle_counters
+from .auth_tracing import auth_tracer
+from .jegyzokonyv import (
+    get_jegyzokonyv_payload, get_jegyzokonyv_payloads, with_jegyzokonyv_relations, jegyzokonyv_digest,
+    render_jegyzokonyv, render_jegyzokonyv_bulk, pdf_rendering_available, refresh_jegyzokonyv_snapshots, RENDER_CONTENT_TYPES,
+)
 
 
-def event_to_response_schema(event) -> EventResponseSchema:
-    """Convert Event object to EventResponseSchema with formatted time"""
-    formatted_time = f"{event.minute}+{event.minute_extra_time}'" if event.minute_extra_time else f"{event.minute}'"
-    
-    return EventResponseSchema(
-        id=event.id,
-        event_type=event.event_type,
-        half=event.half,
-        minute=event.minute,
-        minute_extra_time=event.minute_extra_time,
-        formatted_time=formatted_time,
-        exact_time=event.exact_time.isoformat() if event.exact_time else None,
-        player=PlayerSchema.from_orm(event.player) if event.player else None,
-        extra_time=event.extra_time
-    )
+def pop_expected_version(request, update_data) -> int | None:
+    """
+    Get the version an edit is based on, from the payload's version field or an If-Match header.
+    Returns None for unconditional edits.
+    """
+    version = update_data.pop('version', None)
+    if version is None:
+        if_match = request.headers.get('If-Match', '').strip().removeprefix('W/').strip('"')
+        if if_match.isdigit():
+            version = int(if_match)
+    return version
+
+
+def save_versioned(instance, expected_version, update_fields) -> bool:
+    """
+    Save the edited fields of a Match or Event, refusing the write if expected_version is set and no longer current.
+    Only update_fields (and the version) are written, so e.g. a match's phase advanced meanwhile is kept.
+    """
+    if expected_version is None:
+        instance.save(update_fields=update_fields)
+        return True
+    return instance.save_if_version(expected_version, update_fields=update_fields)
+
+
+# Largest number of matches /matches/timelines serves in one request
+MAX_TIMELINE_MATCHES = 200
 
 
-def match_to_schema(match) -> dict:
-    """Convert Match object to MatchSchema dict with properly formatted events"""
-    # Convert match to dict first, excluding problematic related fields
-    match_dict = {
-        'id': match.id,
-        'team1': match.team1,
-        'team2': match.team2,
-        'tournament': match.tournament,
-        'round_obj': match.round_obj,
-        'referee': match.referee,
-        'datetime': match.datetime,
-        'status': match.status if match.status else 'active',
-        'events': [event_to_response_schema(event) for event in match.events.all()],
-        'photos': list(match.photos.all()) if hasattr(match, 'photos') else []
-    }
+def timelines_ndjson_response(matches):
+    """Stream the timelines of the matches as NDJSON, one {"match_id", "timeline"} line per match"""
+    def lines():
+        for match, timeline in iter_match_timelines(matches):
+            yield json.dumps({'match_id': match.id, 'timeline': timeline}) + '\n'
     
-    # Use MatchSchema to validate and serialize
-    match_schema = MatchSchema.model_validate(match_dict)
-    return match_schema.model_dump()
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
 
 
-def matches_to_schema_list(matches) -> list:
-    """Convert Match queryset to list of MatchSchema dicts with properly formatted events"""
-    return [match_to_schema(match) for match in matches]
+def version_conflict_response(instance):
+    current_version = type(instance).objects.filter(pk=instance.pk).values_list('version', flat=True).first()
+    return JsonResponse({
+        'error': f'{type(instance).__name__} was modified by another request, reload it and try again',
+        'current_version': current_version
+    }, status=409)
 
 
 app = NinjaAPI(csrf=False)  # Disable CSRF for API since we use JWT
@@ -71,7 +96,29 @@ app.add_router("/biro", biro_router)
 
 # Authentication endpoints
 
+def set_auth_cookies(response, tokens):
+    """Set the HTTP-only access and refresh token cookies"""
+    response.set_cookie(
+        'auth_token',
+        tokens['token'],
+        max_age=settings.JWT_ACCESS_TOKEN_LIFETIME,  # same as JWT expiry
+        httponly=True,     # Prevent XSS attacks
+        secure=False,      # Set to True in production with HTTPS
+        samesite='Lax',    # CSRF protection
+        path='/'           # Available for entire site
+    )
+    response.set_cookie(
+        'refresh_token',
+        tokens['refresh_token'],
+        max_age=settings.JWT_REFRESH_TOKEN_LIFETIME,
+        httponly=True,
+        secure=False,
+        samesite='Lax',
+        path='/api/auth/'  # Only sent to the refresh and logout endpoints
+    )
+
 @router.post("/auth/login")
+@query_budget(3)
 def login(request, payload: LoginSchema):
     """
     Login endpoint that validates credentials and returns JWT token
@@ -79,13 +126,27 @@ def login(request, payload: LoginSchema):
     username = payload.username
     password = payload.password
     
+    # Reject floods before authenticate() spends CPU on hashing the password
+    retry_after = check_login_throttle(request, username)
+    if retry_after is not None:
+        response = JsonResponse({
+            "success": False,
+            "message": "Too many login attempts, try again later",
+            "user": None,
+            "token": None
+        }, status=429)
+        response['Retry-After'] = str(int(retry_after) + 1)
+        return response
+    
     # Authenticate user
     user = authenticate(username=username, password=password)
     
     if user is not None:
         if user.is_active:
-            # Generate JWT token
-            token = JWTAuth.encode_token(user.id, user.username)
+            reset_username_throttle(request, username)
+            
+            # Generate short-lived access token and refresh token
+            tokens = JWTAuth.issue_token_pair(user)
             
             # Create response
             response_data = {
@@ -100,21 +161,14 @@ def login(request, payload: LoginSchema):
                     "is_staff": user.is_staff,
                     "is_active": user.is_active
                 },
-                "token": token
+                "token": tokens['token'],
+                "refresh_token": tokens['refresh_token']
             }
             
             response = JsonResponse(response_data)
             
-            # Set HTTP-only cookie for enhanced security
-            response.set_cookie(
-                'auth_token',
-                token,
-                max_age=24*60*60,  # 24 hours (same as JWT expiry)
-                httponly=True,     # Prevent XSS attacks
-                secure=False,      # Set to True in production with HTTPS
-                samesite='Lax',    # CSRF protection
-                path='/'           # Available for entire site
-            )
+            # Set HTTP-only cookies for enhanced security
+            set_auth_cookies(response, tokens)
             
             return response
         else:
@@ -133,10 +187,18 @@ def login(request, payload: LoginSchema):
         })
 
 @router.post("/auth/logout")
+@query_budget(3)
 def logout(request):
     """
-    Logout endpoint - deletes HTTP-only authentication cookies
+    Logout endpoint - revokes the tokens and deletes HTTP-only authentication cookies
     """
+    token = get_request_token(request)
+    if token:
+        JWTAuth.revoke_token(token)
+    refresh_token = request.COOKIES.get('refresh_token')
+    if refresh_token:
+        JWTAuth.revoke_token(refresh_token)
+    
     response = JsonResponse({
         "success": True,
         "message": "Logout successful"
@@ -149,10 +211,45 @@ def logout(request):
         domain=None,  # Will use current domain
         samesite='Lax'  # or 'Strict' depending on your security requirements
     )
+    response.delete_cookie('refresh_token', path='/api/auth/', samesite='Lax')
+    
+    return response
+
+@router.post("/auth/refresh")
+@query_budget(3)
+def refresh_tokens(request):
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    The refresh token is read from a {"refresh_token": ...} JSON body, or from the
+    refresh_token cookie without one. Each refresh token can be used only once.
+    """
+    refresh_token = request.COOKIES.get('refresh_token')
+    if request.content_type == 'application/json' and request.body:
+        try:
+            refresh_token = json.loads(request.body).get('refresh_token') or refresh_token
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    result = JWTAuth.rotate_refresh_token(refresh_token) if refresh_token else None
+    if result is None:
+        return JsonResponse({
+            "success": False,
+            "message": "Invalid or expired refresh token",
+            "token": None,
+            "refresh_token": None
+        }, status=401)
     
+    user, tokens = result
+    response = JsonResponse({
+        "success": True,
+        "message": "Token refreshed",
+        "token": tokens['token'],
+        "refresh_token": tokens['refresh_token']
+    })
+    set_auth_cookies(response, tokens)
     return response
 
 @router.get("/auth/status", response=AuthStatusSchema, auth=jwt_cookie_auth)
+@query_budget(1)
 def auth_status(request):
     """
     Check authentication status of current user
@@ -164,27 +261,32 @@ def auth_status(request):
 
 # Felhasználók
 @router.get("/users/{user_id}", response=UserSchema)
+@query_budget(1)
 def get_user(request, user_id: int):
     return get_object_or_404(User, id=user_id)
 
 # Minden bajnokság lekérdezése
 @router.get("/tournaments", response=list[TournamentSchema])
+@query_budget(1)
 def get_tournaments(request):
     return Tournament.objects.all()
 
 # Bajnokság lekérdezése
-@router.get("/tournaments/{tournament_id}", response=TournamentSchema)
+@router.get("/tournaments/{int:tournament_id}", response=TournamentSchema)
+@query_budget(1)
 def get_tournament(request, tournament_id: int):
     device = get_object_or_404(Tournament, id=tournament_id)
     return device
 
 # Aktuális (legújabb) bajnokság
 @router.get("/tournament/current", response=TournamentSchema)
+@query_budget(1)
 def get_current_tournament(request):
     return get_latest_tournament()
 
 # Regisztrációra nyitott bajnokságok
 @router.get("/tournaments/open-for-registration", response=list[TournamentSchema])
+@query_budget(1)
 def get_open_tournaments(request):
     return Tournament.objects.filter(registration_open=True)
 
@@ -248,124 +350,72 @@ def get_open_tournaments(request):
 
 # Bajnokság állása (legújabb bajnokság)
 @router.get("/standings", response=list[StandingSchema])
-def get_standings(request):
-    tournament = get_latest_tournament()
-    return process_matches(tournament)
+@query_budget(5)
+async def get_standings(request):
+    tournament = await aget_latest_tournament()
+    return await aprocess_matches(tournament)
 
 # Bajnokság meccsei (legújabb bajnokság)  
 @router.get("/matches", response=list[MatchSchema])
-def get_matches(request):
-    tournament = get_latest_tournament()
-    # Include all matches (including cancelled) for display purposes
-    matches = Match.objects.filter(tournament=tournament).prefetch_related('events', 'events__player')
-    return matches_to_schema_list(matches)
+@query_budget(7)
+async def get_matches(request):
+    tournament = await aget_latest_tournament()
+    return await aget_tournament_matches(tournament)
 
 # Bajnokság csapatai (legújabb bajnokság)
 @router.get("/teams", response=list[TeamExtendedSchema])
-def get_teams(request):
-    tournament = get_latest_tournament()
-    teams = Team.objects.filter(tournament=tournament)
-    return [
-        TeamExtendedSchema(
-            id=team.id,
-            name=team.name,
-            start_year=team.start_year,
-            tagozat=team.tagozat,
-            color=team.get_team_color(),
-            logo_url=team.logo_url,
-            active=team.active,
-            players=[
-                PlayerExtendedSchema(
-                    id=player.id,
-                    name=player.name,
-                    csk=player.csk,
-                    start_year=player.start_year,
-                    tagozat=player.tagozat,
-                    effective_start_year=player.get_start_year(),
-                    effective_tagozat=player.get_tagozat()
-                ) for player in team.players.all()
-            ]
-        ) for team in teams
-    ]
+@query_budget(4)
+async def get_teams(request):
+    tournament = await aget_latest_tournament()
+    return await aget_tournament_teams(tournament)
 
 # Csapat lekérdezése (legújabb bajnokságból)
-@router.get("/teams/{team_id}", response=TeamExtendedSchema)  
+@router.get("/teams/{int:team_id}", response=TeamExtendedSchema)  
+@query_budget(5)
 def get_team(request, team_id: int):
     tournament = get_latest_tournament()
     team = get_object_or_404(Team, id=team_id, tournament=tournament)
-    return TeamExtendedSchema(
-        id=team.id,
-        name=team.name,
-        start_year=team.start_year,
-        tagozat=team.tagozat,
-        color=team.get_team_color(),
-        logo_url=team.logo_url,
-        active=team.active,
-        players=[
-            PlayerExtendedSchema(
-                id=player.id,
-                name=player.name,
-                csk=player.csk,
-                start_year=player.start_year,
-                tagozat=player.tagozat,
-                effective_start_year=player.get_start_year(),
-                effective_tagozat=player.get_tagozat()
-            ) for player in team.players.all()
-        ]
-    )
+    return team_to_extended_schema(team)
 
 # Csapat játékosai (legújabb bajnokság)
 @router.get("/teams/{team_id}/players", response=list[PlayerExtendedSchema])
+@query_budget(4)
 def get_team_players(request, team_id: int):
     tournament = get_latest_tournament()
     team = get_object_or_404(Team, id=team_id, tournament=tournament)
     players = team.players.all()
-    return [
-        PlayerExtendedSchema(
-            id=player.id,
-            name=player.name,
-            csk=player.csk,
-            start_year=player.start_year,
-            tagozat=player.tagozat,
-            effective_start_year=player.get_start_year(),
-            effective_tagozat=player.get_tagozat()
-        ) for player in players
-    ]
+    return players_to_extended_schema(players)
 
 
 # Csapat meccsei (legújabb bajnokság)
 @router.get("/teams/{team_id}/matches", response=list[MatchSchema])
+@query_budget(8)
 def get_team_matches(request, team_id: int):
     tournament = get_latest_tournament()
     team = get_object_or_404(Team, id=team_id, tournament=tournament)
     # Include all matches (including cancelled) for display purposes
     matches = Match.objects.filter(tournament=tournament).filter(
         models.Q(team1=team) | models.Q(team2=team)
-    ).prefetch_related('events', 'events__player')
-    return matches_to_schema_list(matches)
+    )
+    return matches_to_schema_list(with_match_relations(matches))
 
 # Góllövők (legújabb bajnokság)
 @router.get("/topscorers", response=list[TopScorerSchema])
-def get_top_scorers(request):
-    tournament = get_latest_tournament()
-    # Exclude cancelled matches from top scorers stats
-    matches = Match.objects.filter(tournament=tournament).exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    # Get all goal events from all matches in the tournament
-    goals = []
-    for match in matches:
-        goals.extend(match.events.filter(event_type='goal'))
-    return get_goal_scorers(goals)
+@query_budget(3)
+async def get_top_scorers(request):
+    tournament = await aget_latest_tournament()
+    return await aget_tournament_top_scorers(tournament)
 
 # Fordulók (legújabb bajnokság)
 @router.get("/rounds", response=list[RoundSchema])
+@query_budget(4)
 def get_rounds(request):
     tournament = get_latest_tournament()
     return Round.objects.filter(tournament=tournament).order_by('number')
 
 # Forduló lekérdezése szám szerint (legújabb bajnokság)
 @router.get("/rounds/{round_number}", response=RoundSchema)
+@query_budget(3)
 def get_round(request, round_number: int):
     tournament = get_latest_tournament()
     round_obj = get_object_or_404(Round, tournament=tournament, number=round_number)
@@ -373,70 +423,62 @@ def get_round(request, round_number: int):
 
 # Forduló meccsei (legújabb bajnokság)
 @router.get("/rounds/{round_number}/matches", response=list[MatchSchema])
+@query_budget(8)
 def get_round_matches(request, round_number: int):
     tournament = get_latest_tournament()
     round_obj = get_object_or_404(Round, tournament=tournament, number=round_number)
-    matches = Match.objects.filter(round_obj=round_obj).prefetch_related('events', 'events__player')
-    return matches_to_schema_list(matches)
+    matches = Match.objects.filter(round_obj=round_obj)
+    return matches_to_schema_list(with_match_relations(matches))
+
+# Forduló összes meccsének eseménysora (NDJSON)
+@router.get("/rounds/{round_number}/timelines")
+@query_budget(5)
+def get_round_timelines(request, round_number: int):
+    """
+    Stream the timelines of every match in the round as NDJSON, one line per match
+    """
+    tournament = get_latest_tournament()
+    round_obj = get_object_or_404(Round, tournament=tournament, number=round_number)
+    return timelines_ndjson_response(list(Match.objects.filter(round_obj=round_obj)))
     
 # Összes gól (legújabb bajnokság)
 @router.get("/goals", response=list[EventSchema])
+@query_budget(2)
 def get_goals(request):
     tournament = get_latest_tournament()
     # Exclude cancelled matches from goal stats
-    matches = Match.objects.filter(tournament=tournament).exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    goals = []
-    for match in matches:
-        goals.extend(match.events.filter(event_type='goal'))
-    return goals
+    matches = Match.objects.filter(tournament=tournament).exclude(CANCELLED_MATCH)
+    return get_events_of_matches(matches, event_type='goal')
 
 # Összes sárga lap (legújabb bajnokság)
 @router.get("/yellow_cards", response=list[EventSchema])
+@query_budget(2)
 def get_yellow_cards(request):
     tournament = get_latest_tournament()
     # Exclude cancelled matches from card stats
-    matches = Match.objects.filter(tournament=tournament).exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    yellow_cards = []
-    for match in matches:
-        yellow_cards.extend(match.events.filter(event_type='yellow_card'))
-    return yellow_cards
+    matches = Match.objects.filter(tournament=tournament).exclude(CANCELLED_MATCH)
+    return get_events_of_matches(matches, event_type='yellow_card')
 
 # Összes piros lap (legújabb bajnokság)
 @router.get("/red_cards", response=list[EventSchema])
+@query_budget(2)
 def get_red_cards(request):
     tournament = get_latest_tournament()
     # Exclude cancelled matches from card stats
-    matches = Match.objects.filter(tournament=tournament).exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    red_cards = []
-    for match in matches:
-        red_cards.extend(match.events.filter(event_type='red_card'))
-    return red_cards
+    matches = Match.objects.filter(tournament=tournament).exclude(CANCELLED_MATCH)
+    return get_events_of_matches(matches, event_type='red_card')
 
 # Összes játékos (legújabb bajnokság)
 @router.get("/players", response=list[PlayerExtendedSchema])
+@query_budget(3)
 def get_players(request):
     tournament = get_latest_tournament()
     players = Player.objects.filter(team__tournament=tournament)
-    return [
-        PlayerExtendedSchema(
-            id=player.id,
-            name=player.name,
-            csk=player.csk,
-            start_year=player.start_year,
-            tagozat=player.tagozat,
-            effective_start_year=player.get_start_year(),
-            effective_tagozat=player.get_tagozat()
-        ) for player in players
-    ]
+    return players_to_extended_schema(players)
 
 # Játékos lekérdezése (legújabb bajnokság)
-@router.get("/players/{player_id}", response=PlayerExtendedSchema)
+@router.get("/players/{int:player_id}", response=PlayerExtendedSchema)
+@query_budget(4)
 def get_player(request, player_id: int):
     tournament = get_latest_tournament()
     player = get_object_or_404(Player, id=player_id, team__tournament=tournament)
@@ -452,132 +494,51 @@ def get_player(request, player_id: int):
 
 # Játékos eventjei (legújabb bajnokság)
 @router.get("/players/{player_id}/events", response=AllEventsSchema)
+@query_budget(3)
 def get_player_events(request, player_id: int):
     tournament = get_latest_tournament()
     player = get_object_or_404(Player, id=player_id, team__tournament=tournament)
     # Exclude cancelled matches from player event stats
-    matches = Match.objects.filter(tournament=tournament).exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
+    matches = Match.objects.filter(tournament=tournament).exclude(CANCELLED_MATCH)
     # Get all events for this player from tournament matches
-    all_events = []
-    for match in matches:
-        all_events.extend(match.events.filter(player=player))
+    all_events = get_events_of_matches(matches, player=player)
 
     return AllEventsSchema(
-        goals=[event for event in all_events if event.event_type == "goal"],
-        yellow_cards=[event for event in all_events if event.event_type == "yellow_card"],
-        red_cards=[event for event in all_events if event.event_type == "red_card"],
+        goals=[event_to_response_schema(event) for event in all_events if event.event_type == "goal"],
+        yellow_cards=[event_to_response_schema(event) for event in all_events if event.event_type == "yellow_card"],
+        red_cards=[event_to_response_schema(event) for event in all_events if event.event_type == "red_card"],
     )
  
 
 # Minden csapat lekérdezése (minden bajnokságból) - admin use
 @admin_router.get("/teams/all", response=list[TeamExtendedSchema], auth=admin_auth)
+@query_budget(4)
 def get_all_teams(request):
     teams = Team.objects.all()
-    return [
-        TeamExtendedSchema(
-            id=team.id,
-            name=team.name,
-            start_year=team.start_year,
-            tagozat=team.tagozat,
-            color=team.get_team_color(),
-            logo_url=team.logo_url,
-            active=team.active,
-            players=[
-                PlayerExtendedSchema(
-                    id=player.id,
-                    name=player.name,
-                    csk=player.csk,
-                    start_year=player.start_year,
-                    tagozat=player.tagozat,
-                    effective_start_year=player.get_start_year(),
-                    effective_tagozat=player.get_tagozat()
-                ) for player in team.players.all()
-            ]
-        ) for team in teams
-    ]
+    return teams_to_extended_schema(teams)
 
 # Csapat lekérdezése (admin - bármely bajnokságból)
 @admin_router.get("/teams/{team_id}", response=TeamExtendedSchema, auth=admin_auth)
+@query_budget(5)
 def get_any_team(request, team_id: int):
     team = get_object_or_404(Team, id=team_id)
-    return TeamExtendedSchema(
-        id=team.id,
-        name=team.name,
-        start_year=team.start_year,
-        tagozat=team.tagozat,
-        color=team.get_team_color(),
-        logo_url=team.logo_url,
-        active=team.active,
-        players=[
-            PlayerExtendedSchema(
-                id=player.id,
-                name=player.name,
-                csk=player.csk,
-                start_year=player.start_year,
-                tagozat=player.tagozat,
-                effective_start_year=player.get_start_year(),
-                effective_tagozat=player.get_tagozat()
-            ) for player in team.players.all()
-        ]
-    )
+    return team_to_extended_schema(team)
 
 # Aktív csapatok lekérdezése (legújabb bajnokság)
 @router.get("/teams/active", response=list[TeamExtendedSchema])
+@query_budget(4)
 def get_active_teams(request):
     tournament = get_latest_tournament()
     teams = Team.objects.filter(active=True, tournament=tournament)
-    return [
-        TeamExtendedSchema(
-            id=team.id,
-            name=team.name,
-            start_year=team.start_year,
-            tagozat=team.tagozat,
-            color=team.get_team_color(),
-            logo_url=team.logo_url,
-            active=team.active,
-            players=[
-                PlayerExtendedSchema(
-                    id=player.id,
-                    name=player.name,
-                    csk=player.csk,
-                    start_year=player.start_year,
-                    tagozat=player.tagozat,
-                    effective_start_year=player.get_start_year(),
-                    effective_tagozat=player.get_tagozat()
-                ) for player in team.players.all()
-            ]
-        ) for team in teams
-    ]
+    return teams_to_extended_schema(teams)
 
 # Inaktív csapatok lekérdezése (legújabb bajnokság)
 @router.get("/teams/inactive", response=list[TeamExtendedSchema])
+@query_budget(4)
 def get_inactive_teams(request):
     tournament = get_latest_tournament()
     teams = Team.objects.filter(active=False, tournament=tournament)
-    return [
-        TeamExtendedSchema(
-            id=team.id,
-            name=team.name,
-            start_year=team.start_year,
-            tagozat=team.tagozat,
-            color=team.get_team_color(),
-            logo_url=team.logo_url,
-            active=team.active,
-            players=[
-                PlayerExtendedSchema(
-                    id=player.id,
-                    name=player.name,
-                    csk=player.csk,
-                    start_year=player.start_year,
-                    tagozat=player.tagozat,
-                    effective_start_year=player.get_start_year(),
-                    effective_tagozat=player.get_tagozat()
-                ) for player in team.players.all()
-            ]
-        ) for team in teams
-    ]
+    return teams_to_extended_schema(teams)
 
 # Új csapat létrehozása (legújabb bajnokság)
 # @router.post("/teams", response=TeamExtendedSchema)
@@ -673,62 +634,42 @@ def get_inactive_teams(request):
 
 # Csapat eventjei (legújabb bajnokság)
 @router.get("/teams/{team_id}/events", response=AllEventsSchema)
+@query_budget(3)
 def get_team_events(request, team_id: int):
     tournament = get_latest_tournament()
     team = get_object_or_404(Team, id=team_id, tournament=tournament)
     # Exclude cancelled matches from team event stats
     matches = Match.objects.filter(tournament=tournament).filter(
         models.Q(team1=team) | models.Q(team2=team)
-    ).exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
+    ).exclude(CANCELLED_MATCH)
     # Get all events from matches this team played in
-    all_events = []
-    for match in matches:
-        all_events.extend(match.events.all())
+    all_events = get_events_of_matches(matches)
 
     return AllEventsSchema(
-        goals=[event for event in all_events if event.event_type == "goal"],
-        yellow_cards=[event for event in all_events if event.event_type == "yellow_card"],
-        red_cards=[event for event in all_events if event.event_type == "red_card"],
+        goals=[event_to_response_schema(event) for event in all_events if event.event_type == "goal"],
+        yellow_cards=[event_to_response_schema(event) for event in all_events if event.event_type == "yellow_card"],
+        red_cards=[event_to_response_schema(event) for event in all_events if event.event_type == "red_card"],
     )  
 
 # Csapat játékosai (admin - bármely bajnokságból)
 @admin_router.get("/teams/{team_id}/players", response=list[PlayerExtendedSchema], auth=admin_auth)
+@query_budget(4)
 def get_any_team_players(request, team_id: int):
     team = get_object_or_404(Team, id=team_id)
     players = team.players.all()
-    return [
-        PlayerExtendedSchema(
-            id=player.id,
-            name=player.name,
-            csk=player.csk,
-            start_year=player.start_year,
-            tagozat=player.tagozat,
-            effective_start_year=player.get_start_year(),
-            effective_tagozat=player.get_tagozat()
-        ) for player in players
-    ]
+    return players_to_extended_schema(players)
 
 
 # Minden player lekérdezése (admin - minden bajnokságból)
 @admin_router.get("/players/all", response=list[PlayerExtendedSchema], auth=admin_auth)
+@query_budget(3)
 def get_all_players(request):
     players = Player.objects.all()
-    return [
-        PlayerExtendedSchema(
-            id=player.id,
-            name=player.name,
-            csk=player.csk,
-            start_year=player.start_year,
-            tagozat=player.tagozat,
-            effective_start_year=player.get_start_year(),
-            effective_tagozat=player.get_tagozat()
-        ) for player in players
-    ]
+    return players_to_extended_schema(players)
 
 # Player lekérdezése (admin - bármely bajnokságból)
 @admin_router.get("/players/{player_id}", response=PlayerExtendedSchema, auth=admin_auth)
+@query_budget(4)
 def get_any_player(request, player_id: int):
     player = get_object_or_404(Player, id=player_id)
     return PlayerExtendedSchema(
@@ -743,63 +684,55 @@ def get_any_player(request, player_id: int):
 
 # Csapatkapitányok lekérdezése
 @router.get("/players/captains", response=list[PlayerExtendedSchema])
+@query_budget(2)
 def get_captains(request):
     players = Player.objects.filter(csk=True)
-    return [
-        PlayerExtendedSchema(
-            id=player.id,
-            name=player.name,
-            csk=player.csk,
-            start_year=player.start_year,
-            tagozat=player.tagozat,
-            effective_start_year=player.get_start_year(),
-            effective_tagozat=player.get_tagozat()
-        ) for player in players
-    ]
+    return players_to_extended_schema(players)
 
 # Player összes eventje (admin - minden bajnokságból)
 @admin_router.get("/players/{player_id}/events", response=AllEventsSchema, auth=admin_auth)
+@query_budget(3)
 def get_all_player_events(request, player_id: int):
     player = get_object_or_404(Player, id=player_id)
     # Get all events for this player from all non-cancelled matches
-    all_events = []
-    all_matches = Match.objects.all().exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    for match in all_matches:
-        all_events.extend(match.events.filter(player=player))
+    all_matches = Match.objects.all().exclude(CANCELLED_MATCH)
+    all_events = get_events_of_matches(all_matches, player=player)
 
     return AllEventsSchema(
-        goals=[event for event in all_events if event.event_type == "goal"],
-        yellow_cards=[event for event in all_events if event.event_type == "yellow_card"],
-        red_cards=[event for event in all_events if event.event_type == "red_card"],
+        goals=[event_to_response_schema(event) for event in all_events if event.event_type == "goal"],
+        yellow_cards=[event_to_response_schema(event) for event in all_events if event.event_type == "yellow_card"],
+        red_cards=[event_to_response_schema(event) for event in all_events if event.event_type == "red_card"],
     )
 
 # Minden profil lekérdezése
 @router.get("/profiles", response=list[ProfileSchema])
+@query_budget(1)
 def get_profiles(request):
-    return Profile.objects.all()
+    return Profile.objects.select_related('user', 'player')
 
 # Profil lekérdezése
-@router.get("/profiles/{profile_id}", response=ProfileSchema)
+@router.get("/profiles/{int:profile_id}", response=ProfileSchema)
+@query_budget(2)
 def get_profile(request, profile_id: int):
     profile = get_object_or_404(Profile, id=profile_id)
     return profile
 
 # Bírói profilok lekérdezése
 @router.get("/profiles/referees", response=list[ProfileSchema])
+@query_budget(1)
 def get_referee_profiles(request):
-    return Profile.objects.filter(biro=True)
+    return Profile.objects.filter(biro=True).select_related('user', 'player')
 
 
 # Minden meccs lekérdezése (admin - minden bajnokságból)
 @admin_router.get("/matches/all", response=list[MatchSchema], auth=admin_auth)
+@query_budget(7)
 def get_all_matches(request):
-    matches = Match.objects.all().prefetch_related('events', 'events__player')
-    return matches_to_schema_list(matches)
+    return matches_to_schema_list(with_match_relations(Match.objects.all()))
 
 # Update match (admin)
 @admin_router.put("/matches/{match_id}", response=MatchSchema, auth=admin_auth)
+@query_budget(19)
 def update_match_admin(request, match_id: int, payload: MatchUpdateSchema):
     """
     Update match details including datetime, referee, and status (admin only)
@@ -807,12 +740,16 @@ def update_match_admin(request, match_id: int, payload: MatchUpdateSchema):
     match = get_object_or_404(Match, id=match_id)
     
     update_data = payload.dict(exclude_unset=True)
+    expected_version = pop_expected_version(request, update_data)
+    
+    updated_fields = []
     
     # Handle datetime update
     if 'datetime' in update_data and update_data['datetime']:
         from datetime import datetime as dt
         match.datetime = dt.fromisoformat(update_data['datetime'].replace('Z', '+00:00'))
-        del update_data['datetime']
+        updated_fields.append('datetime')
+    update_data.pop('datetime', None)
     
     # Handle referee update
     if 'referee_id' in update_data:
@@ -821,6 +758,7 @@ def update_match_admin(request, match_id: int, payload: MatchUpdateSchema):
             match.referee = referee
         else:
             match.referee = None
+        updated_fields.append('referee')
         del update_data['referee_id']
     
     # Handle status update
@@ -829,18 +767,22 @@ def update_match_admin(request, match_id: int, payload: MatchUpdateSchema):
         if update_data['status'] not in valid_statuses and update_data['status'] is not None:
             return JsonResponse({'error': 'Invalid status value'}, status=400)
         match.status = update_data['status']
+        updated_fields.append('status')
         del update_data['status']
     
     # Update any remaining fields
     for field, value in update_data.items():
         setattr(match, field, value)
+        updated_fields.append(field)
     
-    match.save()
+    if not save_versioned(match, expected_version, updated_fields):
+        return version_conflict_response(match)
     
     return match_to_schema(match)
 
 # Patch match (admin)
 @admin_router.patch("/matches/{match_id}", response=MatchSchema, auth=admin_auth)
+@query_budget(19)
 def patch_match_admin(request, match_id: int, payload: MatchUpdateSchema):
     """
     Partially update match details (admin only)
@@ -848,12 +790,16 @@ def patch_match_admin(request, match_id: int, payload: MatchUpdateSchema):
     match = get_object_or_404(Match, id=match_id)
     
     update_data = payload.dict(exclude_unset=True)
+    expected_version = pop_expected_version(request, update_data)
+    
+    updated_fields = []
     
     # Handle datetime update
     if 'datetime' in update_data and update_data['datetime']:
         from datetime import datetime as dt
         match.datetime = dt.fromisoformat(update_data['datetime'].replace('Z', '+00:00'))
-        del update_data['datetime']
+        updated_fields.append('datetime')
+    update_data.pop('datetime', None)
     
     # Handle referee update
     if 'referee_id' in update_data:
@@ -862,6 +808,7 @@ def patch_match_admin(request, match_id: int, payload: MatchUpdateSchema):
             match.referee = referee
         else:
             match.referee = None
+        updated_fields.append('referee')
         del update_data['referee_id']
     
     # Handle status update
@@ -870,18 +817,22 @@ def patch_match_admin(request, match_id: int, payload: MatchUpdateSchema):
         if update_data['status'] not in valid_statuses and update_data['status'] is not None:
             return JsonResponse({'error': 'Invalid status value'}, status=400)
         match.status = update_data['status']
+        updated_fields.append('status')
         del update_data['status']
     
     # Update any remaining fields
     for field, value in update_data.items():
         setattr(match, field, value)
+        updated_fields.append(field)
     
-    match.save()
+    if not save_versioned(match, expected_version, updated_fields):
+        return version_conflict_response(match)
     
     return match_to_schema(match)
 
 # Get match status choices
 @router.get("/match-status-choices")
+@query_budget(0)
 def get_match_status_choices(request):
     """
     Get available match status choices
@@ -893,33 +844,48 @@ def get_match_status_choices(request):
         ]
     })
 
+# Több meccs eseménysora (NDJSON)
+@router.get("/matches/timelines")
+@query_budget(3)
+def get_matches_timelines(request, ids: str):
+    """
+    Stream the timelines of the given matches (ids=1,2,3) as NDJSON, one line per match
+    """
+    try:
+        match_ids = {int(match_id) for match_id in ids.split(',') if match_id.strip()}
+    except ValueError:
+        return JsonResponse({'error': 'ids must be a comma separated list of match ids'}, status=400)
+    if len(match_ids) > MAX_TIMELINE_MATCHES:
+        return JsonResponse({'error': f'At most {MAX_TIMELINE_MATCHES} matches can be requested at once'}, status=400)
+    
+    return timelines_ndjson_response(list(Match.objects.filter(id__in=match_ids)))
+
 # Meccs lekérdezése
 @router.get("/matches/{match_id}", response=MatchSchema)
+@query_budget(6)
 def get_match(request, match_id: int):
-    match = get_object_or_404(Match, id=match_id)
+    match = get_object_or_404(with_match_relations(Match.objects.all()), id=match_id)
     return match_to_schema(match)
 
 # Adott bíró meccsei
 @router.get("/profiles/{profile_id}/matches", response=list[MatchSchema])
+@query_budget(7)
 def get_referee_matches(request, profile_id: int):
     profile = get_object_or_404(Profile, id=profile_id, biro=True)
-    matches = Match.objects.filter(referee=profile).prefetch_related('events', 'events__player')
-    return matches_to_schema_list(matches)
+    matches = Match.objects.filter(referee=profile)
+    return matches_to_schema_list(with_match_relations(matches))
 
 # Minden gól lekérdezése (admin - minden bajnokságból)
 @admin_router.get("/goals/all", response=list[EventSchema], auth=admin_auth)
+@query_budget(2)
 def get_all_goals_admin(request):
     # Get goal events only from non-cancelled matches
-    non_cancelled_matches = Match.objects.exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    goals = []
-    for match in non_cancelled_matches:
-        goals.extend(match.events.filter(event_type='goal'))
-    return goals
+    non_cancelled_matches = Match.objects.exclude(CANCELLED_MATCH)
+    return get_events_of_matches(non_cancelled_matches, event_type='goal')
 
 # Gólok lekérdezése
 @router.get("/goals/{goal_id}", response=EventSchema)
+@query_budget(2)
 def get_goal(request, goal_id: int):
     goal = get_object_or_404(Event, id=goal_id)
     return goal
@@ -927,18 +893,15 @@ def get_goal(request, goal_id: int):
 
 # Sárga lapok lekérdezése (admin - minden bajnokságból)
 @admin_router.get("/yellow_cards/all", response=list[EventSchema], auth=admin_auth)
+@query_budget(2)
 def get_all_yellow_cards_admin(request):
     # Get yellow card events only from non-cancelled matches
-    non_cancelled_matches = Match.objects.exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    cards = []
-    for match in non_cancelled_matches:
-        cards.extend(match.events.filter(event_type='yellow_card'))
-    return cards
+    non_cancelled_matches = Match.objects.exclude(CANCELLED_MATCH)
+    return get_events_of_matches(non_cancelled_matches, event_type='yellow_card')
 
 # Sárga lap lekérdezése
 @router.get("/yellow_cards/{card_id}", response=EventSchema)
+@query_budget(2)
 def get_card(request, card_id: int):
     card = get_object_or_404(Event, id=card_id)
     return card
@@ -946,18 +909,15 @@ def get_card(request, card_id: int):
 
 # Piros lapok lekérdezése (admin - minden bajnokságból)
 @admin_router.get("/red_cards/all", response=list[EventSchema], auth=admin_auth)
+@query_budget(2)
 def get_all_red_cards_admin(request):
     # Get red card events only from non-cancelled matches
-    non_cancelled_matches = Match.objects.exclude(
-        models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    )
-    cards = []
-    for match in non_cancelled_matches:
-        cards.extend(match.events.filter(event_type='red_card'))
-    return cards
+    non_cancelled_matches = Match.objects.exclude(CANCELLED_MATCH)
+    return get_events_of_matches(non_cancelled_matches, event_type='red_card')
 
 # Piros lap lekérdezése
 @router.get("/red_cards/{card_id}", response=EventSchema)
+@query_budget(2)
 def get_red_card(request, card_id: int):
     card = get_object_or_404(Event, id=card_id)
     return card
@@ -965,6 +925,7 @@ def get_red_card(request, card_id: int):
 
 # Meccs gólok
 @router.get("/matches/{match_id}/goals", response=list[EventSchema])
+@query_budget(4)
 def get_match_goals(request, match_id: int):
     match = get_object_or_404(Match, id=match_id)
     match_goals = match.events.filter(event_type='goal')
@@ -972,59 +933,84 @@ def get_match_goals(request, match_id: int):
 
 # Meccs összes eventje
 @router.get("/matches/{match_id}/events", response=AllEventsSchema)
+@query_budget(5)
 def get_match_events(request, match_id: int):
     match = get_object_or_404(Match, id=match_id)
     events = match.events.all()
 
     return AllEventsSchema(
-        goals=[event for event in events if event.event_type == "goal"],
-        yellow_cards=[event for event in events if event.event_type == "yellow_card"],
-        red_cards=[event for event in events if event.event_type == "red_card"],
+        goals=[event_to_response_schema(event) for event in events if event.event_type == "goal"],
+        yellow_cards=[event_to_response_schema(event) for event in events if event.event_type == "yellow_card"],
+        red_cards=[event_to_response_schema(event) for event in events if event.event_type == "red_card"],
     )
 
 # Meccs sárga lapok
 @router.get("/matches/{match_id}/yellow_cards", response=list[EventSchema])
+@query_budget(3)
 def get_match_yellow_cards(request, match_id: int):
     match = get_object_or_404(Match, id=match_id)
     return match.events.filter(event_type='yellow_card')
 
 # Meccs piros lapok
 @router.get("/matches/{match_id}/red_cards", response=list[EventSchema])
+@query_budget(2)
 def get_match_red_cards(request, match_id: int):
     match = get_object_or_404(Match, id=match_id)
     return match.events.filter(event_type='red_card')
 
 # Minden forduló lekérdezése (admin)
 @admin_router.get("/rounds/all", response=list[RoundSchema], auth=admin_auth)
+@query_budget(4)
 def get_all_rounds(request):
     return Round.objects.all().order_by('tournament', 'number')
 
 # Forduló lekérdezése ID alapján (admin)
 @admin_router.get("/rounds/{round_id}", response=RoundSchema, auth=admin_auth)
+@query_budget(3)
 def get_round_by_id(request, round_id: int):
     round_obj = get_object_or_404(Round, id=round_id)
     return round_obj
 
+# Bejelentkezési korlátozás számlálói (admin)
+@admin_router.get("/auth/throttle", auth=admin_auth)
+@query_budget(1)
+def get_login_throttle_counters(request):
+    """Allowed / rejected login attempts per limiter, and how often the cache was unavailable"""
+    return get_throttle_counters()
+
+# Hitelesítési nyomkövetés számlálói (admin)
+@admin_router.get("/auth/trace", auth=admin_auth)
+@query_budget(1)
+def get_auth_trace(request):
+    """Token decode / verify outcome counters and latency, collected while AUTH_TRACE_ENABLED is on"""
+    return auth_tracer.snapshot()
+
 # Közlemények
 
 # Minden közlemény lekérdezése
 @router.get("/kozlemenyek", response=list[KozlemenySchema])
+@query_budget(1)
 def get_kozlemenyek(request):
-    return Kozlemeny.objects.all().order_by('-priority', '-date_created')
+    return Kozlemeny.objects.select_related('author__user', 'author__player').order_by('-priority', '-date_created')
 
 # Aktív közlemények lekérdezése
 @router.get("/kozlemenyek/active", response=list[KozlemenySchema])
+@query_budget(1)
 def get_active_kozlemenyek(request):
-    return Kozlemeny.objects.filter(active=True).order_by('-priority', '-date_created')
+    return Kozlemeny.objects.filter(active=True).select_related(
+        'author__user', 'author__player'
+    ).order_by('-priority', '-date_created')
 
 # Közlemény lekérdezése ID alapján
 @router.get("/kozlemenyek/{kozlemeny_id}", response=KozlemenySchema)
+@query_budget(3)
 def get_kozlemeny(request, kozlemeny_id: int):
     kozlemeny = get_object_or_404(Kozlemeny, id=kozlemeny_id)
     return kozlemeny
 
 # Prioritás alapján közlemények lekérdezése
 @router.get("/kozlemenyek/priority/{priority}", response=list[KozlemenySchema])
+@query_budget(3)
 def get_kozlemenyek_by_priority(request, priority: str):
     valid_priorities = ['low', 'normal', 'high', 'urgent']
     if priority not in valid_priorities:
@@ -1082,10 +1068,13 @@ def get_kozlemenyek_by_priority(request, priority: str):
 
 # Time sync endpoint for frontend synchronization
 @router.get("/time", response=TimeSyncSchema)
+@query_budget(0)
 def get_server_time(request):
     """
     Returns the current server time for frontend synchronization.
     Useful for ensuring consistent timestamps and time-based operations.
+    Referee devices should use /api/time/sync instead (see api.timesync), which
+    bypasses the middleware stack and supports an NTP-style offset estimate.
     """
     now = timezone.now()
     return TimeSyncSchema(
@@ -1098,6 +1087,7 @@ def get_server_time(request):
 
 # Get all sanctions for a specific team
 @router.get("/teams/{team_id}/sanctions", response=list[SzankcioSchema])
+@query_budget(3)
 def get_team_sanctions(request, team_id: int):
     """
     Get all sanctions for a specific team in the current tournament
@@ -1109,16 +1099,20 @@ def get_team_sanctions(request, team_id: int):
 
 # Get all sanctions in current tournament
 @router.get("/sanctions", response=list[SzankcioSchema])
+@query_budget(3)
 def get_sanctions(request):
     """
     Get all sanctions in the current tournament
     """
     tournament = get_latest_tournament()
-    sanctions = Szankcio.objects.filter(tournament=tournament).order_by('-date_created')
+    sanctions = Szankcio.objects.filter(tournament=tournament).select_related(
+        'team__tournament', 'tournament'
+    ).prefetch_related('team__players').order_by('-date_created')
     return sanctions
 
 # Get specific sanction by ID
 @router.get("/sanctions/{sanction_id}", response=SzankcioSchema)
+@query_budget(5)
 def get_sanction(request, sanction_id: int):
     """
     Get a specific sanction by ID
@@ -1131,20 +1125,24 @@ def get_sanction(request, sanction_id: int):
 # =============================================================================
 
 # Get referee's assigned matches
-@biro_router.get("/my-matches", response=list[MatchSchema], auth=biro_auth)
-def get_referee_matches(request):
+@biro_router.get("/my-matches", response=list[MatchSchema], auth=async_biro_auth)
+@query_budget(7)
+async def get_referee_matches(request):
     """
     Get all matches assigned to the current referee
+    
+    Polled by every referee's screen, so it runs on the event loop: the profile
+    comes loaded with the authenticated user.
     """
     try:
         profile = request.auth.profile
-        matches = Match.objects.filter(referee=profile).order_by('datetime').prefetch_related('events', 'events__player')
-        return matches_to_schema_list(matches)
     except AttributeError:
         return []
+    return await aget_assigned_matches(profile)
 
 # Get live matches that referee can manage
 @biro_router.get("/live-matches", response=list[MatchStatusSchema], auth=biro_auth)
+@query_budget(8)
 def get_live_matches(request):
     """
     Get matches that are currently live or about to start
@@ -1158,79 +1156,13 @@ def get_live_matches(request):
             datetime__lte=now + timedelta(days=1)
         ).order_by('datetime')
         
-        match_statuses = []
-        for match in matches:
-            # Determine match status based on events
-            events = match.events.all().order_by('minute', 'id')
-            
-            status = "not_started"
-            if events.filter(event_type='match_start').exists():
-                status = "first_half"
-            if events.filter(event_type='half_time').exists():
-                status = "half_time"
-            if events.filter(event_type='full_time').exists():
-                status = "second_half"
-            if events.filter(event_type='extra_time').exists():
-                status = "extra_time"
-            if events.filter(event_type='match_end').exists():
-                status = "finished"
-            
-            match_statuses.append(MatchStatusSchema(
-                id=match.id,
-                team1=TeamExtendedSchema(
-                    id=match.team1.id,
-                    name=match.team1.name,
-                    start_year=match.team1.start_year,
-                    tagozat=match.team1.tagozat,
-                    color=match.team1.get_team_color(),
-                    logo_url=match.team1.logo_url,
-                    active=match.team1.active,
-                    players=[
-                        PlayerExtendedSchema(
-                            id=player.id,
-                            name=player.name,
-                            csk=player.csk,
-                            start_year=player.start_year,
-                            tagozat=player.tagozat,
-                            effective_start_year=player.get_start_year(),
-                            effective_tagozat=player.get_tagozat()
-                        ) for player in match.team1.players.all()
-                    ]
-                ),
-                team2=TeamExtendedSchema(
-                    id=match.team2.id,
-                    name=match.team2.name,
-                    start_year=match.team2.start_year,
-                    tagozat=match.team2.tagozat,
-                    color=match.team2.get_team_color(),
-                    logo_url=match.team2.logo_url,
-                    active=match.team2.active,
-                    players=[
-                        PlayerExtendedSchema(
-                            id=player.id,
-                            name=player.name,
-                            csk=player.csk,
-                            start_year=player.start_year,
-                            tagozat=player.tagozat,
-                            effective_start_year=player.get_start_year(),
-                            effective_tagozat=player.get_tagozat()
-                        ) for player in match.team2.players.all()
-                    ]
-                ),
-                datetime=match.datetime.isoformat(),
-                referee=ProfileSchema.from_orm(match.referee) if match.referee else None,
-                events=[event_to_response_schema(event) for event in events],
-                score=match.result(),
-                match_status=status,
-                status=match.status
-            ))
-        
-        return match_statuses
+        return match_statuses(matches)
     except AttributeError:
         return []
 
 # Get specific match details for referee management
 @biro_router.get("/matches/{match_id}", response=MatchStatusSchema, auth=biro_auth)
+@query_budget(9)
 def get_match_for_referee(request, match_id: int):
     """
     Get specific match details that referee can manage
@@ -1238,76 +1170,15 @@ def get_match_for_referee(request, match_id: int):
     try:
         profile = request.auth.profile
         match = get_object_or_404(Match, id=match_id)
-        
-        events = match.events.all().order_by('minute', 'id')
-        
-        # Determine match status
-        status = "not_started"
-        if events.filter(event_type='match_start').exists():
-            status = "first_half"
-        if events.filter(event_type='half_time').exists():
-            status = "half_time"
-        if events.filter(event_type='full_time').exists():
-            status = "second_half"
-        if events.filter(event_type='extra_time').exists():
-            status = "extra_time"
-        if events.filter(event_type='match_end').exists():
-            status = "finished"
-        
-        return MatchStatusSchema(
-            id=match.id,
-            team1=TeamExtendedSchema(
-                id=match.team1.id,
-                name=match.team1.name,
-                start_year=match.team1.start_year,
-                tagozat=match.team1.tagozat,
-                color=match.team1.get_team_color(),
-                logo_url=match.team1.logo_url,
-                active=match.team1.active,
-                players=[
-                    PlayerExtendedSchema(
-                        id=player.id,
-                        name=player.name,
-                        csk=player.csk,
-                        start_year=player.start_year,
-                        tagozat=player.tagozat,
-                        effective_start_year=player.get_start_year(),
-                        effective_tagozat=player.get_tagozat()
-                    ) for player in match.team1.players.all()
-                ]
-            ),
-            team2=TeamExtendedSchema(
-                id=match.team2.id,
-                name=match.team2.name,
-                start_year=match.team2.start_year,
-                tagozat=match.team2.tagozat,
-                color=match.team2.get_team_color(),
-                logo_url=match.team2.logo_url,
-                active=match.team2.active,
-                players=[
-                    PlayerExtendedSchema(
-                        id=player.id,
-                        name=player.name,
-                        csk=player.csk,
-                        start_year=player.start_year,
-                        tagozat=player.tagozat,
-                        effective_start_year=player.get_start_year(),
-                        effective_tagozat=player.get_tagozat()
-                    ) for player in match.team2.players.all()
-                ]
-            ),
-            datetime=match.datetime.isoformat(),
-            referee=ProfileSchema.from_orm(match.referee) if match.referee else None,
-            events=[event_to_response_schema(event) for event in events],
-            score=match.result(),
-            match_status=status,
-            status=match.status
-        )
+        return match_statuses(Match.objects.filter(id=match.id))[0]
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 # Add event to match (live match updates)
 @biro_router.post("/matches/{match_id}/events", response=EventResponseSchema, auth=biro_auth)
+@query_budget(5)
+@serialize_match_writes
+@idempotent
 def add_match_event(request, match_id: int, payload: EventCreateSchema):
     """
     Add a new event to a match (goals, cards, etc.)
@@ -1325,34 +1196,110 @@ def add_match_event(request, match_id: int, payload: EventCreateSchema):
         player = None
         if payload.player_id:
             # Ensure player belongs to one of the teams in this match
-            try:
-                player = Player.objects.get(
-                    id=payload.player_id,
-                    team__in=[match.team1, match.team2]
-                )
-            except Player.DoesNotExist:
+            player = get_match_player(match, payload.player_id)
+            if player is None:
                 return JsonResponse({'error': 'Player not found in match teams'}, status=400)
         
-        # Create event
-        event = Event.objects.create(
-            event_type=payload.event_type,
-            half=payload.half,
-            minute=payload.minute,
-            minute_extra_time=payload.minute_extra_time,
-            player=player,
-            extra_time=payload.extra_time,
-            exact_time=timezone.now()
+        with transaction.atomic():
+            # Control events (match_start, half_time, ...) must be a valid phase transition
+            if not match.advance_phase(payload.event_type):
+                return JsonResponse({'error': f'Cannot add {payload.event_type} in match phase {match.phase}'}, status=400)
+            
+            # Create event
+            event = Event.objects.create(
+                match=match,
+                event_type=payload.event_type,
+                half=payload.half,
+                minute=payload.minute,
+                minute_extra_time=payload.minute_extra_time,
+                player=player,
+                extra_time=payload.extra_time,
+                exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
+            )
+        
+        return event_to_response_schema(event)
+    except AttributeError:
+        return JsonResponse({'error': 'No profile found'}, status=403)
+
+# Maximum number of events accepted in one batch
+MAX_EVENT_BATCH_SIZE = 200
+
+# Add several events to a match at once (offline queue)
+@biro_router.post("/matches/{match_id}/events/batch", auth=biro_auth)
+@query_budget(11)
+@serialize_match_writes
+@idempotent
+def add_match_events_batch(request, match_id: int, payload: EventBatchSchema):
+    """
+    Add an ordered batch of events queued on a referee device while offline.
+    The whole batch is validated against one in-memory match state and saved
+    in a single transaction, or rejected as a whole.
+    """
+    try:
+        profile = request.auth.profile
+        match = get_object_or_404(Match, id=match_id)
+        
+        if not payload.events:
+            return JsonResponse({'error': 'No events in batch'}, status=400)
+        if len(payload.events) > MAX_EVENT_BATCH_SIZE:
+            return JsonResponse({'error': f'At most {MAX_EVENT_BATCH_SIZE} events can be sent in one batch'}, status=400)
+        
+        roster = get_cached_match_roster(match)
+        invalid_events, warnings, final_phase = validate_event_batch(
+            [event.dict() for event in payload.events], match, roster
         )
+        if invalid_events:
+            return JsonResponse({
+                'error': 'Invalid event batch',
+                'validation_errors': invalid_events,
+                'warnings': warnings
+            }, status=400)
+        
+        players = Player.objects.in_bulk({event.player_id for event in payload.events if event.player_id})
+        events = [
+            Event(
+                match=match,
+                event_type=event.event_type,
+                half=event.half,
+                minute=event.minute,
+                minute_extra_time=event.minute_extra_time,
+                player=players.get(event.player_id),
+                extra_time=event.extra_time,
+                exact_time=resolve_event_time(event.client_time, event.clock_offset)
+            )
+            for event in payload.events
+        ]
         
-        # Add event to match
-        match.events.add(event)
+        with transaction.atomic():
+            # Apply the phase change of the whole batch at once, unless another device moved it meanwhile
+            if final_phase != match.phase:
+                updated = Match.objects.filter(id=match.id, phase=match.phase).update(
+                    phase=final_phase, phase_version=models.F('phase_version') + 1
+                )
+                if not updated:
+                    return JsonResponse({'error': 'Match phase changed, please retry'}, status=409)
+                match.phase = final_phase
+            
+            events = Event.objects.bulk_create(events)
+            # bulk_create sends no post_save signals, refresh the snapshot here
+            transaction.on_commit(lambda: refresh_jegyzokonyv_snapshots([match.id]))
         
-        return event_to_response_schema(event)
+        return JsonResponse({
+            'message': f'{len(events)} events added successfully',
+            'created_count': len(events),
+            'events': [event_to_response_schema(event).dict() for event in events],
+            'warnings': warnings,
+            'phase': match.phase,
+            'new_score': match.result()
+        })
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 # Update existing event
 @biro_router.put("/matches/{match_id}/events/{event_id}", response=EventResponseSchema, auth=biro_auth)
+@query_budget(5)
+@serialize_match_writes
+@idempotent
 def update_match_event(request, match_id: int, event_id: int, payload: EventUpdateSchema):
     """
     Update an existing event in a match
@@ -1363,31 +1310,37 @@ def update_match_event(request, match_id: int, event_id: int, payload: EventUpda
         event = get_object_or_404(Event, id=event_id)
         
         # Ensure event belongs to this match
-        if event not in match.events.all():
+        if event.match_id != match.id:
             return JsonResponse({'error': 'Event not found in this match'}, status=404)
         
         # Update event fields
         update_data = payload.dict(exclude_unset=True)
+        expected_version = pop_expected_version(request, update_data)
         
+        updated_fields = []
         if 'player_id' in update_data:
             if update_data['player_id']:
-                try:
-                    player = Player.objects.get(
-                        id=update_data['player_id'],
-                        team__in=[match.team1, match.team2]
-                    )
-                    event.player = player
-                except Player.DoesNotExist:
+                player = get_match_player(match, update_data['player_id'])
+                if player is None:
                     return JsonResponse({'error': 'Player not found in match teams'}, status=400)
+                event.player = player
             else:
                 event.player = None
+            updated_fields.append('player')
             del update_data['player_id']
         
         # Update other fields
+        previous_event_type = event.event_type
         for field, value in update_data.items():
             setattr(event, field, value)
+            updated_fields.append(field)
+        
+        if not save_versioned(event, expected_version, updated_fields):
+            return version_conflict_response(event)
         
-        event.save()
+        # Editing a control event invalidates the persisted phase and the clock anchors
+        if previous_event_type in Match.PHASE_TRANSITIONS or event.event_type in Match.PHASE_TRANSITIONS:
+            match.refresh_phase()
         
         return event_to_response_schema(event)
     except AttributeError:
@@ -1395,6 +1348,9 @@ def update_match_event(request, match_id: int, event_id: int, payload: EventUpda
 
 # Update match details (including status)
 @biro_router.put("/matches/{match_id}", response=MatchSchema, auth=biro_auth)
+@query_budget(19)
+@serialize_match_writes
+@idempotent
 def update_match(request, match_id: int, payload: MatchUpdateSchema):
     """
     Update match details including datetime, referee, and status
@@ -1404,12 +1360,16 @@ def update_match(request, match_id: int, payload: MatchUpdateSchema):
         match = get_object_or_404(Match, id=match_id)
         
         update_data = payload.dict(exclude_unset=True)
+        expected_version = pop_expected_version(request, update_data)
+        
+        updated_fields = []
         
         # Handle datetime update
         if 'datetime' in update_data and update_data['datetime']:
             from datetime import datetime as dt
             match.datetime = dt.fromisoformat(update_data['datetime'].replace('Z', '+00:00'))
-            del update_data['datetime']
+            updated_fields.append('datetime')
+        update_data.pop('datetime', None)
         
         # Handle referee update
         if 'referee_id' in update_data:
@@ -1418,6 +1378,7 @@ def update_match(request, match_id: int, payload: MatchUpdateSchema):
                 match.referee = referee
             else:
                 match.referee = None
+            updated_fields.append('referee')
             del update_data['referee_id']
         
         # Handle status update
@@ -1426,13 +1387,16 @@ def update_match(request, match_id: int, payload: MatchUpdateSchema):
             if update_data['status'] not in valid_statuses and update_data['status'] is not None:
                 return JsonResponse({'error': 'Invalid status value'}, status=400)
             match.status = update_data['status']
+            updated_fields.append('status')
             del update_data['status']
         
         # Update any remaining fields
         for field, value in update_data.items():
             setattr(match, field, value)
+            updated_fields.append(field)
         
-        match.save()
+        if not save_versioned(match, expected_version, updated_fields):
+            return version_conflict_response(match)
         
         return match_to_schema(match)
     except AttributeError:
@@ -1440,6 +1404,9 @@ def update_match(request, match_id: int, payload: MatchUpdateSchema):
 
 # Remove event from match (Enhanced for undo functionality)
 @biro_router.delete("/matches/{match_id}/events/{event_id}", auth=biro_auth)
+@query_budget(12)
+@serialize_match_writes
+@idempotent
 def remove_match_event(request, match_id: int, event_id: int):
     """
     Remove an event from a match (undo functionality)
@@ -1451,7 +1418,7 @@ def remove_match_event(request, match_id: int, event_id: int):
         event = get_object_or_404(Event, id=event_id)
         
         # Ensure event belongs to this match
-        if event not in match.events.all():
+        if event.match_id != match.id:
             return JsonResponse({'error': 'Event not found in this match'}, status=404)
         
         # Validate if event can be safely removed
@@ -1502,10 +1469,13 @@ def remove_match_event(request, match_id: int, event_id: int):
             'exact_time': event.exact_time.isoformat() if event.exact_time else None
         }
         
-        # Remove event from match and delete it
-        match.events.remove(event)
+        # Delete the event, which removes it from the match
         event.delete()
         
+        # Roll back the match phase if a control event was removed
+        if event_details['event_type'] in Match.PHASE_TRANSITIONS:
+            match.refresh_phase()
+        
         # Get updated match score after removal
         updated_score = match.result()
         
@@ -1520,6 +1490,9 @@ def remove_match_event(request, match_id: int, event_id: int):
 
 # Undo last event in match
 @biro_router.delete("/matches/{match_id}/undo-last-event", auth=biro_auth)
+@query_budget(12)
+@serialize_match_writes
+@idempotent
 def undo_last_event(request, match_id: int):
     """
     Undo the most recent event in a match
@@ -1579,10 +1552,13 @@ def undo_last_event(request, match_id: int):
             'exact_time': latest_event.exact_time.isoformat() if latest_event.exact_time else None
         }
         
-        # Remove and delete the event
-        match.events.remove(latest_event)
+        # Delete the event
         latest_event.delete()
         
+        # Roll back the match phase if a control event was removed
+        if event_details['event_type'] in Match.PHASE_TRANSITIONS:
+            match.refresh_phase()
+        
         # Get updated match score and status
         updated_score = match.result()
         
@@ -1597,6 +1573,7 @@ def undo_last_event(request, match_id: int):
 
 # Get undoable events for a match
 @biro_router.get("/matches/{match_id}/undoable-events", auth=biro_auth)
+@query_budget(3)
 def get_undoable_events(request, match_id: int):
     """
     Get list of events that can be safely undone
@@ -1606,47 +1583,8 @@ def get_undoable_events(request, match_id: int):
         profile = request.auth.profile
         match = get_object_or_404(Match, id=match_id)
         
-        events = match.events.all().order_by('-exact_time', '-minute', '-id')
-        undoable_events = []
-        
-        for event in events:
-            can_undo = True
-            reasons = []
-            
-            # Apply same validation logic as delete endpoints
-            if event.event_type == 'match_start':
-                later_events = match.events.filter(
-                    minute__gt=event.minute
-                ).exclude(id=event.id)
-                if later_events.exists():
-                    can_undo = False
-                    reasons.append("Other events exist after match start")
-            
-            elif event.event_type == 'half_time':
-                second_half_events = match.events.filter(half=2).exclude(id=event.id)
-                if second_half_events.exists():
-                    can_undo = False
-                    reasons.append("Second half events exist")
-            
-            elif event.event_type == 'red_card' and event.player:
-                later_player_events = match.events.filter(
-                    player=event.player,
-                    minute__gt=event.minute
-                ).exclude(id=event.id)
-                if later_player_events.exists():
-                    can_undo = False
-                    reasons.append("Player has events after red card")
-            
-            undoable_events.append({
-                'id': event.id,
-                'event_type': event.event_type,
-                'minute': event.minute,
-                'half': event.half,
-                'player_name': event.player.name if event.player else None,
-                'exact_time': event.exact_time.isoformat() if event.exact_time else None,
-                'can_undo': can_undo,
-                'cannot_undo_reasons': reasons
-            })
+        events = list(match.events.select_related('player').order_by('-exact_time', '-minute', '-id'))
+        undoable_events = get_undoable_events_analysis(events)
         
         return JsonResponse({
             'match_id': match.id,
@@ -1659,61 +1597,94 @@ def get_undoable_events(request, match_id: int):
 
 # Bulk undo events (undo all events after a certain minute)
 @biro_router.delete("/matches/{match_id}/undo-after-minute/{minute}", auth=biro_auth)
-def undo_events_after_minute(request, match_id: int, minute: int):
+@query_budget(12)
+@serialize_match_writes
+@idempotent
+def undo_events_after_minute(request, match_id: int, minute: int, dry_run: bool = False):
     """
     Undo all events that occurred after a specific minute
     Useful for correcting major timing errors
+    With dry_run=true only the preview is returned and nothing is written
     """
     try:
         profile = request.auth.profile
-        match = get_object_or_404(Match, id=match_id)
-        
-        # Get events after the specified minute
-        events_to_remove = match.events.filter(minute__gt=minute).order_by('-minute', '-id')
-        
-        if not events_to_remove.exists():
-            return JsonResponse({'error': f'No events found after minute {minute}'}, status=400)
         
-        # Validate that we can safely remove all these events
-        validation_errors = []
-        removed_events = []
-        
-        for event in events_to_remove:
+        with transaction.atomic():
+            # SQLite has no row locks: concurrent writes to the match are kept out by
+            # serialize_match_writes and by the IMMEDIATE transaction, which takes the
+            # database write lock when the block starts
+            match = get_object_or_404(Match, id=match_id)
+            
+            # Get events after the specified minute
+            events_to_remove = list(
+                match.events.filter(minute__gt=minute).select_related('player').order_by('-minute', '-id')
+            )
+            
+            if not events_to_remove:
+                return JsonResponse({'error': f'No events found after minute {minute}'}, status=400)
+            
             # Store event details before removal
-            event_detail = {
-                'id': event.id,
-                'event_type': event.event_type,
-                'minute': event.minute,
-                'half': event.half,
-                'player_name': event.player.name if event.player else None,
-                'exact_time': event.exact_time.isoformat() if event.exact_time else None
-            }
-            removed_events.append(event_detail)
-        
-        # Check if any critical events would be affected
-        critical_events = events_to_remove.filter(
-            event_type__in=['match_start', 'half_time', 'match_end']
-        )
-        
-        if critical_events.exists():
-            critical_list = [f"{e.event_type} at {e.minute}'" for e in critical_events]
-            validation_errors.append(f"Would remove critical events: {', '.join(critical_list)}")
-        
-        # If there are validation errors, return them without making changes
-        if validation_errors:
-            return JsonResponse({
-                'error': 'Cannot perform bulk undo',
-                'validation_errors': validation_errors,
-                'events_that_would_be_removed': removed_events
-            }, status=400)
-        
-        # Perform the bulk removal
-        for event in events_to_remove:
-            match.events.remove(event)
-            event.delete()
-        
-        # Get updated match score
-        updated_score = match.result()
+            removed_events = [
+                {
+                    'id': event.id,
+                    'event_type': event.event_type,
+                    'minute': event.minute,
+                    'half': event.half,
+                    'player_name': event.player.name if event.player else None,
+                    'exact_time': event.exact_time.isoformat() if event.exact_time else None
+                }
+                for event in events_to_remove
+            ]
+            
+            # Check if any critical events would be affected
+            validation_errors = []
+            critical_events = [
+                event for event in events_to_remove
+                if event.event_type in ['match_start', 'half_time', 'match_end']
+            ]
+            
+            if critical_events:
+                critical_list = [f"{e.event_type} at {e.minute}'" for e in critical_events]
+                validation_errors.append(f"Would remove critical events: {', '.join(critical_list)}")
+            
+            # If there are validation errors, return them without making changes
+            if validation_errors:
+                return JsonResponse({
+                    'error': 'Cannot perform bulk undo',
+                    'validation_errors': validation_errors,
+                    'events_that_would_be_removed': removed_events
+                }, status=400)
+            
+            if dry_run:
+                # Score after the undo: take the removed goals off the current score
+                score = list(match.result())
+                roster = get_cached_match_roster(match)
+                for event in events_to_remove:
+                    side = roster.get(event.player_id)
+                    if side and event.event_type == 'goal':
+                        score[0 if side == 'team1' else 1] -= 1
+                    elif side and event.event_type == 'own_goal':
+                        score[1 if side == 'team1' else 0] -= 1
+                
+                return JsonResponse({
+                    'message': f'Would undo {len(removed_events)} events after minute {minute}',
+                    'dry_run': True,
+                    'events_that_would_be_removed': removed_events,
+                    'removed_count': len(removed_events),
+                    'updated_score': tuple(score),
+                    'timestamp': timezone.now().isoformat()
+                })
+            
+            # Perform the bulk removal in one delete
+            event_ids = [event.id for event in events_to_remove]
+            Event.objects.filter(id__in=event_ids).delete()
+            
+            # Roll back the match phase if any control event was removed
+            if any(e['event_type'] in Match.PHASE_TRANSITIONS for e in removed_events):
+                match.refresh_phase()
+            
+            # Get updated match score
+            updated_score = match.result()
         
         return JsonResponse({
             'message': f'Successfully undid {len(removed_events)} events after minute {minute}',
@@ -1727,119 +1698,123 @@ def undo_events_after_minute(request, match_id: int, minute: int):
 
 # Get complete match record (jegyzőkönyv)
 @biro_router.get("/matches/{match_id}/jegyzokonyv", response=JegyzokonyeSchema, auth=biro_auth)
+@query_budget(8)
 def get_match_jegyzokonyv(request, match_id: int):
     """
     Get complete match record (jegyzőkönyv) with all details
+    Finished matches are served from their frozen snapshot
     """
     try:
         profile = request.auth.profile
-        match = get_object_or_404(Match, id=match_id)
+        match = get_object_or_404(with_jegyzokonyv_relations(Match.objects.all()), id=match_id)
         
-        events = match.events.all().order_by('minute', 'minute_extra_time', 'id')
-        goals = events.filter(event_type='goal')
-        yellow_cards = events.filter(event_type='yellow_card')
-        red_cards = events.filter(event_type='red_card')
-        
-        # Calculate half-time score using dynamic first half end minute
-        first_half_end_minute = get_first_half_end_minute(match)
-        half_time_events = events.filter(minute__lte=first_half_end_minute, event_type='goal')
-        goals_team1_ht = half_time_events.filter(player__in=match.team1.players.all()).count()
-        goals_team2_ht = half_time_events.filter(player__in=match.team2.players.all()).count()
-        
-        # Calculate match duration
-        match_duration = None
-        match_start = events.filter(event_type='match_start').first()
-        match_end = events.filter(event_type='match_end').first()
-        if match_start and match_end and match_start.exact_time and match_end.exact_time:
-            duration = match_end.exact_time - match_start.exact_time
-            match_duration = int(duration.total_seconds() / 60)
-        
-        return JegyzokonyeSchema(
-            match_id=match.id,
-            team1=TeamExtendedSchema(
-                id=match.team1.id,
-                name=match.team1.name,
-                start_year=match.team1.start_year,
-                tagozat=match.team1.tagozat,
-                color=match.team1.get_team_color(),
-                logo_url=match.team1.logo_url,
-                active=match.team1.active,
-                players=[
-                    PlayerExtendedSchema(
-                        id=player.id,
-                        name=player.name,
-                        csk=player.csk,
-                        start_year=player.start_year,
-                        tagozat=player.tagozat,
-                        effective_start_year=player.get_start_year(),
-                        effective_tagozat=player.get_tagozat()
-                    ) for player in match.team1.players.all()
-                ]
-            ),
-            team2=TeamExtendedSchema(
-                id=match.team2.id,
-                name=match.team2.name,
-                start_year=match.team2.start_year,
-                tagozat=match.team2.tagozat,
-                color=match.team2.get_team_color(),
-                logo_url=match.team2.logo_url,
-                active=match.team2.active,
-                players=[
-                    PlayerExtendedSchema(
-                        id=player.id,
-                        name=player.name,
-                        csk=player.csk,
-                        start_year=player.start_year,
-                        tagozat=player.tagozat,
-                        effective_start_year=player.get_start_year(),
-                        effective_tagozat=player.get_tagozat()
-                    ) for player in match.team2.players.all()
-                ]
-            ),
-            final_score=match.result(),
-            datetime=match.datetime.isoformat(),
-            referee=ProfileSchema.from_orm(match.referee) if match.referee else None,
-            events=[event_to_response_schema(event) for event in events],
-            goals_team1=[event_to_response_schema(goal) for goal in goals.filter(player__in=match.team1.players.all())],
-            goals_team2=[event_to_response_schema(goal) for goal in goals.filter(player__in=match.team2.players.all())],
-            yellow_cards=[event_to_response_schema(card) for card in yellow_cards],
-            red_cards=[event_to_response_schema(card) for card in red_cards],
-            half_time_score=(goals_team1_ht, goals_team2_ht),
-            match_duration=match_duration,
-            notes=None  # Could be extended to store referee notes
-        )
+        return get_jegyzokonyv_payload(match)
+    except AttributeError:
+        return JsonResponse({'error': 'No profile found'}, status=403)
+
+def _jegyzokonyv_filename(match, fmt):
+    return f"jegyzokonyv_{match.id}_{slugify(str(match.team1))}_{slugify(str(match.team2))}.{fmt}"
+
+# Printable match record
+@biro_router.get("/matches/{match_id}/jegyzokonyv/print", auth=biro_auth)
+@query_budget(8)
+def print_match_jegyzokonyv(request, match_id: int, format: str = 'html'):
+    """
+    Get the printable match record as HTML or PDF (format=html|pdf)
+    Renderings are cached per version of the match data, the ETag is that version
+    """
+    try:
+        profile = request.auth.profile
+        if format not in RENDER_CONTENT_TYPES:
+            return JsonResponse({'error': 'Format must be html or pdf'}, status=400)
+        if format == 'pdf' and not pdf_rendering_available():
+            return JsonResponse({'error': 'PDF rendering is not available on this server'}, status=501)
+        
+        match = get_object_or_404(with_jegyzokonyv_relations(Match.objects.all()), id=match_id)
+        payload = get_jegyzokonyv_payload(match)
+        
+        etag = f'"{jegyzokonyv_digest(payload)}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(render_jegyzokonyv(payload, format), content_type=RENDER_CONTENT_TYPES[format])
+            if format == 'pdf':
+                response['Content-Disposition'] = f'attachment; filename="{_jegyzokonyv_filename(match, format)}"'
+        
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    except AttributeError:
+        return JsonResponse({'error': 'No profile found'}, status=403)
+
+# Export all match records of a round
+@biro_router.get("/rounds/{round_number}/jegyzokonyv/export", auth=biro_auth)
+@query_budget(11)
+def export_round_jegyzokonyv(request, round_number: int, format: str = 'pdf'):
+    """
+    Download the printable match records of a round in the current tournament as a ZIP file
+    Matches missing from the render cache are rendered in a pool of worker processes
+    """
+    try:
+        profile = request.auth.profile
+        if format not in RENDER_CONTENT_TYPES:
+            return JsonResponse({'error': 'Format must be html or pdf'}, status=400)
+        if format == 'pdf' and not pdf_rendering_available():
+            return JsonResponse({'error': 'PDF rendering is not available on this server'}, status=501)
+        
+        tournament = get_latest_tournament()
+        round_obj = get_object_or_404(Round, tournament=tournament, number=round_number)
+        matches = list(with_jegyzokonyv_relations(Match.objects.filter(round_obj=round_obj)).order_by('datetime', 'id'))
+        
+        documents = render_jegyzokonyv_bulk(get_jegyzokonyv_payloads(matches), format)
+        
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for match, document in zip(matches, documents):
+                archive.writestr(_jegyzokonyv_filename(match, format), document)
+        
+        response = HttpResponse(buffer.getvalue(), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="jegyzokonyv_fordulo_{round_number}.zip"'
+        return response
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 # Quick actions for common events
 @biro_router.post("/matches/{match_id}/start-match", auth=biro_auth)
-def start_match(request, match_id: int):
+@query_budget(4)
+@serialize_match_writes
+@idempotent
+def start_match(request, match_id: int, client_time: float = None, clock_offset: float = None):
     """
     Quick action to start a match
+    Optional client_time/clock_offset query parameters timestamp the kick-off on the referee's device
     """
     try:
         profile = request.auth.profile
         match = get_object_or_404(Match, id=match_id)
         
-        # Check if match already started
-        if match.events.filter(event_type='match_start').exists():
-            return JsonResponse({'error': 'Match already started'}, status=400)
-        
-        # Create match start event
-        event = Event.objects.create(
-            event_type='match_start',
-            half=1,
-            minute=1,
-            exact_time=timezone.now()
-        )
-        
-        match.events.add(event)
+        with transaction.atomic():
+            # Check if match already started
+            if match.phase != 'not_started' or not match.advance_phase('match_start'):
+                return JsonResponse({'error': 'Match already started'}, status=400)
+            
+            # Create match start event
+            event = Event.objects.create(
+                match=match,
+                event_type='match_start',
+                half=1,
+                minute=1,
+                exact_time=resolve_event_time(client_time, clock_offset)
+            )
         
         return JsonResponse({'message': 'Match started successfully', 'event_id': event.id})
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.post("/matches/{match_id}/end-half", auth=biro_auth)
+@query_budget(5)
+@serialize_match_writes
+@idempotent
 def end_half(request, match_id: int, payload: EndHalfSchema):
     """
     Quick action to end current half
@@ -1848,71 +1823,85 @@ def end_half(request, match_id: int, payload: EndHalfSchema):
         profile = request.auth.profile
         match = get_object_or_404(Match, id=match_id)
         
-        events = match.events.all()
-        
-        # Determine what half we're ending
-        if not events.filter(event_type='half_time').exists():
-            # End first half - use dynamic minute (default 45 if no specific events)
-            current_minute = get_current_match_minute(match) or 45
-            event = Event.objects.create(
-                event_type='half_time',
-                half=1,
-                minute=payload.minute,
-                minute_extra_time=payload.minute_extra_time,
-                exact_time=timezone.now()
-            )
-            message = 'First half ended'
-        elif not events.filter(event_type='full_time').exists():
-            # End second half - use dynamic minute (default 90 if no specific events)
-            current_minute = get_current_match_minute(match) or 90
-            event = Event.objects.create(
-                event_type='full_time',
-                half=2,
-                minute=current_minute,
-                exact_time=timezone.now()
-            )
-            message = 'Second half ended'
-        else:
-            return JsonResponse({'error': 'Match is already finished'}, status=400)
-        
-        match.events.add(event)
+        with transaction.atomic():
+            # Determine what half we're ending from the match phase
+            if match.phase == 'first_half':
+                if not match.advance_phase('half_time'):
+                    return JsonResponse({'error': 'Match phase changed, please retry'}, status=409)
+                event = Event.objects.create(
+                    match=match,
+                    event_type='half_time',
+                    half=1,
+                    minute=payload.minute,
+                    minute_extra_time=payload.minute_extra_time,
+                    exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
+                )
+                message = 'First half ended'
+            elif match.phase in ('second_half', 'extra_time'):
+                # End second half - use dynamic minute (default 90 if no specific events)
+                current_minute = get_current_match_minute(match) or 90
+                if not match.advance_phase('full_time'):
+                    return JsonResponse({'error': 'Match phase changed, please retry'}, status=409)
+                event = Event.objects.create(
+                    match=match,
+                    event_type='full_time',
+                    half=2,
+                    minute=current_minute,
+                    exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
+                )
+                message = 'Second half ended'
+            elif match.phase == 'not_started':
+                return JsonResponse({'error': 'Match has not started yet'}, status=400)
+            elif match.phase == 'half_time':
+                return JsonResponse({'error': 'Second half has not started yet'}, status=400)
+            else:
+                return JsonResponse({'error': 'Match is already finished'}, status=400)
         
         return JsonResponse({'message': message, 'event_id': event.id})
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.post("/matches/{match_id}/start-second-half", auth=biro_auth)
-def start_second_half(request, match_id: int):
+@query_budget(4)
+@serialize_match_writes
+@idempotent
+def start_second_half(request, match_id: int, client_time: float = None, clock_offset: float = None):
     """
     Quick action to start the second half of a match
+    Optional client_time/clock_offset query parameters timestamp the kick-off on the referee's device
     """
     try:
         profile = request.auth.profile
         match = get_object_or_404(Match, id=match_id)
         
         # Check if first half has ended
-        if not match.events.filter(event_type='half_time').exists():
+        if match.phase in ('not_started', 'first_half'):
             return JsonResponse({'error': 'First half must be ended before starting second half'}, status=400)
         
         # Check if second half already started
-        second_half_events = match.events.filter(half=2, event_type='match_start')
-        if second_half_events.exists():
+        if match.phase != 'half_time':
             return JsonResponse({'error': 'Second half already started'}, status=400)
         
-        event = Event.objects.create(
-            event_type='match_start',
-            half=2,
-            minute=11,
-            exact_time=timezone.now()
-        )
-        
-        match.events.add(event)
+        with transaction.atomic():
+            if not match.advance_phase('match_start'):
+                return JsonResponse({'error': 'Second half already started'}, status=400)
+            
+            event = Event.objects.create(
+                match=match,
+                event_type='match_start',
+                half=2,
+                minute=11,
+                exact_time=resolve_event_time(client_time, clock_offset)
+            )
         
         return JsonResponse({'message': 'Second half started successfully', 'event_id': event.id})
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.post("/matches/{match_id}/end-match", auth=biro_auth)
+@query_budget(4)
+@serialize_match_writes
+@idempotent
 def end_match(request, match_id: int, payload: EndMatchSchema):
     """
     Quick action to end a match completely
@@ -1921,21 +1910,19 @@ def end_match(request, match_id: int, payload: EndMatchSchema):
         profile = request.auth.profile
         match = get_object_or_404(Match, id=match_id)
         
-        # Check if match is not already ended
-        if match.events.filter(event_type='match_end').exists():
-            return JsonResponse({'error': 'Match already ended'}, status=400)
-        
-        # Create match end event - use dynamic minute (default 90 if no specific events)
-        current_minute = get_current_match_minute(match) or 90
-        event = Event.objects.create(
-            event_type='match_end',
-            half=2,
-            minute=payload.minute,
-            minute_extra_time=payload.minute_extra_time,
-            exact_time=timezone.now()
-        )
-        
-        match.events.add(event)
+        with transaction.atomic():
+            # Check if match is not already ended
+            if not match.advance_phase('match_end'):
+                return JsonResponse({'error': 'Match already ended'}, status=400)
+            
+            event = Event.objects.create(
+                match=match,
+                event_type='match_end',
+                half=2,
+                minute=payload.minute,
+                minute_extra_time=payload.minute_extra_time,
+                exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
+            )
         
         return JsonResponse({'message': 'Match ended successfully', 'event_id': event.id})
     except AttributeError:
@@ -1944,6 +1931,7 @@ def end_match(request, match_id: int, payload: EndMatchSchema):
 # Additional utility endpoints for referees
 
 @biro_router.get("/matches/{match_id}/timeline", auth=biro_auth)
+@query_budget(4)
 def get_match_timeline_endpoint(request, match_id: int):
     """
     Get chronological timeline of match events
@@ -1958,114 +1946,79 @@ def get_match_timeline_endpoint(request, match_id: int):
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.get("/matches/{match_id}/current-minute", auth=biro_auth)
+@query_budget(3)
 def get_current_minute(request, match_id: int):
     """
     Get current match minute based on match progression logic
+    Prefer polling /clock and computing the minute locally
     """
     try:
         profile = request.auth.profile
         match = get_object_or_404(Match, id=match_id)
         
-        # Check all events for this match
-        events = match.events.all().order_by('id')
-        
-        # Check if there was a half_time event
-        half_time_event = events.filter(event_type='half_time').first()
-        full_time_event = events.filter(event_type='full_time').first()
-        match_start_events = events.filter(event_type='match_start').order_by('id')
-        
-        current_minute = None
-        current_extra_time = None
-        match_status = get_match_status(match)
-        
-        if full_time_event:
-            # Match is over
-            current_minute = full_time_event.minute
-            current_extra_time = full_time_event.minute_extra_time
-        elif half_time_event and not match_start_events.filter(half=2).exists():
-            # Half time break
-            current_minute = half_time_event.minute
-            current_extra_time = half_time_event.minute_extra_time
-            match_status = "half_time"
-        else:
-            # Match is in progress - calculate current minute
-            from django.utils import timezone
-            now = timezone.now()
-            
-            if match_start_events.filter(half=2).exists():
-                # Second half logic
-                second_half_start = match_start_events.filter(half=2).first()
-                if second_half_start and second_half_start.exact_time:
-                    elapsed_seconds = (now - second_half_start.exact_time).total_seconds()
-                    elapsed_minutes = int(elapsed_seconds / 60)
-                    
-                    first_half_end = get_first_half_end_minute(match)
-                    
-                    # Match the first half pattern:
-                    # elapsed_minutes 1-10: show as normal minutes
-                    # elapsed_minutes 11+: show as last_regular_minute + extra_time
-                    if elapsed_minutes <= 10:
-                        current_minute = first_half_end + elapsed_minutes
-                        current_extra_time = None
-                    else:
-                        # Extra time: minute stays at the end of regular second half time
-                        current_minute = first_half_end + 10
-                        current_extra_time = elapsed_minutes - 10
-                else:
-                    current_minute = get_first_half_end_minute(match) + 1
-                    current_extra_time = None
-            else:
-                # First half logic
-                first_half_start = match_start_events.filter(half=1).first()
-                if first_half_start and first_half_start.exact_time:
-                    elapsed_seconds = (now - first_half_start.exact_time).total_seconds()
-                    elapsed_minutes = int(elapsed_seconds / 60)
-                    
-                    if elapsed_minutes < 11:
-                        current_minute = max(1, elapsed_minutes)
-                        current_extra_time = None
-                    else:
-                        current_minute = 10
-                        current_extra_time = elapsed_minutes - 10
-                else:
-                    current_minute = 1
-                    current_extra_time = None
+        anchors = get_clock_anchors(match)
+        current_minute, current_extra_time = compute_match_minute(anchors, timezone.now().timestamp())
         
         return JsonResponse({
             'current_minute': current_minute,
             'current_extra_time': current_extra_time,
-            'status': match_status,
+            'status': anchors['phase'],
             'formatted_time': format_match_time(current_minute, current_extra_time) if current_minute else None
         })
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
+@biro_router.get("/matches/{match_id}/clock", response=ClockAnchorsSchema, auth=biro_auth)
+@query_budget(3)
+def get_match_clock(request, match_id: int):
+    """
+    Get the clock anchors of a match so clients can tick the minute locally
+    (see referee_utils.compute_match_minute for the formula).
+    Responses carry an ETag of the phase version, so polling with If-None-Match
+    costs a single lookup and returns 304 until the phase changes.
+    """
+    try:
+        profile = request.auth.profile
+        match = get_object_or_404(Match, id=match_id)
+        
+        etag = f'"{match.id}-{match.phase_version}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = JsonResponse(ClockAnchorsSchema(**get_clock_anchors(match)).dict())
+        
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    except AttributeError:
+        return JsonResponse({'error': 'No profile found'}, status=403)
+
 @biro_router.get("/matches/{match_id}/statistics", auth=biro_auth)
+@query_budget(4)
 def get_match_statistics(request, match_id: int):
     """
     Get comprehensive match statistics
     """
     try:
         profile = request.auth.profile
-        match = get_object_or_404(Match, id=match_id)
+        match = get_object_or_404(Match.objects.select_related('team1', 'team2'), id=match_id)
         
-        team1_stats = get_team_statistics(1, match)
-        team2_stats = get_team_statistics(2, match)
-        half_time_score = get_half_time_score(match)
-        final_score = match.result()
+        # Team, player and score counters all come from one pass over the events
+        statistics = get_match_statistics_summary(match)
         
         return JsonResponse({
             'match_id': match.id,
-            'team1': team1_stats,
-            'team2': team2_stats,
-            'half_time_score': half_time_score,
-            'final_score': final_score,
+            'team1': statistics['team1'],
+            'team2': statistics['team2'],
+            'half_time_score': statistics['half_time_score'],
+            'final_score': statistics['final_score'],
             'status': get_match_status(match)
         })
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.post("/matches/{match_id}/validate-event", auth=biro_auth)
+@query_budget(3)
 def validate_event_endpoint(request, match_id: int, payload: EventCreateSchema):
     """
     Validate event data before creation (dry run)
@@ -2089,6 +2042,9 @@ def validate_event_endpoint(request, match_id: int, payload: EventCreateSchema):
 # Bulk operations for referees
 
 @biro_router.post("/matches/{match_id}/quick-goal", auth=biro_auth)
+@query_budget(11)
+@serialize_match_writes
+@idempotent
 def quick_add_goal(request, match_id: int, payload: QuickGoalSchema):
     """
     Quick action to add a goal with minimal data
@@ -2105,26 +2061,21 @@ def quick_add_goal(request, match_id: int, payload: QuickGoalSchema):
         half = payload.half
         
         # Validate player belongs to match teams
-        try:
-            player = Player.objects.get(
-                id=player_id,
-                team__in=[match.team1, match.team2]
-            )
-        except Player.DoesNotExist:
+        player = get_match_player(match, player_id)
+        if player is None:
             return JsonResponse({'error': 'Player not found in match teams'}, status=400)
         
         # Create goal event
         event = Event.objects.create(
+            match=match,
             event_type='goal',
             half=half,
             minute=minute,
             minute_extra_time=minute_extra_time,
             player=player,
-            exact_time=timezone.now()
+            exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
         )
         
-        match.events.add(event)
-        
         return JsonResponse({
             'message': 'Goal added successfully',
             'event_id': event.id,
@@ -2138,6 +2089,9 @@ def quick_add_goal(request, match_id: int, payload: QuickGoalSchema):
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.post("/matches/{match_id}/quick-own-goal", auth=biro_auth)
+@query_budget(11)
+@serialize_match_writes
+@idempotent
 def quick_add_own_goal(request, match_id: int, payload: QuickOwnGoalSchema):
     """
     Quick action to add an own goal with minimal data
@@ -2156,26 +2110,21 @@ def quick_add_own_goal(request, match_id: int, payload: QuickOwnGoalSchema):
         half = payload.half
         
         # Validate player belongs to match teams
-        try:
-            player = Player.objects.get(
-                id=player_id,
-                team__in=[match.team1, match.team2]
-            )
-        except Player.DoesNotExist:
+        player = get_match_player(match, player_id)
+        if player is None:
             return JsonResponse({'error': 'Player not found in match teams'}, status=400)
         
         # Create own goal event
         event = Event.objects.create(
+            match=match,
             event_type='own_goal',
             half=half,
             minute=minute,
             minute_extra_time=minute_extra_time,
             player=player,
-            exact_time=timezone.now()
+            exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
         )
         
-        match.events.add(event)
-        
         return JsonResponse({
             'message': 'Own goal added successfully',
             'event_id': event.id,
@@ -2189,6 +2138,9 @@ def quick_add_own_goal(request, match_id: int, payload: QuickOwnGoalSchema):
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.post("/matches/{match_id}/quick-card", auth=biro_auth)
+@query_budget(5)
+@serialize_match_writes
+@idempotent
 def quick_add_card(request, match_id: int, payload: QuickCardSchema):
     """
     Quick action to add a yellow or red card
@@ -2209,27 +2161,22 @@ def quick_add_card(request, match_id: int, payload: QuickCardSchema):
             return JsonResponse({'error': 'card_type must be "yellow" or "red"'}, status=400)
         
         # Validate player belongs to match teams
-        try:
-            player = Player.objects.get(
-                id=player_id,
-                team__in=[match.team1, match.team2]
-            )
-        except Player.DoesNotExist:
+        player = get_match_player(match, player_id)
+        if player is None:
             return JsonResponse({'error': 'Player not found in match teams'}, status=400)
         
         # Create card event
         event_type = 'yellow_card' if card_type == 'yellow' else 'red_card'
         event = Event.objects.create(
+            match=match,
             event_type=event_type,
             half=half,
             minute=minute,
             minute_extra_time=minute_extra_time,
             player=player,
-            exact_time=timezone.now()
+            exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
         )
         
-        match.events.add(event)
-        
         return JsonResponse({
             'message': f'{card_type.capitalize()} card added successfully',
             'event_id': event.id,
@@ -2243,6 +2190,9 @@ def quick_add_card(request, match_id: int, payload: QuickCardSchema):
         return JsonResponse({'error': 'No profile found'}, status=403)
 
 @biro_router.post("/matches/{match_id}/extra-time", auth=biro_auth)
+@query_budget(6)
+@serialize_match_writes
+@idempotent
 def add_extra_time(request, match_id: int, payload: ExtraTimeSchema):
     """
     Add extra time to a match half
@@ -2262,15 +2212,18 @@ def add_extra_time(request, match_id: int, payload: ExtraTimeSchema):
         else:
             regular_time_end = get_match_end_minute(match)
         
-        event = Event.objects.create(
-            event_type='extra_time',
-            half=half,
-            minute=regular_time_end,
-            extra_time=extra_time_minutes,
-            exact_time=timezone.now()
-        )
-        
-        match.events.add(event)
+        with transaction.atomic():
+            if not match.advance_phase('extra_time'):
+                return JsonResponse({'error': f'Cannot add extra time in match phase {match.phase}'}, status=400)
+            
+            event = Event.objects.create(
+                match=match,
+                event_type='extra_time',
+                half=half,
+                minute=regular_time_end,
+                extra_time=extra_time_minutes,
+                exact_time=resolve_event_time(payload.client_time, payload.clock_offset)
+            )
         
         return JsonResponse({
             'message': f'{extra_time_minutes} minutes of extra time added to half {half}',
@@ -2284,30 +2237,35 @@ def add_extra_time(request, match_id: int, payload: ExtraTimeSchema):
 # Referee dashboard endpoint
 
 @biro_router.get("/dashboard", auth=biro_auth)
+@query_budget(5)
 def referee_dashboard(request):
     """
     Get referee dashboard with upcoming and current matches
+    Every referee sees the same data, so it is cached once for REFEREE_DASHBOARD_CACHE_TTL seconds
     """
     try:
         profile = request.auth.profile
         now = timezone.now()
-        
-        # Get today's matches (all matches, not just assigned to this referee)
-        today_matches = Match.objects.filter(
-            datetime__date=now.date()
-        ).order_by('datetime')
-        
-        # Get upcoming matches (next 7 days, all matches)
-        upcoming_matches = Match.objects.filter(
-            datetime__gt=now,
-            datetime__lte=now + timedelta(days=7)
-        ).order_by('datetime')
-        
-        # Get recent completed matches (all matches from last 7 days)
-        recent_matches = Match.objects.filter(
-            datetime__lt=now,
-            datetime__gte=now - timedelta(days=7)
-        ).order_by('-datetime')
+        today = local_date(now)
+        cache_key = f"referee_dashboard:{today.isoformat()}"
+        dashboard = cache.get(cache_key)
+        if dashboard is not None:
+            return JsonResponse(dashboard)
+        
+        week_ago = now - timedelta(days=7)
+        week_ahead = now + timedelta(days=7)
+        
+        # Today's, upcoming (next 7 days) and recent (last 7 days) matches in one query,
+        # all matches, not just the ones assigned to this referee
+        matches = list(Match.objects.filter(
+            models.Q(datetime__date=today) |
+            models.Q(datetime__gt=week_ago, datetime__lte=week_ahead)
+        ).select_related('team1', 'team2').order_by('datetime'))
+        scores = get_match_scores(matches)
+        
+        today_matches = [match for match in matches if local_date(match.datetime) == today]
+        upcoming_matches = [match for match in matches if now < match.datetime <= week_ahead]
+        recent_matches = [match for match in reversed(matches) if week_ago <= match.datetime < now]
         
         # Process matches to include status
         def process_match_list(matches):
@@ -2319,16 +2277,18 @@ def referee_dashboard(request):
                     'team2': str(match.team2),
                     'datetime': match.datetime.isoformat(),
                     'status': get_match_status(match),
-                    'score': match.result()
+                    'score': scores[match.id]
                 })
             return result
         
-        return JsonResponse({
+        dashboard = {
             'today_matches': process_match_list(today_matches),
             'upcoming_matches': process_match_list(upcoming_matches),
             'recent_matches': process_match_list(recent_matches),
             'total_matches': Match.objects.count()
-        })
+        }
+        cache.set(cache_key, dashboard, getattr(settings, 'REFEREE_DASHBOARD_CACHE_TTL', 10))
+        return JsonResponse(dashboard)
     except AttributeError:
         return JsonResponse({'error': 'No profile found'}, status=403)
 
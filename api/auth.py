@@ -1,12 +1,214 @@
+import copy
 import jwt
+import threading
 import time
+import uuid
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from django.http import JsonResponse
+from django.utils import timezone
 from functools import wraps
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, NamedTuple
 from ninja.security import HttpBearer
+from .auth_tracing import auth_tracer
+
+
+class Principal(NamedTuple):
+    """Verified identity behind a token, with the roles the auth classes check"""
+    user: User
+    profile: Any  # Profile or None
+    is_admin: bool
+    is_biro: bool
+    generation: int  # Token generation the token was issued in
+    jti: Optional[str]  # Token id, checked against the revocation list
+    family: Optional[str] = None  # Revocation id of the refresh token family the token was issued with
+
+
+class TokenGenerationTable:
+    """
+    In-memory copy of the TokenGeneration table, reloaded every
+    AUTH_TOKEN_GENERATION_REFRESH seconds, so checking a token's generation costs no query
+
+    The copy is only for verifying tokens. New tokens are issued with
+    read(), otherwise a token issued right after a logout-everywhere could carry
+    the old generation and be rejected once the table reloads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._loaded_at = None
+
+    def is_fresh(self) -> bool:
+        """Whether current() can answer without reloading the table"""
+        refresh = getattr(settings, 'AUTH_TOKEN_GENERATION_REFRESH', 5)
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < refresh
+
+    def current(self, user_id: int, refresh: bool = True) -> int:
+        """Current token generation of a user, reloading the table first if it is stale and refresh is set"""
+        if refresh and not self.is_fresh():
+            with self._lock:
+                if not self.is_fresh():
+                    self.reload()
+        return self._generations.get(user_id, 0)
+
+    def read(self, user_id: int) -> int:
+        """Current token generation of a user straight from the database, used when issuing tokens"""
+        from .models import TokenGeneration
+        return TokenGeneration.objects.filter(user_id=user_id).values_list('generation', flat=True).first() or 0
+
+    def reload(self) -> None:
+        from .models import TokenGeneration
+        self._generations = dict(TokenGeneration.objects.values_list('user_id', 'generation'))
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Reload on the next check, used after bumping a generation in this process"""
+        self._loaded_at = None
+
+
+token_generations = TokenGenerationTable()
+
+
+class RevocationList:
+    """
+    In-memory set of revoked token ids (jti) and refresh token families, synced from RevokedToken
+
+    New revocations are fetched incrementally every AUTH_REVOCATION_REFRESH seconds.
+    Once an hour the set is rebuilt, which drops the tokens that have expired since.
+    """
+
+    FULL_RELOAD_INTERVAL = 60 * 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = set()
+        self._last_id = 0
+        self._synced_at = None
+        self._reloaded_at = None
+
+    def is_fresh(self) -> bool:
+        """Whether is_revoked() can answer without syncing from the database"""
+        refresh = getattr(settings, 'AUTH_REVOCATION_REFRESH', 5)
+        return self._synced_at is not None and time.monotonic() - self._synced_at < refresh
+
+    def is_revoked(self, *token_ids, refresh: bool = True) -> bool:
+        if refresh and not self.is_fresh():
+            with self._lock:
+                if not self.is_fresh():
+                    self._sync()
+        return any(token_id in self._revoked for token_id in token_ids if token_id)
+
+    def revoke(self, token_id: str, expires_at: float) -> bool:
+        """
+        Revoke a token id until expires_at (Unix timestamp)
+
+        Returns:
+            False if it was already revoked
+        """
+        from .models import RevokedToken
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=token_id, expires_at=datetime.fromtimestamp(expires_at))
+        except IntegrityError:
+            return False
+        self._revoked.add(token_id)
+        return True
+
+    def _sync(self) -> None:
+        from .models import RevokedToken
+        now = time.monotonic()
+        if self._reloaded_at is None or now - self._reloaded_at >= self.FULL_RELOAD_INTERVAL:
+            RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+            self._revoked, self._last_id = set(), 0
+            self._reloaded_at = now
+
+        rows = RevokedToken.objects.filter(id__gt=self._last_id).values_list('id', 'jti')
+        for row_id, token_id in rows:
+            self._revoked.add(token_id)
+            self._last_id = max(self._last_id, row_id)
+        self._synced_at = now
+
+
+revoked_tokens = RevocationList()
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of verified token -> Principal
+
+    Entries expire after AUTH_TOKEN_CACHE_TTL seconds (or when the token expires,
+    if sooner). They are dropped early when the user or profile is saved
+    (see signals.py) and on logout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user = {}  # user id -> set of tokens
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._discard(token)
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def set(self, token: str, principal: Principal, token_expires_at: Optional[float] = None) -> None:
+        ttl = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60)
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (principal, time.monotonic() + ttl)
+            self._tokens_by_user.setdefault(principal.user.id, set()).add(token)
+            while len(self._entries) > getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 1024):
+                self._discard(next(iter(self._entries)))
+
+    def forget(self, token: str) -> None:
+        with self._lock:
+            self._discard(token)
+
+    def forget_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._discard(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _discard(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[0].user.id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[0].user.id]
+
+
+token_cache = VerifiedTokenCache()
+
+
+def get_request_token(request) -> Optional[str]:
+    """Get the JWT from the Authorization header, or from the auth_token cookie"""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return request.COOKIES.get('auth_token')
 
 
 class JWTAuth:
@@ -15,28 +217,147 @@ class JWTAuth:
     """
     
     @staticmethod
-    def encode_token(user_id: int, username: str) -> str:
+    def encode_token(user_id: int, username: str, claims: Optional[Dict[str, Any]] = None,
+                     lifetime: Optional[int] = None) -> str:
         """
         Encode a JWT token with user information
         
         Args:
             user_id: The user's ID
             username: The user's username
+            claims: Extra claims to sign into the token, e.g. JWTAuth.role_claims(user)
+            lifetime: Seconds until the token expires, JWT_ACCESS_TOKEN_LIFETIME by default
             
         Returns:
             Encoded JWT token string
         """
-        now = datetime.utcnow()
+        if lifetime is None:
+            lifetime = getattr(settings, 'JWT_ACCESS_TOKEN_LIFETIME', 15 * 60)
+        now = int(time.time())
         payload = {
+            'type': 'access',
+            **(claims or {}),
             'user_id': user_id,
             'username': username,
-            'iat': int(now.timestamp()),  # issued at time
-            'exp': int((now + timedelta(hours=24)).timestamp())  # expires in 24 hours
+            'jti': uuid.uuid4().hex,
+            'iat': now,  # issued at time
+            'exp': now + lifetime
         }
         
         token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
         return token
     
+    @staticmethod
+    def encode_refresh_token(user: User, family: Optional[str] = None, generation: Optional[int] = None) -> str:
+        """
+        Encode a refresh token, used once at /auth/refresh to get a new token pair
+        
+        Args:
+            user: User object
+            family: Family of the refresh token being rotated, a new family on login
+            generation: Token generation to sign in, read from the database if not given
+            
+        Returns:
+            Encoded JWT refresh token string
+        """
+        return JWTAuth.encode_token(user.id, user.username, {
+            'type': 'refresh',
+            'fam': family or uuid.uuid4().hex,
+            'gen': token_generations.read(user.id) if generation is None else generation,
+        }, lifetime=getattr(settings, 'JWT_REFRESH_TOKEN_LIFETIME', 7 * 24 * 60 * 60))
+    
+    @staticmethod
+    def issue_token_pair(user: User, family: Optional[str] = None) -> Dict[str, str]:
+        """
+        Issue a short-lived access token with role claims and a refresh token
+        
+        Both carry the refresh token family, so revoking the family (logout, reuse
+        of a used refresh token) rejects the access tokens issued with it too.
+        
+        Returns:
+            Dictionary with token and refresh_token
+        """
+        generation = token_generations.read(user.id)
+        family = family or uuid.uuid4().hex
+        return {
+            'token': JWTAuth.encode_token(user.id, user.username, {
+                **JWTAuth.role_claims(user, generation), 'fam': family,
+            }),
+            'refresh_token': JWTAuth.encode_refresh_token(user, family, generation),
+        }
+    
+    @staticmethod
+    def rotate_refresh_token(refresh_token: str) -> Optional[tuple[User, Dict[str, str]]]:
+        """
+        Exchange a refresh token for a new token pair, revoking the one used
+        
+        A refresh token can be used once. Presenting an already used one means it
+        leaked, so its whole family is revoked and the user has to log in again.
+        
+        Args:
+            refresh_token: JWT refresh token string
+            
+        Returns:
+            Tuple of (user, new token pair), None if the refresh token is not valid
+        """
+        payload = JWTAuth.decode_token(refresh_token)
+        if not payload or payload.get('type') != 'refresh':
+            return None
+        family = f"family:{payload['fam']}"
+        if revoked_tokens.is_revoked(family):
+            return None
+        if not revoked_tokens.revoke(payload['jti'], payload['exp']):
+            revoked_tokens.revoke(family, payload['exp'])
+            return None
+        
+        try:
+            user = User.objects.select_related('profile').get(
+                id=payload['user_id'], username=payload['username'], is_active=True
+            )
+        except User.DoesNotExist:
+            return None
+        if payload['gen'] < token_generations.current(user.id):
+            return None
+        
+        return user, JWTAuth.issue_token_pair(user, payload['fam'])
+    
+    @staticmethod
+    def revoke_token(token: str) -> None:
+        """
+        Revoke an access token, or a refresh token with its whole family (logout)
+        """
+        payload = JWTAuth.decode_token(token)
+        if not payload or 'jti' not in payload:
+            return
+        revoked_tokens.revoke(payload['jti'], payload['exp'])
+        if payload.get('type') == 'refresh':
+            revoked_tokens.revoke(f"family:{payload['fam']}", payload['exp'])
+        token_cache.forget(token)
+    
+    @staticmethod
+    def role_claims(user: User, generation: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get the role claims signed into a user's tokens
+        
+        Args:
+            user: User object
+            generation: Token generation to sign in, read from the database if not given
+            
+        Returns:
+            Dictionary with staff, biro, profile_id, player_id and the token generation (gen)
+        """
+        try:
+            profile = user.profile
+        except AttributeError:
+            profile = None
+        return {
+            'staff': user.is_staff or user.is_superuser,
+            'biro': bool(profile and profile.biro),
+            'profile_id': profile.id if profile else None,
+            'player_id': profile.player_id if profile else None,
+            'gen': token_generations.read(user.id) if generation is None else generation,
+        }
+    
     @staticmethod
     def decode_token(token: str) -> Optional[Dict[str, Any]]:
         """
@@ -48,16 +369,23 @@ class JWTAuth:
         Returns:
             Dictionary containing user info if valid, None if invalid
         """
+        if not auth_tracer.enabled:
+            return JWTAuth._decode_token(token)[0]
+        
+        started = time.perf_counter()
+        payload, outcome = JWTAuth._decode_token(token)
+        auth_tracer.record('decode', outcome, started, user_id=payload.get('user_id') if payload else None)
+        return payload
+    
+    @staticmethod
+    def _decode_token(token: str) -> tuple[Optional[Dict[str, Any]], str]:
+        """Decode a JWT token, returning the payload (or None) and the outcome for tracing"""
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            print(f"DEBUG: Token decoded successfully. User ID: {payload.get('user_id')}, Expires: {datetime.fromtimestamp(payload.get('exp', 0))}")
-            return payload
+            return jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256']), 'ok'
         except jwt.ExpiredSignatureError:
-            print("DEBUG: Token has expired")
-            return None
-        except jwt.InvalidTokenError as e:
-            print(f"DEBUG: Invalid token error: {e}")
-            return None
+            return None, 'expired'
+        except jwt.InvalidTokenError:
+            return None, 'invalid'
     
     @staticmethod
     def verify_token(token: str) -> Optional[User]:
@@ -70,15 +398,113 @@ class JWTAuth:
         Returns:
             User object if token is valid, None otherwise
         """
+        principal = JWTAuth.get_principal(token)
+        return principal.user if principal else None
+    
+    @staticmethod
+    def get_principal(token: str) -> Optional[Principal]:
+        """
+        Verify token and return the user with its profile and roles, served from
+        the verified token cache when possible
+        
+        Args:
+            token: JWT token string
+            
+        Returns:
+            Principal if token is valid, None otherwise. The user is a copy
+            (with the profile loaded), so requests cannot change each other's instance.
+        """
+        if not auth_tracer.enabled:
+            return JWTAuth._resolve_principal(token)[0]
+        
+        started = time.perf_counter()
+        principal, outcome = JWTAuth._resolve_principal(token)
+        auth_tracer.record('verify', outcome, started, user_id=principal.user.id if principal else None)
+        return principal
+    
+    @staticmethod
+    def _resolve_principal(token: str) -> tuple[Optional[Principal], str]:
+        """get_principal, also returning the outcome for tracing"""
+        principal = token_cache.get(token)
+        if principal is not None:
+            return JWTAuth._check_principal(token, principal, 'cache_hit')
+        
         payload = JWTAuth.decode_token(token)
         if not payload:
-            return None
+            return None, 'invalid_token'
+        # Refresh tokens are only accepted by /auth/refresh
+        if payload.get('type') == 'refresh':
+            return None, 'refresh_token'
             
         try:
-            user = User.objects.get(id=payload['user_id'], username=payload['username'])
-            return user
+            user = User.objects.select_related('profile').get(
+                id=payload['user_id'], username=payload['username']
+            )
         except User.DoesNotExist:
-            return None
+            return None, 'unknown_user'
+        
+        try:
+            profile = user.profile
+        except AttributeError:
+            profile = None
+        if 'gen' in payload:
+            # Roles signed into the token, kept valid by the token generation check
+            principal = Principal(
+                user=user,
+                profile=profile,
+                is_admin=bool(payload.get('staff')),
+                is_biro=bool(payload.get('biro')),
+                generation=payload['gen'],
+                jti=payload.get('jti'),
+                family=f"family:{payload['fam']}" if 'fam' in payload else None,
+            )
+        else:
+            # Token issued before role claims existed
+            principal = Principal(
+                user=user,
+                profile=profile,
+                is_admin=user.is_staff or user.is_superuser,
+                is_biro=bool(profile and profile.biro),
+                generation=token_generations.current(user.id),
+                jti=payload.get('jti'),
+            )
+        token_cache.set(token, principal, payload.get('exp'))
+        
+        return JWTAuth._check_principal(token, principal, 'ok')
+    
+    @staticmethod
+    def _check_principal(token: str, principal: Principal, outcome: str,
+                         refresh: bool = True) -> tuple[Optional[Principal], str]:
+        """Reject principals of revoked tokens and of tokens issued before the user's last role change"""
+        if principal.generation < token_generations.current(principal.user.id, refresh=refresh):
+            token_cache.forget(token)
+            return None, 'stale_generation'
+        if revoked_tokens.is_revoked(principal.jti, principal.family, refresh=refresh):
+            token_cache.forget(token)
+            return None, 'revoked'
+        
+        return principal._replace(user=copy.copy(principal.user)), outcome
+    
+    @staticmethod
+    async def aget_principal(token: str) -> Optional[Principal]:
+        """
+        Async version of get_principal
+        
+        A cached token is checked on the event loop while the in-memory token generation
+        table and revocation list are fresh. Anything that needs the database runs
+        get_principal in a worker thread.
+        """
+        principal = token_cache.get(token)
+        if principal is None or not (token_generations.is_fresh() and revoked_tokens.is_fresh()):
+            return await sync_to_async(JWTAuth.get_principal)(token)
+        
+        if not auth_tracer.enabled:
+            return JWTAuth._check_principal(token, principal, 'cache_hit', refresh=False)[0]
+        
+        started = time.perf_counter()
+        principal, outcome = JWTAuth._check_principal(token, principal, 'cache_hit', refresh=False)
+        auth_tracer.record('verify', outcome, started, user_id=principal.user.id if principal else None)
+        return principal
 
 
 class JWTCookieAuth:
@@ -86,29 +512,16 @@ class JWTCookieAuth:
     Django Ninja JWT Authentication class that checks both Authorization header and cookies
     """
     def authenticate(self, request, token=None):
-        # Debug: Print what we're receiving
-        print(f"DEBUG: Headers: {dict(request.headers)}")
-        print(f"DEBUG: Cookies: {request.COOKIES}")
-        
         # First try to get token from Authorization header
         auth_header = request.headers.get('Authorization')
         if auth_header and auth_header.startswith('Bearer '):
             token = auth_header.split(' ')[1]
-            print(f"DEBUG: Token from header: {token[:20]}...")
         # If no token in header, try to get from cookie
         elif not token and 'auth_token' in request.COOKIES:
             token = request.COOKIES['auth_token']
-            print(f"DEBUG: Token from cookie: {token[:20]}...")
-        else:
-            print("DEBUG: No token found in header or cookies")
         
         if token:
-            user = JWTAuth.verify_token(token)
-            if user:
-                print(f"DEBUG: Successfully authenticated user: {user.username}")
-                return user
-            else:
-                print("DEBUG: Token verification failed")
+            return JWTAuth.verify_token(token)
         return None
 
     def __call__(self, request):
@@ -140,9 +553,9 @@ class AdminRequired:
             token = request.COOKIES['auth_token']
         
         if token:
-            user = JWTAuth.verify_token(token)
-            if user and (user.is_staff or user.is_superuser):
-                return user
+            principal = JWTAuth.get_principal(token)
+            if principal and principal.is_admin:
+                return principal.user
         return None
 
     def __call__(self, request):
@@ -163,22 +576,69 @@ class BiroRequired:
             token = request.COOKIES['auth_token']
         
         if token:
-            user = JWTAuth.verify_token(token)
-            if user:
-                try:
-                    profile = user.profile
-                    if profile.biro:
-                        return user
-                except AttributeError:
-                    pass
+            principal = JWTAuth.get_principal(token)
+            if principal and principal.is_biro:
+                return principal.user
         return None
 
     def __call__(self, request):
         return self.authenticate(request)
 
 
+
+class AsyncJWTCookieAuth(JWTCookieAuth):
+    """
+    Async version of JWTCookieAuth for async endpoints, cached tokens are verified without leaving the event loop
+    """
+    async def authenticate(self, request, token=None):
+        token = get_request_token(request) or token
+        if token:
+            principal = await JWTAuth.aget_principal(token)
+            if principal:
+                return principal.user
+        return None
+
+    async def __call__(self, request):
+        return await self.authenticate(request)
+
+
+class AsyncAdminRequired(AdminRequired):
+    """
+    Async version of AdminRequired for async endpoints
+    """
+    async def authenticate(self, request, token=None):
+        token = get_request_token(request) or token
+        if token:
+            principal = await JWTAuth.aget_principal(token)
+            if principal and principal.is_admin:
+                return principal.user
+        return None
+
+    async def __call__(self, request):
+        return await self.authenticate(request)
+
+
+class AsyncBiroRequired(BiroRequired):
+    """
+    Async version of BiroRequired for async endpoints
+    """
+    async def authenticate(self, request, token=None):
+        token = get_request_token(request) or token
+        if token:
+            principal = await JWTAuth.aget_principal(token)
+            if principal and principal.is_biro:
+                return principal.user
+        return None
+
+    async def __call__(self, request):
+        return await self.authenticate(request)
+
+
 # Create instances for use in API endpoints
 jwt_cookie_auth = JWTCookieAuth()  # New cookie-compatible auth
 jwt_auth = JWTBearer()  # Keep for backward compatibility
 admin_auth = AdminRequired()
-biro_auth = BiroRequired()
\ No newline at end of file
+biro_auth = BiroRequired()
+async_jwt_cookie_auth = AsyncJWTCookieAuth()
+async_admin_auth = AsyncAdminRequired()
+async_biro_auth = AsyncBiroRequired()
@@ -0,0 +1,87 @@
+"""
+Tracing for JWT authentication
+
+Counts decode and verify outcomes, records their latency and emits a sampled
+structured log record per traced call. Records never include tokens, headers or cookies.
+
+Tracing is off by default (AUTH_TRACE_ENABLED). While it is off the auth code only
+checks `auth_tracer.enabled` and skips tracing: no clock reads, no counters, no logging.
+"""
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger('api.auth')
+
+
+class AuthTracer:
+    """
+    Outcome counters, latency totals and sampled log records of the auth stages ('decode', 'verify')
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.reset()
+
+    def configure(self) -> None:
+        """(Re)load AUTH_TRACE_ENABLED and AUTH_TRACE_SAMPLE_RATE from settings"""
+        self.enabled = getattr(settings, 'AUTH_TRACE_ENABLED', False)
+        self.sample_rate = getattr(settings, 'AUTH_TRACE_SAMPLE_RATE', 0.01)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {}  # (stage, outcome) -> count
+            self._timings = {}  # stage -> [count, total seconds, max seconds]
+
+    def record(self, stage: str, outcome: str, started: float, **fields) -> None:
+        """
+        Record one traced call
+
+        Args:
+            stage: 'decode' or 'verify'
+            outcome: Result of the stage, e.g. 'ok', 'expired', 'cache_hit', 'revoked'
+            started: time.perf_counter() value taken when the stage started
+            fields: Extra non-secret fields for the log record (e.g. user_id)
+        """
+        duration = time.perf_counter() - started
+        with self._lock:
+            key = (stage, outcome)
+            self._counters[key] = self._counters.get(key, 0) + 1
+            timing = self._timings.setdefault(stage, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += duration
+            timing[2] = max(timing[2], duration)
+
+        if self.sample_rate and random.random() < self.sample_rate:
+            logger.info(
+                "auth %s %s", stage, outcome,
+                extra={
+                    'auth_stage': stage,
+                    'auth_outcome': outcome,
+                    'duration_ms': round(duration * 1000, 3),
+                    **fields,
+                },
+            )
+
+    def snapshot(self) -> dict:
+        """Counters and latency (in milliseconds) per stage since the last reset"""
+        with self._lock:
+            stages = {}
+            for (stage, outcome), count in self._counters.items():
+                stages.setdefault(stage, {'outcomes': {}})['outcomes'][outcome] = count
+            for stage, (count, total, longest) in self._timings.items():
+                stages.setdefault(stage, {'outcomes': {}}).update({
+                    'count': count,
+                    'avg_ms': round(total / count * 1000, 3),
+                    'max_ms': round(longest * 1000, 3),
+                })
+        return {'enabled': self.enabled, 'sample_rate': self.sample_rate, 'stages': stages}
+
+
+auth_tracer = AuthTracer()
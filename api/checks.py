@@ -0,0 +1,22 @@
+"""
+System checks of the api app, registered in ApiConfig.ready
+"""
+from django.core.checks import Tags, Warning, register
+
+from .referee_utils import cache_is_process_local
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    # Cache deletions (e.g. match roster invalidation) must reach every worker
+    if not cache_is_process_local():
+        return []
+    return [Warning(
+        'The default cache is a per-process LocMemCache.',
+        hint=(
+            'With several worker processes, invalidations only reach the process that made them: '
+            'match rosters then expire after MATCH_ROSTER_LOCAL_CACHE_TIMEOUT instead of 24 hours. '
+            'Set CACHE_BACKEND and CACHE_LOCATION to a shared cache (Redis, Memcached).'
+        ),
+        id='api.W001',
+    )]
@@ -0,0 +1,130 @@
+"""
+Idempotency keys for referee (bíró) write endpoints
+
+Clients on flaky pitch-side connections send an ``Idempotency-Key`` header with
+every write and reuse it when retrying. The first request claims the key through
+the unique (user, key) index and stores its response; retries get the stored
+response back without running the write again.
+
+A claim whose request never finished (crashed worker) is only honoured for
+IDEMPOTENCY_CLAIM_LEASE seconds, after that the key can be claimed again.
+Expired keys are deleted by the purge_idempotency_keys management command.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from ninja.responses import NinjaJSONEncoder
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _render(result):
+    """Render a view result the same way Django Ninja would"""
+    if isinstance(result, HttpResponse):
+        return result
+    return JsonResponse(result, encoder=NinjaJSONEncoder, safe=False)
+
+
+def _replay(record):
+    return HttpResponse(
+        record.response_body,
+        status=record.status_code,
+        content_type='application/json',
+        headers={'Idempotent-Replayed': 'true'},
+    )
+
+
+def request_fingerprint(request) -> str:
+    """
+    "METHOD /path <hash>" identifying a request, the hash covers the sorted query string and the body,
+    so e.g. a dry run and the real undo with the same key are different requests
+    """
+    digest = hashlib.sha256()
+    for name, values in sorted(request.GET.lists()):
+        for value in values:
+            digest.update(f'{name}={value}&'.encode())
+    digest.update(b'\n')
+    digest.update(request.body)
+    return f"{f'{request.method} {request.path}'[:190]} {digest.hexdigest()}"
+
+
+def _claim_lease() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE', 60))
+
+
+def purge_expired_keys() -> int:
+    """
+    Delete the keys older than IDEMPOTENCY_KEY_TTL
+
+    Returns:
+        Number of deleted keys
+    """
+    ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+    deleted, _ = IdempotencyKey.objects.filter(date_created__lt=timezone.now() - ttl).delete()
+    return deleted
+
+
+def idempotent(view_func):
+    """
+    Decorator making a biro write endpoint safe to retry with an Idempotency-Key header
+
+    Requests without the header run as before. Responses with a 5xx status are not
+    stored, so the client can retry them.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.auth:
+            return view_func(request, *args, **kwargs)
+
+        key = key[:255]
+        fingerprint = request_fingerprint(request)
+        ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.auth, key=key, request_fingerprint=fingerprint
+                )
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.auth, key=key)
+
+            now = timezone.now()
+            if record.date_created < now - ttl:
+                # Expired key, treat the request as a new one
+                record.delete()
+                return wrapper(request, *args, **kwargs)
+            if record.request_fingerprint != fingerprint:
+                return JsonResponse({'error': 'Idempotency key was already used for a different request'}, status=422)
+            if record.status_code is None:
+                if record.date_created < now - _claim_lease():
+                    # The claiming request died without storing a response; only one retry may take it over
+                    if IdempotencyKey.objects.filter(id=record.id, status_code=None).delete()[0]:
+                        return wrapper(request, *args, **kwargs)
+                return JsonResponse({'error': 'A request with this idempotency key is still in progress'}, status=409)
+            return _replay(record)
+
+        try:
+            with transaction.atomic():
+                response = _render(view_func(request, *args, **kwargs))
+                if response.status_code < 500:
+                    record.status_code = response.status_code
+                    record.response_body = response.content.decode()
+                    record.save(update_fields=['status_code', 'response_body'])
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete()
+        return response
+
+    return wrapper
@@ -0,0 +1,354 @@
+"""
+Match record (jegyzőkönyv) building and frozen snapshots
+
+A finished match's jegyzőkönyv does not change unless its events are edited, so it
+is built once, stored in JegyzokonyvSnapshot and served from there. The signals in
+signals.py rebuild the snapshot whenever an event of a finished match changes.
+
+The printable HTML/PDF renderings are cached under a hash of the payload, so a
+match is rendered once per version of its data no matter how often it is
+downloaded or exported with its round. The renderings missing from the cache
+are made in a pool of worker processes.
+"""
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.template.loader import render_to_string
+
+try:
+    from weasyprint import HTML
+except ImportError:  # PDF export is optional
+    HTML = None
+
+from .models import Match, Event, JegyzokonyvSnapshot
+from .public_reads import teams_to_extended_schema
+from .referee_utils import get_match_scores
+from .schemas import JegyzokonyeSchema, ProfileSchema, event_to_response_schema
+from .utils import get_first_teams
+
+
+def with_jegyzokonyv_relations(matches):
+    """Load everything build_jegyzokonyv and get_jegyzokonyv_payload read along with a Match queryset"""
+    return matches.select_related(
+        'team1', 'team2', 'referee__user', 'referee__player', 'jegyzokonyv_snapshot'
+    ).prefetch_related(
+        'team1__players', 'team2__players', models.Prefetch('events', queryset=Event.objects.select_related('player'))
+    )
+
+
+def _display_order(event):
+    # order_by('minute', 'minute_extra_time', 'id'), with NULL extra time first as SQLite sorts it
+    return (event.minute, event.minute_extra_time is not None, event.minute_extra_time or 0, event.id)
+
+
+def _first_half_end_minute(events) -> int:
+    # get_first_half_end_minute on the loaded events
+    half_time_events = [event for event in events if event.event_type == 'half_time']
+    if half_time_events:
+        return min(half_time_events, key=lambda event: event.id).minute
+    first_half_events = [event for event in events if event.half == 1]
+    if first_half_events:
+        last = max(first_half_events, key=_display_order)
+        return last.minute + (last.minute_extra_time or 0)
+    return 1
+
+
+def build_jegyzokonyv(match: Match, first_teams: Dict[int, Any] = None, score: tuple = None) -> Dict[str, Any]:
+    """
+    Build the complete match record from the current events
+
+    Reads the teams, players and events of the match once, so load it with
+    with_jegyzokonyv_relations.
+
+    Args:
+        match: Match object
+        first_teams: Player id -> first team of the players of both teams, loaded if not given
+        score: Final score from get_match_scores, computed if not given
+
+    Returns:
+        JSON-serializable dict in the JegyzokonyeSchema format
+    """
+    events = sorted(match.events.all(), key=_display_order)
+    team1_players = {player.id for player in match.team1.players.all()}
+    team2_players = {player.id for player in match.team2.players.all()}
+    if first_teams is None:
+        first_teams = get_first_teams(team1_players | team2_players)
+    if score is None:
+        score = get_match_scores([match])[match.id]
+
+    goals = [event for event in events if event.event_type == 'goal']
+    yellow_cards = [event for event in events if event.event_type == 'yellow_card']
+    red_cards = [event for event in events if event.event_type == 'red_card']
+
+    # Calculate half-time score using dynamic first half end minute
+    first_half_end_minute = _first_half_end_minute(events)
+    half_time_goals = [goal for goal in goals if goal.minute <= first_half_end_minute]
+    goals_team1_ht = sum(goal.player_id in team1_players for goal in half_time_goals)
+    goals_team2_ht = sum(goal.player_id in team2_players for goal in half_time_goals)
+
+    # Calculate match duration
+    match_duration = None
+    match_start = next((event for event in events if event.event_type == 'match_start'), None)
+    match_end = next((event for event in events if event.event_type == 'match_end'), None)
+    if match_start and match_end and match_start.exact_time and match_end.exact_time:
+        duration = match_end.exact_time - match_start.exact_time
+        match_duration = int(duration.total_seconds() / 60)
+
+    team1, team2 = teams_to_extended_schema([match.team1, match.team2], first_teams)
+    return JegyzokonyeSchema(
+        match_id=match.id,
+        team1=team1,
+        team2=team2,
+        final_score=score,
+        datetime=match.datetime.isoformat(),
+        referee=ProfileSchema.from_orm(match.referee) if match.referee else None,
+        events=[event_to_response_schema(event) for event in events],
+        goals_team1=[event_to_response_schema(goal) for goal in goals if goal.player_id in team1_players],
+        goals_team2=[event_to_response_schema(goal) for goal in goals if goal.player_id in team2_players],
+        yellow_cards=[event_to_response_schema(card) for card in yellow_cards],
+        red_cards=[event_to_response_schema(card) for card in red_cards],
+        half_time_score=(goals_team1_ht, goals_team2_ht),
+        match_duration=match_duration,
+        notes=None  # Could be extended to store referee notes
+    ).model_dump(mode='json')
+
+
+def freeze_jegyzokonyv(match: Match) -> Dict[str, Any]:
+    """
+    Build the match record and store it as the match's snapshot
+
+    Args:
+        match: Match object
+
+    Returns:
+        The stored jegyzőkönyv payload
+    """
+    payload = build_jegyzokonyv(match)
+    JegyzokonyvSnapshot.objects.update_or_create(match=match, defaults={'payload': payload})
+    return payload
+
+
+def refresh_jegyzokonyv_snapshots(match_ids) -> None:
+    """
+    Rebuild the snapshots of the finished matches among match_ids
+
+    Live matches are skipped, their record is built on every request anyway.
+    """
+    matches = with_jegyzokonyv_relations(Match.objects.filter(id__in=set(match_ids), phase='finished'))
+    for match in matches:
+        freeze_jegyzokonyv(match)
+
+
+def _frozen_payload(match: Match):
+    # Uses the snapshot loaded by select_related('jegyzokonyv_snapshot') if there is one
+    if match.phase != 'finished':
+        return None
+    try:
+        return match.jegyzokonyv_snapshot.payload
+    except JegyzokonyvSnapshot.DoesNotExist:
+        return None
+
+
+def get_jegyzokonyv_payloads(matches: List[Match]) -> List[Dict[str, Any]]:
+    """
+    Get the match records of many matches, served from the frozen snapshots of the finished ones
+
+    The records that have to be built share one first team and one score lookup,
+    and the missing snapshots of finished matches are stored in one query, so the
+    number of queries does not grow with the number of matches.
+
+    Args:
+        matches: Match objects loaded with with_jegyzokonyv_relations
+
+    Returns:
+        Jegyzőkönyv payloads in the JegyzokonyeSchema format, in the order of matches
+    """
+    payloads = {match.id: _frozen_payload(match) for match in matches}
+    to_build = [match for match in matches if payloads[match.id] is None]
+    if not to_build:
+        return [payloads[match.id] for match in matches]
+
+    first_teams = get_first_teams(
+        player.id for match in to_build for team in (match.team1, match.team2) for player in team.players.all()
+    )
+    scores = get_match_scores(to_build)
+    for match in to_build:
+        payloads[match.id] = build_jegyzokonyv(match, first_teams, scores[match.id])
+
+    # A snapshot frozen meanwhile by refresh_jegyzokonyv_snapshots is newer, keep that one
+    JegyzokonyvSnapshot.objects.bulk_create([
+        JegyzokonyvSnapshot(match=match, payload=payloads[match.id])
+        for match in to_build if match.phase == 'finished'
+    ], ignore_conflicts=True)
+    return [payloads[match.id] for match in matches]
+
+
+def get_jegyzokonyv_payload(match: Match) -> Dict[str, Any]:
+    """
+    Get the match record, served from the frozen snapshot once the match is finished
+
+    Args:
+        match: Match object loaded with with_jegyzokonyv_relations
+
+    Returns:
+        Jegyzőkönyv payload in the JegyzokonyeSchema format
+    """
+    return get_jegyzokonyv_payloads([match])[0]
+
+
+# Printable rendering
+
+JEGYZOKONYV_TEMPLATE = 'jegyzokonyv.html'
+
+# Bump when the template changes, so cached renderings of unchanged matches are not reused
+JEGYZOKONYV_RENDER_VERSION = 1
+
+RENDER_CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+
+EVENT_LABELS = {
+    'match_start': 'Kezdés',
+    'goal': 'Gól',
+    'own_goal': 'Öngól',
+    'yellow_card': 'Sárga lap',
+    'red_card': 'Piros lap',
+    'half_time': 'Félidő vége',
+    'full_time': 'Rendes játékidő vége',
+    'extra_time': 'Hosszabbítás',
+    'match_end': 'Mérkőzés vége',
+}
+
+
+def pdf_rendering_available() -> bool:
+    """PDF output needs the optional weasyprint package"""
+    return HTML is not None
+
+
+def jegyzokonyv_digest(payload: Dict[str, Any]) -> str:
+    """
+    Content address of a jegyzőkönyv payload
+
+    Args:
+        payload: Jegyzőkönyv payload
+
+    Returns:
+        Hex digest that changes whenever the match data or the template version changes
+    """
+    data = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(f"{JEGYZOKONYV_RENDER_VERSION}:{data}".encode()).hexdigest()
+
+
+def _render_cache_key(digest: str, fmt: str) -> str:
+    return f"jegyzokonyv:{fmt}:{digest}"
+
+
+def _render(payload: Dict[str, Any], fmt: str) -> bytes:
+    """Render a payload without touching the cache or the database"""
+    referee = payload.get('referee')
+    referee_name = None
+    if referee:
+        user = referee['user']
+        referee_name = f"{user['last_name']} {user['first_name']}".strip() or user['username']
+
+    # Same fallback as Team.__str__ for teams without a name
+    teams = [
+        dict(team, display_name=team['name'] or f"{team['start_year']}{team['tagozat']}")
+        for team in (payload['team1'], payload['team2'])
+    ]
+
+    html = render_to_string(JEGYZOKONYV_TEMPLATE, {
+        'jk': payload,
+        'match_datetime': datetime.fromisoformat(payload['datetime']),
+        'referee_name': referee_name,
+        'teams': teams,
+        'team1': teams[0],
+        'team2': teams[1],
+        'events': [
+            dict(event, label=EVENT_LABELS.get(event['event_type'], event['event_type']))
+            for event in payload['events']
+        ],
+    })
+    if fmt == 'pdf':
+        return HTML(string=html).write_pdf()
+    return html.encode()
+
+
+def _render_task(digest: str, payload: Dict[str, Any], fmt: str) -> tuple[str, bytes]:
+    """Render a payload in a worker process, returning it with the digest it is cached under"""
+    return digest, _render(payload, fmt)
+
+
+def _init_render_worker() -> None:
+    # Workers started with spawn (macOS, Windows) do not inherit the configured Django
+    django.setup()
+
+
+def _render_missing(missing: Dict[str, Dict[str, Any]], fmt: str) -> List[tuple[str, bytes]]:
+    """
+    Render payloads by digest in JEGYZOKONYV_RENDER_WORKERS processes
+
+    Rendering is CPU-bound Python, so only separate processes render in
+    parallel. A pool size of 1 renders in the calling process.
+
+    Args:
+        missing: Digest -> payload of the renderings missing from the cache
+        fmt: 'html' or 'pdf'
+
+    Returns:
+        (digest, rendered document) pairs
+    """
+    workers = min(getattr(settings, 'JEGYZOKONYV_RENDER_WORKERS', 4), len(missing))
+    if workers <= 1:
+        return [_render_task(digest, payload, fmt) for digest, payload in missing.items()]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as pool:
+        futures = [pool.submit(_render_task, digest, payload, fmt) for digest, payload in missing.items()]
+        return [future.result() for future in futures]
+
+
+def render_jegyzokonyv(payload: Dict[str, Any], fmt: str = 'html') -> bytes:
+    """
+    Render a printable jegyzőkönyv, reusing the cached rendering of the same data
+
+    Args:
+        payload: Jegyzőkönyv payload
+        fmt: 'html' or 'pdf'
+
+    Returns:
+        Rendered document
+    """
+    return render_jegyzokonyv_bulk([payload], fmt)[0]
+
+
+def render_jegyzokonyv_bulk(payloads: List[Dict[str, Any]], fmt: str = 'html') -> List[bytes]:
+    """
+    Render many jegyzőkönyvs, rendering only the ones missing from the cache
+
+    Args:
+        payloads: Jegyzőkönyv payloads
+        fmt: 'html' or 'pdf'
+
+    Returns:
+        Rendered documents in the order of payloads
+    """
+    digests = [jegyzokonyv_digest(payload) for payload in payloads]
+    keys = [_render_cache_key(digest, fmt) for digest in digests]
+    cached = cache.get_many(keys)
+
+    # Identical payloads are rendered once
+    missing = {digest: payload for digest, key, payload in zip(digests, keys, payloads) if key not in cached}
+    if missing:
+        rendered = {_render_cache_key(digest, fmt): document for digest, document in _render_missing(missing, fmt)}
+        cache.set_many(rendered, timeout=getattr(settings, 'JEGYZOKONYV_RENDER_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
+        cached.update(rendered)
+
+    return [cached[key] for key in keys]
@@ -78,17 +78,17 @@ class Command(BaseCommand):
             # Create sample events for the match
             if created:
                 Event.objects.create(
+                    match=match,
                     event_type='goal',
                     minute=15,
                     player=teams[0].players.first()
                 )
                 Event.objects.create(
+                    match=match,
                     event_type='yellow_card',
                     minute=30,
                     player=teams[1].players.first()
                 )
-                
-                match.events.set(Event.objects.filter(player__in=[teams[0].players.first(), teams[1].players.first()]))
         
         self.stdout.write(
             self.style.SUCCESS('Successfully created sample data!')
@@ -564,10 +564,6 @@ Kovács András Márton|1|24 A
             events_for_match = team1_events + team2_events
             total_events_created += len(events_for_match)
             
-            # Add events to match
-            for event in events_for_match:
-                match.events.add(event)
-            
             if events_for_match:
                 self.stdout.write(f'  {team1_name} vs {team2_name}: Created {len(events_for_match)} goal events')
         
@@ -608,6 +604,7 @@ Kovács András Márton|1|24 A
                 try:
                     player = Player.objects.get(name=player_name)
                     event = Event.objects.create(
+                        match=match,
                         event_type='goal',
                         minute=goals_assigned * 10 + 10,  # Distribute throughout match
                         player=player
@@ -628,6 +625,7 @@ Kovács András Márton|1|24 A
                     try:
                         player = Player.objects.get(name=player_name)
                         event = Event.objects.create(
+                            match=match,
                             event_type='goal',
                             minute=goals_assigned * 10 + 10,
                             player=player
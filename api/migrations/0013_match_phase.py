@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:25
+
+from django.db import migrations, models
+
+
+# Snapshot of Match.PHASE_TRANSITIONS at the time of this migration
+PHASE_TRANSITIONS = {
+    'match_start': {'not_started': 'first_half', 'half_time': 'second_half'},
+    'half_time': {'first_half': 'half_time'},
+    'full_time': {'second_half': 'full_time', 'extra_time': 'full_time'},
+    'extra_time': {
+        'first_half': 'first_half',
+        'second_half': 'extra_time',
+        'full_time': 'extra_time',
+        'extra_time': 'extra_time',
+    },
+    'match_end': {
+        'not_started': 'finished',
+        'first_half': 'finished',
+        'half_time': 'finished',
+        'second_half': 'finished',
+        'full_time': 'finished',
+        'extra_time': 'finished',
+    },
+}
+
+
+def backfill_match_phase(apps, schema_editor):
+    Match = apps.get_model('api', 'Match')
+
+    for match in Match.objects.filter(events__event_type__in=PHASE_TRANSITIONS.keys()).distinct():
+        phase = 'not_started'
+        control_events = match.events.filter(
+            event_type__in=PHASE_TRANSITIONS.keys()
+        ).order_by('id').values_list('event_type', flat=True)
+        for event_type in control_events:
+            phase = PHASE_TRANSITIONS[event_type].get(phase, phase)
+
+        if phase != 'not_started':
+            Match.objects.filter(id=match.id).update(phase=phase)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_add_own_goal_event_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='phase',
+            field=models.CharField(choices=[('not_started', 'Not Started'), ('first_half', 'First Half'), ('half_time', 'Half Time'), ('second_half', 'Second Half'), ('full_time', 'Full Time'), ('extra_time', 'Extra Time'), ('finished', 'Finished')], default='not_started', max_length=20),
+        ),
+        migrations.RunPython(backfill_match_phase, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_match_phase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='phase_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
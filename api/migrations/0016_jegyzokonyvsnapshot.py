@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JegyzokonyvSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(verbose_name='Jegyzőkönyv')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='Frissítés ideje')),
+                ('match', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='jegyzokonyv_snapshot', to='api.match', verbose_name='Meccs')),
+            ],
+            options={
+                'verbose_name': 'Jegyzőkönyv pillanatkép',
+                'verbose_name_plural': 'Jegyzőkönyv pillanatképek',
+            },
+        ),
+    ]
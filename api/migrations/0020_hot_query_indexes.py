@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_type'], name='event_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['player', 'event_type'], name='event_player_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kozlemeny',
+            index=models.Index(condition=models.Q(('active', True)), fields=['-priority', '-date_created'], name='kozlemeny_active_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['tournament', 'status'], name='match_tournament_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['datetime'], name='match_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['referee', 'datetime'], name='match_referee_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='szankcio',
+            index=models.Index(fields=['tournament', 'team'], name='szankcio_tournament_team_idx'),
+        ),
+    ]
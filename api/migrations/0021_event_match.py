@@ -0,0 +1,63 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_event_match(apps, schema_editor):
+    Event = apps.get_model('api', 'Event')
+    MatchEvents = apps.get_model('api', 'Match').legacy_events.through
+
+    # One UPDATE for all events; an event linked to several matches keeps the first link
+    Event.objects.filter(match__isnull=True).update(
+        match=models.Subquery(
+            MatchEvents.objects.filter(event_id=models.OuterRef('pk')).order_by('id').values('match_id')[:1]
+        )
+    )
+
+
+def restore_match_events(apps, schema_editor):
+    Event = apps.get_model('api', 'Event')
+    MatchEvents = apps.get_model('api', 'Match').legacy_events.through
+
+    MatchEvents.objects.bulk_create(
+        [
+            MatchEvents(match_id=match_id, event_id=event_id)
+            for event_id, match_id in Event.objects.filter(match__isnull=False).values_list('id', 'match_id').iterator()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_hot_query_indexes'),
+    ]
+
+    operations = [
+        # Match.events becomes Match.legacy_events on the same join table, nothing changes in the database
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='match',
+                    old_name='events',
+                    new_name='legacy_events',
+                ),
+                migrations.AlterField(
+                    model_name='match',
+                    name='legacy_events',
+                    field=models.ManyToManyField(blank=True, db_table='api_match_events', related_name='legacy_matches', to='api.event'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='match',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.match'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['match', 'event_type'], name='event_match_type_idx'),
+        ),
+        migrations.RunPython(backfill_event_match, restore_match_events),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 # Auth
 
@@ -123,13 +123,115 @@ class Round(models.Model):
     def __str__(self):
         return f"{self.tournament.name} - Round {self.number}"
     
-class Match(models.Model):
+class VersionedModel(models.Model):
+    """
+    Row version for optimistic concurrency control.
+
+    Every save bumps the version. Editors send back the version they read and
+    save with save_if_version, which refuses the write if the row changed meanwhile.
+    Unconditional saves write the loaded version + 1 in their UPDATE, on the
+    condition that the row still has the loaded version. If another save got there
+    first, the stored version is bumped instead and read back, so two saves of the
+    same loaded row still end up with two different versions.
+    """
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not update_fields:
+            # Like Model.save(): an empty update_fields writes nothing, the version included
+            return
+        bump = not self._state.adding and not getattr(self, '_version_claimed', False)
+        if bump:
+            self._bumped_from = self.version
+            self.version += 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+        self._version_claimed = False
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self._bumped_from = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        bumped_from = getattr(self, '_bumped_from', None)
+        if bumped_from is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+        if super()._do_update(base_qs.filter(version=bumped_from), using, pk_val, values, update_fields, forced_update):
+            return True
+        # Saved by someone else since this instance was loaded: bump the stored version
+        values = [
+            (field, model, models.F('version') + 1 if field.attname == 'version' else value)
+            for field, model, value in values
+        ]
+        if not super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update):
+            return False
+        self.version = base_qs.filter(pk=pk_val).values_list('version', flat=True).get()
+        return True
+
+    def save_if_version(self, expected_version, update_fields=None):
+        """
+        Saves the instance only if the stored row still has expected_version.
+
+        The version is claimed with a conditional update first, so of two editors
+        that read the same version only one can save, without holding a lock while editing.
+        update_fields limits the write like in save().
+        Returns False on a version conflict.
+        """
+        with transaction.atomic():
+            claimed = type(self).objects.filter(pk=self.pk, version=expected_version).update(
+                version=expected_version + 1
+            )
+            if not claimed:
+                return False
+            self.version = expected_version + 1
+            self._version_claimed = True
+            self.save(update_fields=update_fields)
+        return True
+
+class Match(VersionedModel):
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('cancelled_new_date', 'Cancelled - New Date to be Published'),
         ('cancelled_no_date', 'Cancelled - New Date not to be Published'),
     ]
-    
+
+    PHASE_CHOICES = [
+        ('not_started', 'Not Started'),
+        ('first_half', 'First Half'),
+        ('half_time', 'Half Time'),
+        ('second_half', 'Second Half'),
+        ('full_time', 'Full Time'),
+        ('extra_time', 'Extra Time'),
+        ('finished', 'Finished'),
+    ]
+
+    # Allowed phase changes, keyed by the control event that triggers them
+    # (event_type -> {current phase: next phase}). Any other event type leaves the phase alone.
+    PHASE_TRANSITIONS = {
+        'match_start': {'not_started': 'first_half', 'half_time': 'second_half'},
+        'half_time': {'first_half': 'half_time'},
+        'full_time': {'second_half': 'full_time', 'extra_time': 'full_time'},
+        'extra_time': {
+            'first_half': 'first_half',  # First half stoppage time does not change the phase
+            'second_half': 'extra_time',
+            'full_time': 'extra_time',
+            'extra_time': 'extra_time',
+        },
+        'match_end': {
+            'not_started': 'finished',
+            'first_half': 'finished',
+            'half_time': 'finished',
+            'second_half': 'finished',
+            'full_time': 'finished',
+            'extra_time': 'finished',
+        },
+    }
+
     tournament = models.ForeignKey('Tournament', on_delete=models.CASCADE)
     team1 = models.ForeignKey('Team', related_name='team1_matches', on_delete=models.CASCADE)
     team2 = models.ForeignKey('Team', related_name='team2_matches', on_delete=models.CASCADE)
@@ -137,17 +239,81 @@ class Match(models.Model):
 
     round_obj = models.ForeignKey('Round', on_delete=models.CASCADE)
 
-    events = models.ManyToManyField('Event', blank=True)
+    # Deprecated: events now point to their match with Event.match (reverse accessor: match.events).
+    # The old join table is kept, no longer written, for one release and is dropped after that.
+    legacy_events = models.ManyToManyField('Event', blank=True, related_name='legacy_matches', db_table='api_match_events')
     photos = models.ManyToManyField('Photo', blank=True, verbose_name="Match Photos")
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active', null=True, blank=True)
     referee = models.ForeignKey('Profile', null=True, blank=True, on_delete=models.SET_NULL)
 
+    # Persisted match phase, advanced by the referee quick actions so reading it costs no queries
+    phase = models.CharField(max_length=20, choices=PHASE_CHOICES, default='not_started')
+    # Bumped whenever the phase or its control events change, clients use it to revalidate the clock anchors
+    phase_version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tournament', 'status'], name='match_tournament_status_idx'),
+            models.Index(fields=['datetime'], name='match_datetime_idx'),
+            models.Index(fields=['referee', 'datetime'], name='match_referee_datetime_idx'),
+        ]
+
     def delete(self, *args, **kwargs):
         # Delete related events
         self.events.all().delete()
         super().delete(*args, **kwargs)
 
+    def next_phase(self, event_type):
+        """
+        Returns the phase the match would move into if an event of this type was added,
+        or None if the transition is not allowed from the current phase.
+        """
+        if event_type not in self.PHASE_TRANSITIONS:
+            return self.phase
+        return self.PHASE_TRANSITIONS[event_type].get(self.phase)
+
+    def advance_phase(self, event_type):
+        """
+        Moves the match into the phase triggered by event_type.
+
+        The update is conditional on the phase still being the one we read, so two
+        devices racing to e.g. start the match cannot both succeed.
+        Returns False if the transition is not allowed.
+        """
+        new_phase = self.next_phase(event_type)
+        if new_phase is None:
+            return False
+        if new_phase == self.phase:
+            return True
+
+        updated = Match.objects.filter(id=self.id, phase=self.phase).update(
+            phase=new_phase, phase_version=models.F('phase_version') + 1
+        )
+        if not updated:
+            return False
+        self.phase = new_phase
+        self.phase_version += 1
+        return True
+
+    def refresh_phase(self):
+        """
+        Recomputes the phase by replaying the remaining control events.
+        Used by the undo paths after a control event has been removed or edited,
+        so the phase version is always bumped.
+        """
+        phase = 'not_started'
+        control_events = self.events.filter(
+            event_type__in=self.PHASE_TRANSITIONS.keys()
+        ).order_by('id').values_list('event_type', flat=True)
+        for event_type in control_events:
+            phase = self.PHASE_TRANSITIONS[event_type].get(phase, phase)
+
+        self.phase = phase
+        self.phase_version += 1
+        Match.objects.filter(id=self.id).update(phase=phase, phase_version=models.F('phase_version') + 1)
+        return phase
+
     def result(self):
         # Regular goals for each team
         goals_team1 = self.events.filter(event_type='goal', player__in=self.team1.players.all()).count()
@@ -177,7 +343,7 @@ class Match(models.Model):
     def __str__(self):
         return f"{self.team1} vs {self.team2} on {self.datetime}"
 
-class Event(models.Model):
+class Event(VersionedModel):
     EVENT_TYPES = [
         ('match_start', 'Match Start'),
         ('goal', 'Goal'),
@@ -197,10 +363,21 @@ class Event(models.Model):
 
     exact_time = models.DateTimeField(null=True, blank=True)
 
+    # Null only for events that were not linked to any match before the foreign key was added
+    match = models.ForeignKey('Match', related_name='events', on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+
     # Depending on event_type, player may be null (e.g., match_start)
     player = models.ForeignKey('Player', on_delete=models.CASCADE, null=True, blank=True)
     extra_time = models.IntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Also serves the lookups by match alone, in place of the foreign key's own index
+            models.Index(fields=['match', 'event_type'], name='event_match_type_idx'),
+            models.Index(fields=['event_type'], name='event_type_idx'),
+            models.Index(fields=['player', 'event_type'], name='event_player_type_idx'),
+        ]
+
     def __str__(self):
         return f"{self.get_event_type_display()} by {self.player} at {self.minute}'"
 
@@ -238,10 +415,86 @@ class Kozlemeny(models.Model):
         verbose_name = "Közlemény"
         verbose_name_plural = "Közlemények"
         ordering = ['-priority', '-date_created']
+        indexes = [
+            # Active announcements in display order. Partial, because Django filters booleans
+            # as WHERE "active" on SQLite, which a composite (active, ...) index cannot serve
+            models.Index(
+                fields=['-priority', '-date_created'], condition=models.Q(active=True),
+                name='kozlemeny_active_listing_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+class JegyzokonyvSnapshot(models.Model):
+    """
+    Frozen jegyzőkönyv of a finished match, served instead of rebuilding the record on every request.
+    Rebuilt whenever the events of the finished match are edited.
+    """
+    match = models.OneToOneField('Match', on_delete=models.CASCADE, related_name='jegyzokonyv_snapshot', verbose_name="Meccs")
+    payload = models.JSONField(verbose_name="Jegyzőkönyv")
+    date_updated = models.DateTimeField(auto_now=True, verbose_name="Frissítés ideje")
+
+    class Meta:
+        verbose_name = "Jegyzőkönyv pillanatkép"
+        verbose_name_plural = "Jegyzőkönyv pillanatképek"
+
+    def __str__(self):
+        return f"Jegyzőkönyv - {self.match}"
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response of a referee write, replayed when a client retries the request with the same key
+    """
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_fingerprint = models.CharField(max_length=255)  # "METHOD /path <hash of query and body>" the key was first used for
+
+    # Empty while the original request is still being processed (at most IDEMPOTENCY_CLAIM_LEASE seconds)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True, default='')
+
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.key}"
+
+class TokenGeneration(models.Model):
+    """
+    Per-user token generation, bumped when the user's roles change.
+    Tokens carrying an older generation are rejected, so role changes apply to issued tokens too.
+    """
+    user = models.OneToOneField('auth.User', on_delete=models.CASCADE, related_name='token_generation')
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} - {self.generation}"
+
+    @classmethod
+    def bump(cls, user_id):
+        """Invalidates every token issued to the user so far"""
+        with transaction.atomic():
+            obj, created = cls.objects.get_or_create(user_id=user_id, defaults={'generation': 1})
+            if not created:
+                cls.objects.filter(pk=obj.pk).update(generation=models.F('generation') + 1)
+
+class RevokedToken(models.Model):
+    """
+    Revoked token id (jti), or refresh token family ("family:<id>"), kept until the token would expire anyway
+    """
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
+
 class Szankcio(models.Model):
     team = models.ForeignKey('Team', on_delete=models.CASCADE, verbose_name="Csapat")
     tournament = models.ForeignKey('Tournament', on_delete=models.CASCADE, verbose_name="Bajnokság")
@@ -253,6 +506,9 @@ class Szankcio(models.Model):
         verbose_name = "Szankció"
         verbose_name_plural = "Szankciók"
         ordering = ['-date_created']
+        indexes = [
+            models.Index(fields=['tournament', 'team'], name='szankcio_tournament_team_idx'),
+        ]
 
     def __str__(self):
         return f"{self.team} - {self.minus_points} pont levonás ({self.tournament})"
\ No newline at end of file
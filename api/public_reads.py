@@ -0,0 +1,215 @@
+"""
+Data of the high-traffic read endpoints (/matches, /teams, /topscorers, /biro/my-matches), in sync and async form
+
+The async versions use Django's async ORM, so under ASGI the endpoints run on the
+event loop instead of taking a worker thread for the whole request. Every
+relation the response needs is loaded up front: lazy loading is not allowed in
+async code. The sync versions load the same data and serve as the baseline of
+benchmark_async_reads.py. /standings uses process_matches / aprocess_matches from utils.
+
+The other list endpoints build their responses with the sync helpers below, which
+load the related rows of a whole list in a fixed number of queries instead of
+one or more per row.
+"""
+from django.db import models
+
+from .models import Match, Event, Team
+from .referee_utils import get_match_scores, get_match_status
+from .schemas import (
+    TeamExtendedSchema, PlayerExtendedSchema, MatchStatusSchema, ProfileSchema,
+    match_to_schema, event_to_response_schema,
+)
+from .utils import get_goal_scorers, get_first_teams, aget_first_teams
+
+
+# Cancelled matches are left out of the goal, card and event statistics
+CANCELLED_MATCH = models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
+
+
+def with_match_relations(matches):
+    """Load everything match_to_schema reads along with a Match queryset"""
+    return matches.select_related(
+        'team1__tournament', 'team2__tournament', 'tournament', 'round_obj__tournament',
+        'referee__user', 'referee__player'
+    ).prefetch_related(
+        'team1__players', 'team2__players', 'events__player', 'photos'
+    )
+
+
+def _tournament_matches(tournament):
+    # Include all matches (including cancelled) for display purposes
+    return with_match_relations(Match.objects.filter(tournament=tournament))
+
+
+def get_events_of_matches(matches, **filters) -> list:
+    """
+    Events of the given matches in one query, with their players loaded
+
+    Args:
+        matches: Match queryset
+        **filters: Extra Event filters, e.g. event_type='goal'
+
+    Returns:
+        List of Event objects ordered by match and id
+    """
+    return list(
+        Event.objects.filter(match__in=matches, **filters).select_related('player').order_by('match_id', 'id')
+    )
+
+
+def get_tournament_matches(tournament) -> list:
+    """The tournament's matches in the MatchSchema format"""
+    return [match_to_schema(match) for match in _tournament_matches(tournament)]
+
+
+async def aget_tournament_matches(tournament) -> list:
+    """Async version of get_tournament_matches"""
+    return [match_to_schema(match) async for match in _tournament_matches(tournament)]
+
+
+def _assigned_matches(profile):
+    return with_match_relations(Match.objects.filter(referee=profile).order_by('datetime'))
+
+
+def get_assigned_matches(profile) -> list:
+    """The matches a referee is assigned to, in the MatchSchema format"""
+    return [match_to_schema(match) for match in _assigned_matches(profile)]
+
+
+async def aget_assigned_matches(profile) -> list:
+    """Async version of get_assigned_matches"""
+    return [match_to_schema(match) async for match in _assigned_matches(profile)]
+
+
+def _player_to_extended_schema(player, first_team) -> PlayerExtendedSchema:
+    # Same fallbacks as Player.get_start_year() and Player.get_tagozat(), with the first team already loaded
+    return PlayerExtendedSchema(
+        id=player.id,
+        name=player.name,
+        csk=player.csk,
+        start_year=player.start_year,
+        tagozat=player.tagozat,
+        effective_start_year=player.start_year or (first_team.start_year if first_team else None),
+        effective_tagozat=player.tagozat or (first_team.tagozat if first_team else None)
+    )
+
+
+def _teams_to_extended_schema(teams, first_teams) -> list[TeamExtendedSchema]:
+    return [
+        TeamExtendedSchema(
+            id=team.id,
+            name=team.name,
+            start_year=team.start_year,
+            tagozat=team.tagozat,
+            color=team.get_team_color(),
+            logo_url=team.logo_url,
+            active=team.active,
+            players=[
+                _player_to_extended_schema(player, first_teams.get(player.id))
+                for player in team.players.all()
+            ]
+        ) for team in teams
+    ]
+
+
+def _players_of(teams):
+    return {player.id for team in teams for player in team.players.all()}
+
+
+def teams_to_extended_schema(teams, first_teams=None) -> list[TeamExtendedSchema]:
+    """
+    Teams in the TeamExtendedSchema format, with their players' first teams loaded in one query
+
+    Args:
+        teams: Team queryset (the players are prefetched here) or list of teams
+        first_teams: Player id -> first team from get_first_teams, loaded if not given
+    """
+    if isinstance(teams, models.QuerySet):
+        teams = teams.prefetch_related('players')
+    teams = list(teams)
+    if first_teams is None:
+        first_teams = get_first_teams(_players_of(teams))
+    return _teams_to_extended_schema(teams, first_teams)
+
+
+def team_to_extended_schema(team) -> TeamExtendedSchema:
+    """A single team in the TeamExtendedSchema format, in two queries"""
+    return teams_to_extended_schema([team])[0]
+
+
+def players_to_extended_schema(players) -> list[PlayerExtendedSchema]:
+    """
+    Players in the PlayerExtendedSchema format, with their first teams loaded in one query
+
+    Args:
+        players: Player queryset or list
+    """
+    players = list(players)
+    first_teams = get_first_teams(player.id for player in players)
+    return [_player_to_extended_schema(player, first_teams.get(player.id)) for player in players]
+
+
+def match_statuses(matches) -> list[MatchStatusSchema]:
+    """
+    Matches in the MatchStatusSchema format used by the referee screens
+
+    Teams, players, events, referee and scores are loaded for the whole list at
+    once, so the number of queries does not depend on the number of matches.
+
+    Args:
+        matches: Match queryset
+    """
+    matches = list(matches.select_related('team1', 'team2', 'referee__user', 'referee__player').prefetch_related(
+        'team1__players', 'team2__players',
+        models.Prefetch('events', queryset=Event.objects.select_related('player').order_by('minute', 'id')),
+    ))
+    teams = [team for match in matches for team in (match.team1, match.team2)]
+    first_teams = get_first_teams(_players_of(teams))
+    scores = get_match_scores(matches)
+
+    statuses = []
+    for match in matches:
+        team1, team2 = teams_to_extended_schema([match.team1, match.team2], first_teams)
+        statuses.append(MatchStatusSchema(
+            id=match.id,
+            team1=team1,
+            team2=team2,
+            datetime=match.datetime.isoformat(),
+            referee=ProfileSchema.from_orm(match.referee) if match.referee else None,
+            events=[event_to_response_schema(event) for event in match.events.all()],
+            score=scores[match.id],
+            match_status=get_match_status(match),
+            status=match.status
+        ))
+    return statuses
+
+
+def get_tournament_teams(tournament) -> list[TeamExtendedSchema]:
+    """The tournament's teams with their players"""
+    return teams_to_extended_schema(Team.objects.filter(tournament=tournament))
+
+
+async def aget_tournament_teams(tournament) -> list[TeamExtendedSchema]:
+    """Async version of get_tournament_teams"""
+    teams = [team async for team in Team.objects.filter(tournament=tournament).prefetch_related('players')]
+    return _teams_to_extended_schema(teams, await aget_first_teams(_players_of(teams)))
+
+
+def _tournament_goals(tournament):
+    # Exclude cancelled matches from top scorers stats
+    matches = Match.objects.filter(tournament=tournament).exclude(CANCELLED_MATCH)
+    return Event.objects.filter(
+        match__in=matches, event_type='goal'
+    ).select_related('player').order_by('match__id', 'id')
+
+
+def get_tournament_top_scorers(tournament) -> list:
+    """Goal scorer ranking of the tournament"""
+    goals = list(_tournament_goals(tournament))
+    return get_goal_scorers(goals, scorer_teams=get_first_teams(goal.player_id for goal in goals))
+
+
+async def aget_tournament_top_scorers(tournament) -> list:
+    """Async version of get_tournament_top_scorers"""
+    goals = [goal async for goal in _tournament_goals(tournament)]
+    return get_goal_scorers(goals, scorer_teams=await aget_first_teams(goal.player_id for goal in goals))
@@ -0,0 +1,35 @@
+"""
+Query budgets of the API endpoints
+
+Every route declares the most database queries one request to it may run, right
+below its route decorator:
+
+    @router.get("/standings", response=list[StandingSchema])
+    @query_budget(5)
+    async def get_standings(request):
+
+The budget is not checked at runtime. QueryBudgetTests in tests.py calls every
+route of router, admin_router and biro_router on a seeded tournament and fails,
+listing the SQL, when a request runs more queries than its budget allows, so a
+new N+1 pattern shows up as a failing test instead of a slow endpoint.
+"""
+from typing import Optional
+
+
+def query_budget(max_queries: int):
+    """
+    Decorator declaring the query budget of an API route
+
+    Args:
+        max_queries: Most database queries one request may run, transaction
+            savepoints not included
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func) -> Optional[int]:
+    """The query budget declared for a view function, None if it has none"""
+    return getattr(view_func, 'query_budget', None)
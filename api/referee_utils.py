@@ -1,40 +1,72 @@
 """
 Utility functions specifically for referee (bíró) operations
 """
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Q
 from django.utils import timezone
-from .models import Match, Event, Player
-from typing import Optional, List, Dict, Any
+from datetime import date, datetime
+from .models import Match, Event, Player, Team
+from typing import Optional, List, Dict, Any, Iterator
+
+
+# Error messages for control events that are not allowed in the current match phase
+PHASE_TRANSITION_ERRORS = {
+    'match_start': 'Match has already started',
+    'half_time': 'Cannot end first half - match is not in first half',
+    'full_time': 'Cannot end second half - match is not in second half',
+    'extra_time': 'Cannot add extra time - match is not in progress',
+    'match_end': 'Match has already ended',
+}
+
+# Events that must name the player involved
+PLAYER_REQUIRED_EVENTS = ['goal', 'yellow_card', 'red_card']
+
+# Batched events also have to name the own goal's player, the side it counts for is derived from it
+BATCH_PLAYER_REQUIRED_EVENTS = PLAYER_REQUIRED_EVENTS + ['own_goal']
+
+# Length of a regular half in minutes, anything beyond it is shown as extra time (e.g. "10+2'")
+HALF_LENGTH_MINUTES = 10
+
+
+def local_date(value: datetime) -> date:
+    """
+    Get the date of a datetime in the current time zone
+    
+    With USE_TZ = False datetimes are naive local times already, which
+    timezone.localdate() refuses, so their own date is used.
+    
+    Args:
+        value: Aware or naive datetime
+        
+    Returns:
+        Local date
+    """
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
 
 
 def get_match_status(match: Match) -> str:
     """
-    Determine the current status of a match based on its events
+    Get the current phase of a match
+    
+    The phase is persisted on the match and advanced by the referee quick actions,
+    so this does not touch the events.
     
     Args:
         match: Match object
         
     Returns:
         String indicating match status: 'not_started', 'first_half', 'half_time', 
-        'second_half', 'extra_time', 'finished'
-    """
-    events = match.events.all().order_by('minute', 'id')
-    
-    if not events.filter(event_type='match_start').exists():
-        return "not_started"
-    elif events.filter(event_type='match_end').exists():
-        return "finished"
-    elif events.filter(event_type='extra_time').exists():
-        return "extra_time"
-    elif events.filter(event_type='full_time').exists():
-        return "second_half"
-    elif events.filter(event_type='half_time').exists():
-        return "half_time"
-    else:
-        return "first_half"
+        'second_half', 'full_time', 'extra_time', 'finished'
+    """
+    return match.phase
 
 
 def validate_event_data(event_type: str, minute: int, half: Optional[int], 
-                       player_id: Optional[int], match: Match) -> Dict[str, Any]:
+                       player_id: Optional[int], match: Match,
+                       roster: Optional[Dict[int, str]] = None,
+                       phase: Optional[str] = None) -> Dict[str, Any]:
     """
     Validate event data for creation
     
@@ -44,6 +76,8 @@ def validate_event_data(event_type: str, minute: int, half: Optional[int],
         half: Half of the match (1 or 2)
         player_id: ID of player involved (if applicable)
         match: Match object
+        roster: Player id -> side dictionary, loaded from the cache if not given
+        phase: Phase to check control events against instead of match.phase
         
     Returns:
         Dictionary with validation result and any errors
@@ -73,42 +107,301 @@ def validate_event_data(event_type: str, minute: int, half: Optional[int],
         result['errors'].append('Half must be 1 or 2')
     
     # Validate player for events that require players
-    player_required_events = ['goal', 'yellow_card', 'red_card']
-    if event_type in player_required_events:
+    if event_type in PLAYER_REQUIRED_EVENTS:
         if not player_id:
             result['valid'] = False
             result['errors'].append(f'Player ID required for {event_type} events')
-        else:
+        elif player_id not in (roster if roster is not None else get_cached_match_roster(match)):
             # Check if player belongs to one of the teams
-            try:
-                player = Player.objects.get(id=player_id)
-                if player not in match.team1.players.all() and player not in match.team2.players.all():
-                    result['valid'] = False
-                    result['errors'].append('Player does not belong to either team in this match')
-            except Player.DoesNotExist:
-                result['valid'] = False
+            result['valid'] = False
+            if Player.objects.filter(id=player_id).exists():
+                result['errors'].append('Player does not belong to either team in this match')
+            else:
                 result['errors'].append('Player not found')
     
-    # Validate match state for certain events
-    match_status = get_match_status(match)
-    
-    if event_type == 'match_start' and match_status != 'not_started':
+    # Validate match phase transitions for control events
+    if phase is None:
+        phase = match.phase
+    if event_type in Match.PHASE_TRANSITIONS and Match.PHASE_TRANSITIONS[event_type].get(phase) is None:
         result['valid'] = False
-        result['errors'].append('Match has already started')
+        result['errors'].append(PHASE_TRANSITION_ERRORS[event_type])
     
-    if event_type == 'half_time' and match_status not in ['first_half']:
-        result['valid'] = False
-        result['errors'].append('Cannot end first half - match is not in first half')
+    return result
+
+
+def get_match_roster(match: Match) -> Dict[int, str]:
+    """
+    Get the side of every rostered player of a match
     
-    if event_type == 'full_time' and match_status not in ['second_half']:
-        result['valid'] = False
-        result['errors'].append('Cannot end second half - match is not in second half')
+    Args:
+        match: Match object
+        
+    Returns:
+        Dictionary of player id -> 'team1' or 'team2' (players listed in both teams count as team1)
+    """
+    memberships = Team.players.through.objects.filter(
+        team_id__in=[match.team1_id, match.team2_id]
+    ).values_list('team_id', 'player_id')
+    
+    roster = {}
+    for team_id, player_id in memberships:
+        if team_id == match.team1_id:
+            roster[player_id] = 'team1'
+        else:
+            roster.setdefault(player_id, 'team2')
+    return roster
+
+
+def cache_is_process_local() -> bool:
+    """Whether the default cache lives in this process only, so other workers miss its deletions"""
+    return isinstance(caches['default'], LocMemCache)
+
+
+def _roster_cache_timeout() -> int:
+    if cache_is_process_local():
+        # invalidate_team_rosters only clears this process, bound how long other workers stay stale
+        return getattr(settings, 'MATCH_ROSTER_LOCAL_CACHE_TIMEOUT', 30)
+    return getattr(settings, 'MATCH_ROSTER_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _roster_cache_key(match_id: int, team1_id: int, team2_id: int) -> str:
+    # The team ids are part of the key, so reassigning a match's teams needs no invalidation
+    return f"match_roster:{match_id}:{team1_id}:{team2_id}"
+
+
+def get_cached_match_roster(match: Match) -> Dict[int, str]:
+    """
+    Get the roster index of a match from the cache, loading it on a miss
     
-    if event_type == 'match_end' and match_status == 'finished':
-        result['valid'] = False
-        result['errors'].append('Match has already ended')
+    The index is kept until the team memberships change (see invalidate_team_rosters),
+    or only for MATCH_ROSTER_LOCAL_CACHE_TIMEOUT seconds with a per-process cache.
     
-    return result
+    Args:
+        match: Match object
+        
+    Returns:
+        Dictionary of player id -> 'team1' or 'team2'
+    """
+    key = _roster_cache_key(match.id, match.team1_id, match.team2_id)
+    roster = cache.get(key)
+    if roster is None:
+        roster = get_match_roster(match)
+        cache.set(key, roster, _roster_cache_timeout())
+    return roster
+
+
+def invalidate_team_rosters(team_ids) -> None:
+    """
+    Drop the cached roster index of every match played by the given teams
+    
+    Args:
+        team_ids: IDs of the teams whose players changed
+    """
+    team_ids = list(team_ids)
+    if not team_ids:
+        return
+    matches = Match.objects.filter(
+        Q(team1_id__in=team_ids) | Q(team2_id__in=team_ids)
+    ).values_list('id', 'team1_id', 'team2_id')
+    cache.delete_many([_roster_cache_key(*match) for match in matches])
+
+
+def get_match_player(match: Match, player_id: int) -> Optional[Player]:
+    """
+    Get a player of one of the match's teams, checked against the cached roster index
+    
+    Args:
+        match: Match object
+        player_id: ID of the player
+        
+    Returns:
+        Player object, or None if the player is not in either team
+    """
+    if player_id not in get_cached_match_roster(match):
+        return None
+    return Player.objects.filter(id=player_id).first()
+
+
+def _match_scores_querysets(matches: List[Match]):
+    """Roster rows (team id, player id) of the teams and goal rows (match id, event type, player id) of the matches"""
+    team_ids = {match.team1_id for match in matches} | {match.team2_id for match in matches}
+    roster_rows = Team.players.through.objects.filter(
+        team_id__in=team_ids
+    ).values_list('team_id', 'player_id')
+    goal_rows = Event.objects.filter(
+        match_id__in=[match.id for match in matches],
+        event_type__in=['goal', 'own_goal']
+    ).values_list('match_id', 'event_type', 'player_id')
+    return roster_rows, goal_rows
+
+
+def _count_match_scores(matches: List[Match], roster_rows, goal_rows) -> Dict[int, tuple[int, int]]:
+    team_players = {}
+    for team_id, player_id in roster_rows:
+        team_players.setdefault(team_id, set()).add(player_id)
+
+    matches_by_id = {match.id: match for match in matches}
+    scores = {match.id: [0, 0] for match in matches}
+    for match_id, event_type, player_id in goal_rows:
+        match = matches_by_id[match_id]
+        score = scores[match_id]
+        in_team1 = player_id in team_players.get(match.team1_id, ())
+        in_team2 = player_id in team_players.get(match.team2_id, ())
+        if event_type == 'goal':
+            score[0] += in_team1
+            score[1] += in_team2
+        else:
+            # Own goals count for the opponent team
+            score[0] += in_team2
+            score[1] += in_team1
+
+    return {match_id: tuple(score) for match_id, score in scores.items()}
+
+
+def get_match_scores(matches: List[Match]) -> Dict[int, tuple[int, int]]:
+    """
+    Get the score of many matches at once, same as match.result() for each
+
+    Runs one roster query for all the teams and one query for the goals of all the matches.
+
+    Args:
+        matches: List of Match objects
+
+    Returns:
+        Dictionary of match id -> (team1_goals, team2_goals)
+    """
+    if not matches:
+        return {}
+    roster_rows, goal_rows = _match_scores_querysets(matches)
+    return _count_match_scores(matches, roster_rows, goal_rows)
+
+
+async def aget_match_scores(matches: List[Match]) -> Dict[int, tuple[int, int]]:
+    """Async version of get_match_scores, using the async ORM"""
+    if not matches:
+        return {}
+    roster_rows, goal_rows = _match_scores_querysets(matches)
+    return _count_match_scores(
+        matches,
+        [row async for row in roster_rows],
+        [row async for row in goal_rows],
+    )
+
+
+def validate_event_batch(events: List[Dict[str, Any]], match: Match,
+                         roster: Dict[int, str]) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]], str]:
+    """
+    Validate an ordered list of events against one in-memory match state
+    
+    Each event goes through validate_event_data as if all the events before it
+    had already been saved, so a batch may e.g. start the match and then add goals.
+    Own goals additionally have to name a player of either team.
+    
+    Args:
+        events: List of event dictionaries (event_type, minute, half, player_id)
+        match: Match object
+        roster: Player id -> side dictionary from get_match_roster
+        
+    Returns:
+        Tuple of (list of {'index', 'errors'} for invalid events,
+        list of {'index', 'warnings'} for events with warnings, phase after the batch)
+    """
+    phase = match.phase
+    invalid_events = []
+    warnings = []
+    
+    for index, event in enumerate(events):
+        player_id = event.get('player_id')
+        result = validate_event_data(
+            event['event_type'], event['minute'], event.get('half'), player_id,
+            match, roster=roster, phase=phase
+        )
+        
+        if event['event_type'] in BATCH_PLAYER_REQUIRED_EVENTS and event['event_type'] not in PLAYER_REQUIRED_EVENTS:
+            if not player_id:
+                result['valid'] = False
+                result['errors'].append(f"Player ID required for {event['event_type']} events")
+            elif player_id not in roster:
+                result['valid'] = False
+                result['errors'].append('Player does not belong to either team in this match')
+        
+        # The only cross-event rule: control events move the simulated phase along
+        if result['valid'] and event['event_type'] in Match.PHASE_TRANSITIONS:
+            phase = Match.PHASE_TRANSITIONS[event['event_type']][phase]
+        
+        if not result['valid']:
+            invalid_events.append({'index': index, 'errors': result['errors']})
+        if result['warnings']:
+            warnings.append({'index': index, 'warnings': result['warnings']})
+    
+    return invalid_events, warnings, phase
+
+
+def get_undoable_events_analysis(events: List[Event]) -> List[Dict[str, Any]]:
+    """
+    Decide for every event of a match whether it can be safely undone
+    
+    Works on the events loaded once (in display order) and runs in linear time:
+    one pass collects the latest minute overall and per player and the number of
+    second half events, a second pass applies the undo rules:
+    
+    - match start: no other event may happen after it
+    - half time: no second half events may exist
+    - red card: the player may not have events after the red card
+    
+    Args:
+        events: List of the match's Event objects (with player loaded)
+        
+    Returns:
+        List of event dictionaries with 'can_undo' and 'cannot_undo_reasons', in the given order
+    """
+    latest_minute = None
+    latest_minute_by_player = {}
+    second_half_count = 0
+    
+    for event in events:
+        if latest_minute is None or event.minute > latest_minute:
+            latest_minute = event.minute
+        if event.player_id is not None:
+            player_latest = latest_minute_by_player.get(event.player_id)
+            if player_latest is None or event.minute > player_latest:
+                latest_minute_by_player[event.player_id] = event.minute
+        if event.half == 2:
+            second_half_count += 1
+    
+    undoable_events = []
+    for event in events:
+        can_undo = True
+        reasons = []
+        
+        if event.event_type == 'match_start':
+            if latest_minute > event.minute:
+                can_undo = False
+                reasons.append("Other events exist after match start")
+        
+        elif event.event_type == 'half_time':
+            # The half time event itself does not count as a second half event
+            if second_half_count - (1 if event.half == 2 else 0) > 0:
+                can_undo = False
+                reasons.append("Second half events exist")
+        
+        elif event.event_type == 'red_card' and event.player_id is not None:
+            if latest_minute_by_player[event.player_id] > event.minute:
+                can_undo = False
+                reasons.append("Player has events after red card")
+        
+        undoable_events.append({
+            'id': event.id,
+            'event_type': event.event_type,
+            'minute': event.minute,
+            'half': event.half,
+            'player_name': event.player.name if event.player else None,
+            'exact_time': event.exact_time.isoformat() if event.exact_time else None,
+            'can_undo': can_undo,
+            'cannot_undo_reasons': reasons
+        })
+    
+    return undoable_events
 
 
 def get_half_time_score(match: Match) -> tuple[int, int]:
@@ -122,15 +415,15 @@ def get_half_time_score(match: Match) -> tuple[int, int]:
         Tuple of (team1_goals, team2_goals) at half time
     """
     # Get goals from first half only (minute <= 45)
-    first_half_goals = match.events.filter(
+    first_half_scorers = match.events.filter(
         event_type='goal',
         minute__lte=45
-    )
+    ).values_list('player_id', flat=True)
     
-    goals_team1 = first_half_goals.filter(player__in=match.team1.players.all()).count()
-    goals_team2 = first_half_goals.filter(player__in=match.team2.players.all()).count()
+    roster = get_cached_match_roster(match)
+    sides = [roster.get(player_id) for player_id in first_half_scorers]
     
-    return (goals_team1, goals_team2)
+    return (sides.count('team1'), sides.count('team2'))
 
 
 def get_match_timeline(match: Match) -> List[Dict[str, Any]]:
@@ -143,35 +436,79 @@ def get_match_timeline(match: Match) -> List[Dict[str, Any]]:
     Returns:
         List of events in chronological order with additional metadata
     """
-    events = match.events.all().order_by('minute', 'minute_extra_time', 'id')
-    timeline = []
+    events = match.events.select_related('player').order_by('minute', 'minute_extra_time', 'id')
+    roster = get_cached_match_roster(match)
     
-    for event in events:
-        timeline_event = {
-            'id': event.id,
-            'event_type': event.event_type,
-            'event_type_display': event.get_event_type_display(),
-            'minute': event.minute,
-            'minute_extra_time': event.minute_extra_time,
-            'half': event.half,
-            'player': {
-                'id': event.player.id,
-                'name': event.player.name
-            } if event.player else None,
-            'team': None,
-            'exact_time': event.exact_time.isoformat() if event.exact_time else None
-        }
-        
-        # Determine which team the player belongs to
-        if event.player:
-            if event.player in match.team1.players.all():
-                timeline_event['team'] = 'team1'
-            elif event.player in match.team2.players.all():
-                timeline_event['team'] = 'team2'
+    # Determine which team the player belongs to from the roster index
+    return [_timeline_event(event, roster.get(event.player_id)) for event in events]
+
+
+def _timeline_event(event: Event, team: Optional[str]) -> Dict[str, Any]:
+    return {
+        'id': event.id,
+        'event_type': event.event_type,
+        'event_type_display': event.get_event_type_display(),
+        'minute': event.minute,
+        'minute_extra_time': event.minute_extra_time,
+        'half': event.half,
+        'player': {
+            'id': event.player.id,
+            'name': event.player.name
+        } if event.player else None,
+        'team': team,
+        'exact_time': event.exact_time.isoformat() if event.exact_time else None
+    }
+
+
+def iter_match_timelines(matches: List[Match]) -> Iterator[tuple[Match, List[Dict[str, Any]]]]:
+    """
+    Get the timelines of many matches, same as get_match_timeline for each
+    
+    Runs one roster query for all the teams and one events query for all the matches,
+    and yields every timeline as soon as its events have been read.
+    
+    Args:
+        matches: List of Match objects
         
-        timeline.append(timeline_event)
+    Yields:
+        Tuples of (match, timeline) in match id order
+    """
+    matches = sorted(matches, key=lambda match: match.id)
+    if not matches:
+        return
+    
+    team_players = {}
+    for team_id, player_id in Team.players.through.objects.filter(
+        team_id__in={match.team1_id for match in matches} | {match.team2_id for match in matches}
+    ).values_list('team_id', 'player_id'):
+        team_players.setdefault(team_id, set()).add(player_id)
+    
+    def side(match, player_id):
+        # Players listed in both teams count as team1, like the roster index
+        if player_id in team_players.get(match.team1_id, ()):
+            return 'team1'
+        if player_id in team_players.get(match.team2_id, ()):
+            return 'team2'
+        return None
+    
+    events = Event.objects.filter(
+        match_id__in=[match.id for match in matches]
+    ).select_related('player').order_by(
+        'match_id', 'minute', 'minute_extra_time', 'id'
+    )
     
-    return timeline
+    pending = iter(matches)
+    current = next(pending)
+    timeline = []
+    for event in events.iterator(chunk_size=500):
+        while current.id != event.match_id:
+            yield current, timeline
+            current, timeline = next(pending), []
+        timeline.append(_timeline_event(event, side(current, event.player_id)))
+    
+    yield current, timeline
+    for match in pending:
+        yield match, []
 
 
 def get_player_statistics(player: Player, match: Match) -> Dict[str, Any]:
@@ -230,6 +567,80 @@ def get_team_statistics(team_id: int, match: Match) -> Dict[str, Any]:
     }
 
 
+def get_match_statistics_summary(match: Match) -> Dict[str, Any]:
+    """
+    Get team, player and score statistics of a match from a single scan of its events
+
+    Gives the same result as get_team_statistics for both teams, get_half_time_score
+    and match.result(), with one roster query and one events query in total.
+
+    Args:
+        match: Match object (select_related('team1', 'team2') avoids two more queries)
+
+    Returns:
+        Dictionary with team1, team2, half_time_score and final_score
+    """
+    memberships = Team.players.through.objects.filter(
+        team_id__in=[match.team1_id, match.team2_id]
+    ).select_related('player').order_by('player_id')
+
+    team_players = {match.team1_id: [], match.team2_id: []}
+    for membership in memberships:
+        team_players[membership.team_id].append(membership.player)
+
+    # Per player counters of every event type, a player may even be rostered in both teams
+    player_counts = {}
+    # Goals in minute <= 45 count for the half-time score, like get_half_time_score
+    first_half_goals = {}
+    for player_id, event_type, minute in match.events.values_list('player_id', 'event_type', 'minute'):
+        if player_id is None:
+            continue
+        counts = player_counts.setdefault(player_id, {})
+        counts[event_type] = counts.get(event_type, 0) + 1
+        if event_type == 'goal' and minute <= 45:
+            first_half_goals[player_id] = first_half_goals.get(player_id, 0) + 1
+
+    def team_summary(team_id, team):
+        players = team_players[team.id]
+        # Events are counted once per player even if the player is listed twice
+        player_ids = {player.id for player in players}
+
+        def total(event_type):
+            return sum(player_counts.get(player_id, {}).get(event_type, 0) for player_id in player_ids)
+
+        return {
+            'team_id': team_id,
+            'team_name': str(team),
+            'goals': total('goal'),
+            'yellow_cards': total('yellow_card'),
+            'red_cards': total('red_card'),
+            'players': [
+                {
+                    'player_id': player.id,
+                    'player_name': player.name,
+                    'goals': player_counts.get(player.id, {}).get('goal', 0),
+                    'yellow_cards': player_counts.get(player.id, {}).get('yellow_card', 0),
+                    'red_cards': player_counts.get(player.id, {}).get('red_card', 0),
+                    'total_events': sum(player_counts.get(player.id, {}).values())
+                } for player in players
+            ],
+            'own_goals': total('own_goal'),
+            'first_half_goals': sum(first_half_goals.get(player_id, 0) for player_id in player_ids),
+        }
+
+    team1 = team_summary(1, match.team1)
+    team2 = team_summary(2, match.team2)
+    own_goals_team1 = team1.pop('own_goals')
+    own_goals_team2 = team2.pop('own_goals')
+
+    return {
+        'team1': team1,
+        'team2': team2,
+        'half_time_score': (team1.pop('first_half_goals'), team2.pop('first_half_goals')),
+        'final_score': (team1['goals'] + own_goals_team2, team2['goals'] + own_goals_team1),
+    }
+
+
 def can_referee_edit_match(user, match: Match) -> bool:
     """
     Check if a user (referee) can edit a specific match
@@ -399,4 +810,118 @@ def get_current_match_minute_with_extra_time(match) -> tuple[int, int]:
     if last_event:
         return (last_event.minute, last_event.minute_extra_time or 0)
     
-    return (0, 0)
\ No newline at end of file
+    return (0, 0)
+
+def get_clock_anchors(match: Match) -> Dict[str, Any]:
+    """
+    Get the anchors clients need to compute the live match minute locally
+    
+    The anchors only change together with the match phase (or when a control
+    event is edited), both of which bump match.phase_version, so clients can
+    cache them and re-fetch only when the version changes.
+    
+    Args:
+        match: Match object
+        
+    Returns:
+        Dictionary with the phase, its version and the clock anchors
+    """
+    control_events = match.events.filter(
+        event_type__in=['match_start', 'half_time', 'full_time', 'match_end']
+    ).order_by('id').values('event_type', 'half', 'minute', 'minute_extra_time', 'exact_time')
+    
+    first_half_start = None
+    second_half_start = None
+    half_time = None
+    full_time = None
+    match_end = None
+    for event in control_events:
+        if event['event_type'] == 'match_start':
+            if event['half'] == 2:
+                second_half_start = second_half_start or event
+            else:
+                first_half_start = first_half_start or event
+        elif event['event_type'] == 'half_time':
+            half_time = half_time or event
+        elif event['event_type'] == 'full_time':
+            full_time = full_time or event
+        elif event['event_type'] == 'match_end':
+            match_end = match_end or event
+
+    # The clock is stopped during the break and after the final whistle
+    stopped_at = None
+    if match.phase == 'half_time':
+        stopped_at = half_time
+    elif match.phase in ('full_time', 'finished'):
+        stopped_at = full_time or match_end
+    
+    def anchor_time(event):
+        if not event or not event['exact_time']:
+            return None
+        return event['exact_time'].isoformat()
+    
+    def anchor_timestamp(event):
+        if not event or not event['exact_time']:
+            return None
+        return event['exact_time'].timestamp()
+    
+    return {
+        'match_id': match.id,
+        'phase': match.phase,
+        'phase_version': match.phase_version,
+        'half_length': HALF_LENGTH_MINUTES,
+        'first_half_start': anchor_time(first_half_start),
+        'first_half_start_timestamp': anchor_timestamp(first_half_start),
+        'second_half_start': anchor_time(second_half_start),
+        'second_half_start_timestamp': anchor_timestamp(second_half_start),
+        'first_half_end_minute': half_time['minute'] if half_time else None,
+        'stopped_minute': stopped_at['minute'] if stopped_at else None,
+        'stopped_extra_time': stopped_at['minute_extra_time'] if stopped_at else None,
+    }
+
+
+def compute_match_minute(anchors: Dict[str, Any], now_timestamp: float) -> tuple[Optional[int], Optional[int]]:
+    """
+    Compute the current match minute from the clock anchors
+    
+    This is the reference implementation clients should mirror when ticking
+    the clock locally:
+    
+    - while the clock is stopped, show stopped_minute (+stopped_extra_time)
+    - in the second half, elapsed = whole minutes since second_half_start;
+      up to half_length show first_half_end_minute + elapsed, after that
+      first_half_end_minute + half_length with elapsed - half_length extra time
+    - in the first half, elapsed = whole minutes since first_half_start;
+      up to half_length show max(1, elapsed), after that half_length with
+      elapsed - half_length extra time
+    
+    Args:
+        anchors: Dictionary returned by get_clock_anchors
+        now_timestamp: Current unix timestamp (server-synchronised on clients)
+        
+    Returns:
+        Tuple of (minute, extra_time_minute), extra time is None when not in stoppage time
+    """
+    half_length = anchors['half_length']
+    
+    if anchors['stopped_minute'] is not None:
+        return (anchors['stopped_minute'], anchors['stopped_extra_time'])
+    
+    if anchors['second_half_start_timestamp'] is not None:
+        elapsed_minutes = int((now_timestamp - anchors['second_half_start_timestamp']) / 60)
+        first_half_end = anchors['first_half_end_minute'] or half_length
+        if elapsed_minutes <= half_length:
+            return (first_half_end + elapsed_minutes, None)
+        return (first_half_end + half_length, elapsed_minutes - half_length)
+    
+    if anchors['phase'] == 'second_half' or anchors['phase'] == 'extra_time':
+        # Second half started without a recorded start time
+        return ((anchors['first_half_end_minute'] or half_length) + 1, None)
+    
+    if anchors['first_half_start_timestamp'] is not None:
+        elapsed_minutes = int((now_timestamp - anchors['first_half_start_timestamp']) / 60)
+        if elapsed_minutes <= half_length:
+            return (max(1, elapsed_minutes), None)
+        return (half_length, elapsed_minutes - half_length)
+    
+    return (1, None)
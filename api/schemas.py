@@ -93,18 +93,22 @@ class TeamUpdateSchema(Schema):
 
 class EventSchema(ModelSchema):
     player: PlayerSchema | None = None
-    match: 'MatchSchema | None' = None
 
     class Meta:
         model = Event
         fields = '__all__'
 
-class EndHalfSchema(Schema):
+class ClientTimeSchema(Schema):
+    """Optional client timestamp of an event, corrected with the clock offset from /api/time/sync"""
+    client_time: float | None = None  # Unix timestamp on the client clock
+    clock_offset: float | None = None  # Server clock - client clock, in seconds
+
+class EndHalfSchema(ClientTimeSchema):
     half: int
     minute: int
     minute_extra_time: int | None = None
 
-class EndMatchSchema(Schema):
+class EndMatchSchema(ClientTimeSchema):
     half: int
     minute: int
     minute_extra_time: int | None = None
@@ -121,7 +125,25 @@ class EventResponseSchema(Schema):
     exact_time: str | None = None
     player: PlayerSchema | None = None
     extra_time: int | None = None
-
+    version: int | None = None  # Send back in EventUpdateSchema.version or If-Match to detect conflicting edits
+
+def event_to_response_schema(event) -> EventResponseSchema:
+    """Convert Event object to EventResponseSchema with formatted time"""
+    formatted_time = f"{event.minute}+{event.minute_extra_time}'" if event.minute_extra_time else f"{event.minute}'"
+    
+    return EventResponseSchema(
+        id=event.id,
+        event_type=event.event_type,
+        half=event.half,
+        minute=event.minute,
+        minute_extra_time=event.minute_extra_time,
+        formatted_time=formatted_time,
+        exact_time=event.exact_time.isoformat() if event.exact_time else None,
+        player=PlayerSchema.from_orm(event.player) if event.player else None,
+        extra_time=event.extra_time,
+        version=event.version
+    )
+
 # Photo schemas
 
 class PhotoSchema(ModelSchema):
@@ -153,7 +175,36 @@ class MatchSchema(ModelSchema):
 
     class Meta:
         model = Match
-        fields = '__all__'
+        exclude = ['legacy_events']
+
+def match_to_schema(match) -> dict:
+    """Convert Match object to MatchSchema dict with properly formatted events"""
+    # Convert match to dict first, excluding problematic related fields
+    match_dict = {
+        'id': match.id,
+        'team1': match.team1,
+        'team2': match.team2,
+        'tournament': match.tournament,
+        'round_obj': match.round_obj,
+        'referee': match.referee,
+        'datetime': match.datetime,
+        'status': match.status if match.status else 'active',
+        'phase': match.phase,
+        'phase_version': match.phase_version,
+        'version': match.version,
+        'events': [event_to_response_schema(event) for event in match.events.all()],
+        'photos': list(match.photos.all()) if hasattr(match, 'photos') else []
+    }
+    
+    # Use MatchSchema to validate and serialize
+    match_schema = MatchSchema.model_validate(match_dict)
+    return match_schema.model_dump()
+
+
+def matches_to_schema_list(matches) -> list:
+    """Convert Match queryset to list of MatchSchema dicts with properly formatted events"""
+    return [match_to_schema(match) for match in matches]
+
 
 class StandingSchema(Schema):
     id: int
@@ -237,6 +288,7 @@ class LoginResponseSchema(Schema):
     message: str
     user: UserSchema | None = None
     token: str | None = None
+    refresh_token: str | None = None
 
 class LogoutResponseSchema(Schema):
     success: bool
@@ -248,30 +300,30 @@ class AuthStatusSchema(Schema):
 
 # Referee (Bíró) specific schemas
 
-class QuickGoalSchema(Schema):
+class QuickGoalSchema(ClientTimeSchema):
     player_id: int
     minute: int
     minute_extra_time: int | None = None  # Support for extra time (A in X+A format)
     half: int = 1
 
-class QuickOwnGoalSchema(Schema):
+class QuickOwnGoalSchema(ClientTimeSchema):
     player_id: int  # Player who scored the own goal
     minute: int
     minute_extra_time: int | None = None  # Support for extra time (A in X+A format)
     half: int = 1
 
-class QuickCardSchema(Schema):
+class QuickCardSchema(ClientTimeSchema):
     player_id: int
     minute: int
     minute_extra_time: int | None = None  # Support for extra time (A in X+A format)
     half: int = 1
     card_type: str  # "yellow" or "red"
 
-class ExtraTimeSchema(Schema):
+class ExtraTimeSchema(ClientTimeSchema):
     extra_time_minutes: int
     half: int = 1
 
-class EventCreateSchema(Schema):
+class EventCreateSchema(ClientTimeSchema):
     event_type: str  # From EVENT_TYPES choices
     half: int | None = None
     minute: int
@@ -279,6 +331,10 @@ class EventCreateSchema(Schema):
     player_id: int | None = None
     extra_time: int | None = None
 
+class EventBatchSchema(Schema):
+    """Ordered list of events queued on a referee device while offline"""
+    events: list[EventCreateSchema]
+
 class EventUpdateSchema(Schema):
     event_type: str | None = None
     half: int | None = None
@@ -286,11 +342,13 @@ class EventUpdateSchema(Schema):
     minute_extra_time: int | None = None
     player_id: int | None = None
     extra_time: int | None = None
+    version: int | None = None  # Version the edit is based on, 409 if the event changed since
 
 class MatchUpdateSchema(Schema):
     datetime: str | None = None
     referee_id: int | None = None
     status: str | None = None
+    version: int | None = None  # Version the edit is based on, 409 if the match changed since
 
 class MatchStatusSchema(Schema):
     id: int
@@ -300,7 +358,7 @@ class MatchStatusSchema(Schema):
     referee: ProfileSchema | None = None
     events: list[EventResponseSchema] = []
     score: tuple[int, int]  # (team1_goals, team2_goals)
-    match_status: str  # 'not_started', 'first_half', 'half_time', 'second_half', 'extra_time', 'finished'
+    match_status: str  # 'not_started', 'first_half', 'half_time', 'second_half', 'full_time', 'extra_time', 'finished'
     status: str | None = None  # 'active', 'cancelled_new_date', 'cancelled_no_date'
 
 class JegyzokonyeSchema(Schema):
@@ -320,6 +378,20 @@ class JegyzokonyeSchema(Schema):
     match_duration: int | None = None  # Duration in minutes
     notes: str | None = None
 
+class ClockAnchorsSchema(Schema):
+    """Phase anchors for computing the live match minute on the client"""
+    match_id: int
+    phase: str
+    phase_version: int  # Changes whenever the anchors change
+    half_length: int  # Regular half length in minutes
+    first_half_start: str | None = None  # ISO format datetime string
+    first_half_start_timestamp: float | None = None  # Unix timestamp
+    second_half_start: str | None = None
+    second_half_start_timestamp: float | None = None
+    first_half_end_minute: int | None = None
+    stopped_minute: int | None = None  # Set while the clock is stopped (half time, full time)
+    stopped_extra_time: int | None = None
+
 class LiveMatchUpdateSchema(Schema):
     """Schema for real-time match updates"""
     match_id: int
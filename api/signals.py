@@ -0,0 +1,134 @@
+"""
+Model signal handlers of the api app, connected in ApiConfig.ready
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, pre_delete, post_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+
+from .auth import token_cache, token_generations
+from .models import Event, Team, Player, Profile, TokenGeneration
+from .jegyzokonyv import refresh_jegyzokonyv_snapshots
+from .referee_utils import invalidate_team_rosters
+
+
+def _refresh_snapshots_on_commit(match_ids):
+    """Rebuild the jegyzőkönyv snapshots once the surrounding transaction has committed"""
+    match_ids = set(match_ids)
+    if match_ids:
+        transaction.on_commit(lambda: refresh_jegyzokonyv_snapshots(match_ids))
+
+
+@receiver(pre_save, sender=Event)
+def event_saving(sender, instance, update_fields=None, **kwargs):
+    # An event moved to another match changes the snapshot of the match it leaves too
+    stored = None
+    if instance.pk is not None and (update_fields is None or 'match' in update_fields):
+        stored = sender.objects.filter(pk=instance.pk).values_list('match_id', flat=True).first()
+    instance._stored_match_id = stored
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    _refresh_snapshots_on_commit(
+        match_id for match_id in (instance.match_id, getattr(instance, '_stored_match_id', None)) if match_id
+    )
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    if instance.match_id:
+        _refresh_snapshots_on_commit([instance.match_id])
+
+
+def _invalidate_rosters_on_commit(team_ids):
+    """Drop the cached match rosters of the teams once the membership change is committed"""
+    team_ids = set(team_ids)
+    if team_ids:
+        transaction.on_commit(lambda: invalidate_team_rosters(team_ids))
+
+
+@receiver(m2m_changed, sender=Team.players.through)
+def team_players_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # player.team_set.clear() does not report the affected teams afterwards
+        instance._roster_team_ids = list(instance.team_set.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _invalidate_rosters_on_commit([instance.pk])
+    elif action == 'post_clear':
+        _invalidate_rosters_on_commit(getattr(instance, '_roster_team_ids', []))
+    else:
+        _invalidate_rosters_on_commit(pk_set)
+
+
+@receiver(pre_delete, sender=Player)
+def player_deleting(sender, instance, **kwargs):
+    # Deleting a player removes its memberships without an m2m_changed signal
+    _invalidate_rosters_on_commit(instance.team_set.values_list('id', flat=True))
+
+
+# Fields signed into the role claims of a user's tokens
+USER_ROLE_FIELDS = ('is_staff', 'is_superuser', 'is_active')
+PROFILE_ROLE_FIELDS = ('biro', 'player_id')
+
+
+def _revoke_tokens(user_id):
+    """Reject the tokens issued to the user so far, their role claims are out of date"""
+    TokenGeneration.bump(user_id)
+    token_cache.forget_user(user_id)
+    transaction.on_commit(token_generations.invalidate)
+
+
+def _stored_roles(sender, instance, update_fields, role_fields):
+    if instance.pk is None:
+        return None
+    if update_fields is not None and not set(update_fields) & set(role_fields):
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(*role_fields).first()
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    instance._stored_roles = _stored_roles(sender, instance, update_fields, USER_ROLE_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # Cached principals carry the user's flags, drop them
+    token_cache.forget_user(instance.id)
+    stored_roles = getattr(instance, '_stored_roles', None)
+    if stored_roles is not None and stored_roles != tuple(getattr(instance, field) for field in USER_ROLE_FIELDS):
+        _revoke_tokens(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    token_cache.forget_user(instance.id)
+
+
+@receiver(pre_save, sender=Profile)
+def profile_saving(sender, instance, update_fields=None, **kwargs):
+    instance._stored_roles = _stored_roles(sender, instance, update_fields, PROFILE_ROLE_FIELDS)
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, created, **kwargs):
+    token_cache.forget_user(instance.user_id)
+    stored_roles = getattr(instance, '_stored_roles', None)
+    if created or (stored_roles is not None and stored_roles != tuple(getattr(instance, field) for field in PROFILE_ROLE_FIELDS)):
+        _revoke_tokens(instance.user_id)
+
+
+@receiver(post_delete, sender=Profile)
+def profile_deleted(sender, instance, **kwargs):
+    token_cache.forget_user(instance.user_id)
+    user_id = instance.user_id
+
+    def revoke_if_user_kept():
+        # Nothing to revoke if the profile went away with its user
+        if User.objects.filter(id=user_id).exists():
+            _revoke_tokens(user_id)
+
+    transaction.on_commit(revoke_if_user_kept)
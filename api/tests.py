@@ -1,3 +1,860 @@
-from django.test import TestCase
+import json
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .api import router, admin_router, biro_router
+from .auth import JWTAuth, async_biro_auth, token_cache, token_generations, revoked_tokens
+from .idempotency import purge_expired_keys
+from .jegyzokonyv import _render, get_jegyzokonyv_payload, get_jegyzokonyv_payloads, render_jegyzokonyv_bulk
+from .models import (
+    Tournament, Round, Team, Player, Match, Event, Profile, Photo, Kozlemeny, Szankcio, IdempotencyKey, TokenGeneration,
+    JegyzokonyvSnapshot,
+)
+from .query_budget import get_query_budget
+from .referee_utils import (
+    get_cached_match_roster, get_half_time_score, get_undoable_events_analysis, validate_event_batch, validate_event_data,
+)
+from .throttling import check_login_throttle, reset_username_throttle
+from .timesync import TIME_SYNC_PATH, asgi_time_sync, estimate_clock_offset, resolve_event_time, wsgi_time_sync
+from .write_coordinator import write_coordinator
+
+
+def legacy_undoable_events(match):
+    """The query-per-event undo eligibility check get_undoable_events used to run"""
+    undoable_events = []
+    for event in match.events.all().order_by('-exact_time', '-minute', '-id'):
+        can_undo = True
+        reasons = []
+
+        if event.event_type == 'match_start':
+            if match.events.filter(minute__gt=event.minute).exclude(id=event.id).exists():
+                can_undo = False
+                reasons.append("Other events exist after match start")
+        elif event.event_type == 'half_time':
+            if match.events.filter(half=2).exclude(id=event.id).exists():
+                can_undo = False
+                reasons.append("Second half events exist")
+        elif event.event_type == 'red_card' and event.player:
+            if match.events.filter(player=event.player, minute__gt=event.minute).exclude(id=event.id).exists():
+                can_undo = False
+                reasons.append("Player has events after red card")
+
+        undoable_events.append({
+            'id': event.id,
+            'event_type': event.event_type,
+            'minute': event.minute,
+            'half': event.half,
+            'player_name': event.player.name if event.player else None,
+            'exact_time': event.exact_time.isoformat() if event.exact_time else None,
+            'can_undo': can_undo,
+            'cannot_undo_reasons': reasons
+        })
+    return undoable_events
+
+
+class UndoableEventsAnalysisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tournament = Tournament.objects.create(name='Teszt bajnokság')
+        round_obj = Round.objects.create(tournament=tournament, number=1)
+        cls.team1 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='A')
+        cls.team2 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='B')
+        cls.players = []
+        for team in (cls.team1, cls.team2):
+            for i in range(4):
+                player = Player.objects.create(name=f'{team} játékos {i}')
+                team.players.add(player)
+                cls.players.append(player)
+        cls.match = Match.objects.create(
+            tournament=tournament, team1=cls.team1, team2=cls.team2,
+            datetime=datetime(2025, 3, 1, 12, 0), round_obj=round_obj
+        )
+
+    def random_timeline(self, rng):
+        event_types = [choice[0] for choice in Event.EVENT_TYPES]
+        start = datetime(2025, 3, 1, 12, 0)
+        self.match.events.all().delete()
+
+        events = []
+        for _ in range(rng.randint(0, 25)):
+            event_type = rng.choice(event_types + ['goal', 'yellow_card', 'red_card'] * 2)
+            with_player = event_type in ('goal', 'own_goal', 'yellow_card', 'red_card') or rng.random() < 0.1
+            events.append(Event.objects.create(
+                event_type=event_type,
+                # Small ranges so that equal minutes and exact times are common
+                minute=rng.randint(0, 12),
+                half=rng.choice([1, 2, None]),
+                player=rng.choice(self.players) if with_player else None,
+                exact_time=start + timedelta(minutes=rng.randint(0, 10)) if rng.random() < 0.8 else None,
+            ))
+        self.match.events.add(*events)
+
+    def test_matches_legacy_behaviour_on_random_timelines(self):
+        rng = random.Random(20250301)
+        for _ in range(150):
+            self.random_timeline(rng)
+            events = list(self.match.events.select_related('player').order_by('-exact_time', '-minute', '-id'))
+            self.assertEqual(get_undoable_events_analysis(events), legacy_undoable_events(self.match))
+
+    def test_single_query_for_events(self):
+        self.random_timeline(random.Random(7))
+        with self.assertNumQueries(1):
+            events = list(self.match.events.select_related('player').order_by('-exact_time', '-minute', '-id'))
+            get_undoable_events_analysis(events)
+
+
+class MatchWriteCoordinatorStressTests(TransactionTestCase):
+    WRITES = 300
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        user = User.objects.create_user('biro', password='jelszo')
+        Profile.objects.create(user=user, biro=True)
+        self.token = JWTAuth.encode_token(user.id, user.username)
+
+        tournament = Tournament.objects.create(name='Teszt bajnokság')
+        round_obj = Round.objects.create(tournament=tournament, number=1)
+        team1 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='A')
+        team2 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='B')
+        self.player = Player.objects.create(name='Gólkirály')
+        team1.players.add(self.player)
+        self.matches = [
+            Match.objects.create(
+                tournament=tournament, team1=team1, team2=team2,
+                datetime=datetime(2025, 3, 1, 12 + i, 0), round_obj=round_obj
+            ) for i in range(2)
+        ]
+
+    def post_goal(self, index):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        match = self.matches[index % len(self.matches)]
+        try:
+            response = client.post(
+                f'/api/biro/matches/{match.id}/events',
+                json.dumps({'event_type': 'goal', 'minute': index % 20, 'half': 1, 'player_id': self.player.id}),
+                content_type='application/json'
+            )
+            return response.status_code
+        finally:
+            connection.close()
+
+    def test_concurrent_event_writes_all_succeed(self):
+        stats_before = dict(write_coordinator.stats)
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            statuses = list(pool.map(self.post_goal, range(self.WRITES)))
+
+        self.assertEqual(statuses, [200] * self.WRITES)
+        for match in self.matches:
+            self.assertEqual(match.events.count(), self.WRITES // len(self.matches))
+
+        writes = write_coordinator.stats['writes'] - stats_before['writes']
+        batches = write_coordinator.stats['batches'] - stats_before['batches']
+        self.assertEqual(writes, self.WRITES)
+        # Concurrent writes to the same match share transactions
+        self.assertLess(batches, writes)
+
+
+
+class VersionedSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('admin', password='jelszo', is_staff=True)
+        cls.token = JWTAuth.encode_token(user.id, user.username, JWTAuth.role_claims(user))
+        tournament = Tournament.objects.create(name='Teszt bajnokság')
+        round_obj = Round.objects.create(tournament=tournament, number=1)
+        cls.match = Match.objects.create(
+            tournament=tournament, round_obj=round_obj, datetime=datetime(2025, 3, 1, 12, 0),
+            team1=Team.objects.create(tournament=tournament, start_year=2022, tagozat='A'),
+            team2=Team.objects.create(tournament=tournament, start_year=2022, tagozat='B'),
+        )
+
+    def test_match_edit_keeps_concurrent_phase_change(self):
+        stale = Match.objects.get(id=self.match.id)
+        Match.objects.get(id=self.match.id).advance_phase('match_start')
+
+        stale.status = 'cancelled_new_date'
+        self.assertTrue(stale.save_if_version(stale.version, update_fields=['status']))
+
+        stored = Match.objects.get(id=self.match.id)
+        self.assertEqual((stored.phase, stored.phase_version, stored.status), ('first_half', 1, 'cancelled_new_date'))
+
+    def test_admin_patch_does_not_write_phase(self):
+        Match.objects.filter(id=self.match.id).update(phase='second_half', phase_version=3)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.settings(AUTH_TOKEN_GENERATION_REFRESH=0):
+            token_generations.invalidate()
+            response = client.patch(
+                f'/api/admin/matches/{self.match.id}', json.dumps({'status': 'active'}), content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Match.objects.filter(id=self.match.id).values_list('phase', 'phase_version').get(), ('second_half', 3))
+
+    def test_unconditional_saves_of_one_read_get_different_versions(self):
+        first = Match.objects.get(id=self.match.id)
+        second = Match.objects.get(id=self.match.id)
+        first.save()
+        second.save()
+
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertEqual(Match.objects.get(id=self.match.id).version, 2)
+
+    def test_save_claims_the_next_version_in_its_update(self):
+        match = Match.objects.get(id=self.match.id)
+        with self.assertNumQueries(1):
+            match.save(update_fields=['status'])
+        self.assertEqual(match.version, 1)
+
+        with self.assertNumQueries(0):
+            match.save(update_fields=[])
+        self.assertEqual((match.version, Match.objects.get(id=self.match.id).version), (1, 1))
+
+
+
+class RosterCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tournament = Tournament.objects.create(name='Teszt bajnokság')
+        cls.team1 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='A')
+        cls.team2 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='B')
+        cls.scorer = Player.objects.create(name='Gólkirály')
+        cls.team1.players.add(cls.scorer)
+        cls.match = Match.objects.create(
+            tournament=tournament, round_obj=Round.objects.create(tournament=tournament, number=1),
+            datetime=datetime(2025, 3, 1, 12, 0), team1=cls.team1, team2=cls.team2,
+        )
+        Event.objects.create(match=cls.match, event_type='goal', half=1, minute=5, player=cls.scorer)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_membership_changes_drop_the_cached_roster(self):
+        key = f'match_roster:{self.match.id}:{self.team1.id}:{self.team2.id}'
+        self.assertEqual(get_cached_match_roster(self.match), {self.scorer.id: 'team1'})
+        self.assertEqual(get_half_time_score(self.match), (1, 0))
+        self.assertIsNotNone(cache.get(key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team1.players.remove(self.scorer)
+            self.team2.players.add(self.scorer)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(get_cached_match_roster(self.match), {self.scorer.id: 'team2'})
+        self.assertEqual(get_half_time_score(self.match), (0, 1))
+
+        substitute = Player.objects.create(name='Csere')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team1.players.add(substitute)
+        self.assertEqual(get_cached_match_roster(self.match), {self.scorer.id: 'team2', substitute.id: 'team1'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            substitute.delete()
+        self.assertEqual(get_cached_match_roster(self.match), {self.scorer.id: 'team2'})
+
+
+class EventValidationTests(TestCase):
+    def setUp(self):
+        self.match = Match(phase='not_started')
+        self.roster = {1: 'team1', 2: 'team2'}
+
+    def test_batch_applies_the_single_event_rules(self):
+        events = [
+            {'event_type': 'match_start', 'minute': 1, 'half': 1, 'player_id': None},
+            {'event_type': 'own_goal', 'minute': 3, 'half': 1, 'player_id': None},
+            {'event_type': 'goal', 'minute': 125, 'half': 2, 'player_id': 1},
+        ]
+        invalid_events, warnings, phase = validate_event_batch(events, self.match, self.roster)
+
+        self.assertEqual(invalid_events, [{'index': 1, 'errors': ['Player ID required for own_goal events']}])
+        self.assertEqual(warnings, [{'index': 2, 'warnings': ['Minute is beyond normal match time']}])
+        self.assertEqual(phase, 'first_half')
+
+    def test_single_own_goal_does_not_need_a_player(self):
+        result = validate_event_data('own_goal', 3, 1, None, self.match, roster=self.roster, phase='first_half')
+
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['errors'], [])
+
+    def test_batch_moves_the_phase_along(self):
+        events = [
+            {'event_type': 'match_start', 'minute': 1, 'half': 1},
+            {'event_type': 'half_time', 'minute': 10, 'half': 1},
+            {'event_type': 'half_time', 'minute': 11, 'half': 1},
+        ]
+        invalid_events, warnings, phase = validate_event_batch(events, self.match, self.roster)
+
+        self.assertEqual([e['index'] for e in invalid_events], [2])
+        self.assertEqual(phase, 'half_time')
+
+
+class TimeSyncTests(TestCase):
+    def test_offset_is_taken_from_the_lowest_delay_sample(self):
+        # Client clock 10s behind the server, the second sample has an asymmetric slow leg
+        samples = [
+            {'t0': 100.0, 't1': 110.05, 't2': 110.06, 't3': 100.11},
+            {'t0': 200.0, 't1': 210.50, 't2': 210.51, 't3': 200.61},
+        ]
+        best = estimate_clock_offset(samples)
+        self.assertAlmostEqual(best['offset'], 10.0)
+        self.assertAlmostEqual(best['delay'], 0.1)
+
+    def test_event_time_is_corrected_with_the_offset(self):
+        now = timezone.now().timestamp()
+        corrected = resolve_event_time(now - 10 - 30, clock_offset=10)
+        self.assertAlmostEqual(corrected.timestamp(), now - 30, places=3)
+        # Implausible client times fall back to the server clock
+        self.assertAlmostEqual(resolve_event_time(now + 3600).timestamp(), now, delta=5)
+
+    def wsgi_call(self, **environ):
+        captured = {}
+        fallback = lambda environ, start_response: [b'django']
+        start_response = lambda status, headers: captured.update(status=status, headers=dict(headers))
+        body = b''.join(wsgi_time_sync(fallback)({'PATH_INFO': TIME_SYNC_PATH, **environ}, start_response))
+        return body, captured
+
+    @override_settings(CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=['https://biro.example'])
+    def test_wsgi_answers_get_with_the_configured_origins(self):
+        body, captured = self.wsgi_call(REQUEST_METHOD='GET', QUERY_STRING='t0=12.5', HTTP_ORIGIN='https://biro.example')
+        payload = json.loads(body)
+        self.assertEqual(payload['originate'], 12.5)
+        self.assertLessEqual(payload['receive'], payload['transmit'])
+        self.assertEqual(captured['headers']['Access-Control-Allow-Origin'], 'https://biro.example')
+
+        body, captured = self.wsgi_call(REQUEST_METHOD='GET', HTTP_ORIGIN='https://mas.example')
+        self.assertNotIn('Access-Control-Allow-Origin', captured['headers'])
+
+    def test_wsgi_passes_other_methods_to_django(self):
+        self.assertEqual(self.wsgi_call(REQUEST_METHOD='OPTIONS')[0], b'django')
+        self.assertEqual(self.wsgi_call(REQUEST_METHOD='POST')[0], b'django')
+
+    def test_asgi_answers_get_only(self):
+        async def fallback(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+
+        async def call(method):
+            sent = []
+            async def send(message):
+                sent.append(message)
+            scope = {'type': 'http', 'path': TIME_SYNC_PATH, 'method': method, 'query_string': b't0=1', 'headers': []}
+            await asgi_time_sync(fallback)(scope, None, send)
+            return sent
+
+        sent = async_to_sync(call)('GET')
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(json.loads(sent[1]['body'])['originate'], 1.0)
+        self.assertEqual(async_to_sync(call)('OPTIONS')[0]['status'], 404)
+
+
+class TokenIssueTests(TestCase):
+    @override_settings(AUTH_TOKEN_GENERATION_REFRESH=3600)
+    def test_new_tokens_carry_the_generation_in_the_database(self):
+        user = User.objects.create_user('biro', password='jelszo')
+        token_generations.reload()
+        TokenGeneration.bump(user.id)
+
+        # The in-memory table still holds the old generation
+        self.assertEqual(token_generations.current(user.id), 0)
+        tokens = JWTAuth.issue_token_pair(user)
+        self.assertEqual(JWTAuth.decode_token(tokens['token'])['gen'], 1)
+        self.assertEqual(JWTAuth.decode_token(tokens['refresh_token'])['gen'], 1)
+
+
+@override_settings(AUTH_TOKEN_GENERATION_REFRESH=3600, AUTH_REVOCATION_REFRESH=3600)
+class RefreshTokenRotationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('biro', password='jelszo')
+
+    def setUp(self):
+        token_cache.clear()
+        token_generations.reload()
+        revoked_tokens.is_revoked()
+
+    def test_reused_refresh_token_revokes_its_family(self):
+        first = JWTAuth.issue_token_pair(self.user)
+        rotated = JWTAuth.rotate_refresh_token(first['refresh_token'])
+        self.assertIsNotNone(rotated)
+        user, second = rotated
+        self.assertEqual(user, self.user)
+        self.assertIsNotNone(JWTAuth.get_principal(second['token']))
+
+        # The used refresh token leaked: replaying it logs the whole family out
+        self.assertIsNone(JWTAuth.rotate_refresh_token(first['refresh_token']))
+        self.assertIsNone(JWTAuth.rotate_refresh_token(second['refresh_token']))
+        self.assertIsNone(JWTAuth.get_principal(second['token']))
+        self.assertIsNone(JWTAuth.get_principal(first['token']))
+
+
+@override_settings(AUTH_TOKEN_GENERATION_REFRESH=3600, AUTH_REVOCATION_REFRESH=3600)
+class AsyncAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.referee = User.objects.create_user('biro', password='jelszo')
+        Profile.objects.create(user=cls.referee, biro=True)
+        cls.player = User.objects.create_user('jatekos', password='jelszo')
+        Profile.objects.create(user=cls.player)
+
+    def setUp(self):
+        token_cache.clear()
+        token_generations.reload()
+        revoked_tokens.is_revoked()
+
+    def request_with(self, user):
+        token = JWTAuth.issue_token_pair(user)['token']
+        return RequestFactory().get('/api/biro/my-matches', HTTP_AUTHORIZATION=f'Bearer {token}'), token
+
+    def test_cached_token_is_verified_without_queries(self):
+        request, token = self.request_with(self.referee)
+        self.assertEqual(async_to_sync(async_biro_auth)(request), self.referee)
+
+        with self.assertNumQueries(0):
+            user = async_to_sync(async_biro_auth)(request)
+        self.assertEqual(user, self.referee)
+        self.assertTrue(user.profile.biro)
+
+        JWTAuth.revoke_token(token)
+        self.assertIsNone(async_to_sync(async_biro_auth)(request))
+
+    def test_non_referee_is_rejected(self):
+        request, _ = self.request_with(self.player)
+        self.assertIsNone(async_to_sync(async_biro_auth)(request))
+
+    def test_my_matches_accepts_the_referee(self):
+        request, token = self.request_with(self.referee)
+        response = Client().get('/api/biro/my-matches', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+
+@override_settings(LOGIN_THROTTLE_IP_BURST=100, LOGIN_THROTTLE_IP_PER_MINUTE=100,
+                   LOGIN_THROTTLE_USERNAME_BURST=3, LOGIN_THROTTLE_USERNAME_PER_MINUTE=3)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def request_from(self, ip):
+        return RequestFactory().post('/api/auth/login', REMOTE_ADDR=ip)
+
+    def test_username_is_limited_per_client_ip(self):
+        attacker, referee = self.request_from('10.0.0.1'), self.request_from('10.0.0.2')
+        waits = [check_login_throttle(attacker, 'Biro') for _ in range(5)]
+        self.assertEqual(waits[:3], [None, None, None])
+        self.assertTrue(all(wait > 0 for wait in waits[3:]))
+
+        # The same username from another client still gets through
+        self.assertIsNone(check_login_throttle(referee, 'biro'))
+        reset_username_throttle(attacker, 'biro')
+        self.assertIsNone(check_login_throttle(attacker, 'biro'))
+
+    def test_concurrent_attempts_are_all_counted(self):
+        request = self.request_from('10.0.0.1')
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            waits = list(pool.map(lambda _: check_login_throttle(request, 'biro'), range(16)))
+        self.assertEqual(sum(wait is None for wait in waits), 3)
+
+
+class RefereeDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'biro{i}', password='jelszo') for i in range(2)]
+        for user in cls.users:
+            Profile.objects.create(user=user, biro=True)
+        tournament = Tournament.objects.create(name='Teszt bajnokság')
+        cls.match = Match.objects.create(
+            tournament=tournament, round_obj=Round.objects.create(tournament=tournament, number=1),
+            datetime=timezone.now(),
+            team1=Team.objects.create(tournament=tournament, start_year=2022, tagozat='A'),
+            team2=Team.objects.create(tournament=tournament, start_year=2022, tagozat='B'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        token_generations.reload()
+
+    def get_dashboard(self, user):
+        token = JWTAuth.issue_token_pair(user)['token']
+        with CaptureQueriesContext(connection) as captured:
+            response = Client(HTTP_AUTHORIZATION=f'Bearer {token}').get('/api/biro/dashboard')
+        return response.json(), captured
+
+    def test_dashboard_is_shared_between_referees(self):
+        first, _ = self.get_dashboard(self.users[0])
+        second, captured = self.get_dashboard(self.users[1])
+
+        self.assertEqual(first, second)
+        self.assertEqual([match['id'] for match in first['today_matches']], [self.match.id])
+        self.assertFalse(any('api_match' in query['sql'] for query in captured.captured_queries))
+
+class IdempotencyKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('biro', password='jelszo')
+        Profile.objects.create(user=cls.user, biro=True)
+        tournament = Tournament.objects.create(name='Teszt bajnokság')
+        round_obj = Round.objects.create(tournament=tournament, number=1)
+        team1 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='A')
+        cls.player = Player.objects.create(name='Gólkirály')
+        team1.players.add(cls.player)
+        cls.match = Match.objects.create(
+            tournament=tournament, round_obj=round_obj, datetime=datetime(2025, 3, 1, 12, 0), phase='first_half',
+            team1=team1, team2=Team.objects.create(tournament=tournament, start_year=2022, tagozat='B'),
+        )
+        Event.objects.create(match=cls.match, event_type='match_start', half=1, minute=1)
+        Event.objects.create(match=cls.match, event_type='goal', half=1, minute=5, player=cls.player)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        token_generations.reload()
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {JWTAuth.issue_token_pair(self.user)['token']}")
+
+    def post_goal(self, minute, key='kulcs'):
+        return self.client.post(
+            f'/api/biro/matches/{self.match.id}/events',
+            json.dumps({'event_type': 'goal', 'minute': minute, 'half': 1, 'player_id': self.player.id}),
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_is_replayed(self):
+        self.assertEqual(self.post_goal(7).status_code, 200)
+        retry = self.post_goal(7)
+        self.assertEqual((retry.status_code, retry.headers.get('Idempotent-Replayed')), (200, 'true'))
+        self.assertEqual(self.match.events.filter(minute=7).count(), 1)
+
+    def test_key_reused_with_other_body_is_rejected(self):
+        self.assertEqual(self.post_goal(7).status_code, 200)
+        self.assertEqual(self.post_goal(8).status_code, 422)
+
+    def test_dry_run_is_not_replayed_for_the_real_undo(self):
+        url = f'/api/biro/matches/{self.match.id}/undo-after-minute/3'
+        self.assertEqual(self.client.delete(url + '?dry_run=true', HTTP_IDEMPOTENCY_KEY='undo').status_code, 200)
+        self.assertEqual(self.client.delete(url, HTTP_IDEMPOTENCY_KEY='undo').status_code, 422)
+        self.assertTrue(self.match.events.filter(minute=5).exists())
+
+    def test_abandoned_claim_can_be_taken_over_after_the_lease(self):
+        self.assertEqual(self.post_goal(7).status_code, 200)
+        IdempotencyKey.objects.filter(key='kulcs').update(status_code=None, response_body='')
+        self.assertEqual(self.post_goal(7).status_code, 409)
+
+        IdempotencyKey.objects.filter(key='kulcs').update(date_created=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.post_goal(7).status_code, 200)
+        self.assertIsNotNone(IdempotencyKey.objects.get(key='kulcs').status_code)
+
+    def test_purge_deletes_expired_keys_only(self):
+        self.post_goal(7, key='regi')
+        self.post_goal(8, key='uj')
+        IdempotencyKey.objects.filter(key='regi').update(date_created=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(purge_expired_keys(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['uj'])
+
+def counted_queries(captured):
+    """SQL of the captured queries, without the savepoints of nested transactions"""
+    return [
+        query['sql'] for query in captured
+        if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))
+    ]
+
+
+class JegyzokonyvTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tournament = Tournament.objects.create(name='Teszt bajnokság')
+        round_obj = Round.objects.create(tournament=tournament, number=1)
+        team1 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='A')
+        team2 = Team.objects.create(tournament=tournament, start_year=2022, tagozat='B')
+        cls.player = Player.objects.create(name='Gólkirály')
+        team1.players.add(cls.player)
+        cls.matches = [
+            Match.objects.create(
+                tournament=tournament, round_obj=round_obj, datetime=datetime(2025, 3, 1, 12 + index, 0),
+                phase='finished', team1=team1, team2=team2,
+            )
+            for index in range(2)
+        ]
+        for match in cls.matches:
+            Event.objects.create(match=match, event_type='match_start', half=1, minute=1)
+            Event.objects.create(match=match, event_type='goal', half=1, minute=match.id, player=cls.player)
+            Event.objects.create(match=match, event_type='match_end', half=2, minute=20)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(JEGYZOKONYV_RENDER_WORKERS=2)
+    def test_worker_processes_render_like_the_calling_process(self):
+        payloads = get_jegyzokonyv_payloads(Match.objects.filter(id__in=[match.id for match in self.matches]))
+
+        self.assertEqual(render_jegyzokonyv_bulk(payloads), [_render(payload, 'html') for payload in payloads])
+        # The second export is served from the render cache
+        self.assertEqual(render_jegyzokonyv_bulk(payloads), [_render(payload, 'html') for payload in payloads])
+
+    def test_event_changes_refresh_the_frozen_snapshot(self):
+        match = self.matches[0]
+        goal = match.events.get(event_type='goal')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            goal.minute = 7
+            goal.save()
+        snapshot = JegyzokonyvSnapshot.objects.get(match=match)
+        self.assertIn((goal.id, 7), [(event['id'], event['minute']) for event in snapshot.payload['events']])
+
+        # Without the signals the snapshot keeps being served
+        Event.objects.filter(id=goal.id).update(minute=8)
+        self.assertEqual(get_jegyzokonyv_payload(Match.objects.get(id=match.id)), snapshot.payload)
+
+        goal_id = goal.id
+        with self.captureOnCommitCallbacks(execute=True):
+            goal.delete()
+        snapshot.refresh_from_db()
+        self.assertNotIn(goal_id, [event['id'] for event in snapshot.payload['events']])
+
+
+@override_settings(AUTH_TOKEN_GENERATION_REFRESH=60 * 60, AUTH_REVOCATION_REFRESH=60 * 60)
+class QueryBudgetTests(TestCase):
+    """
+    Every route of router, admin_router and biro_router stays within its declared query budget
+
+    Each route is called once on a seeded tournament, in a transaction that is
+    rolled back afterwards, with the Django cache and the verified token cache
+    cleared first, so every request pays for its own cache misses.
+
+    The routes are called again after more teams, players, matches and events
+    are added, and have to run the same number of queries, so an N+1 pattern
+    fails even when the budget would still cover it on the small seed.
+    """
+    ROUTERS = (('/api', router), ('/api/admin', admin_router), ('/api/biro', biro_router))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('biro', password='jelszo', is_staff=True, is_superuser=True)
+        cls.referee = Profile.objects.create(user=cls.user, biro=True)
+
+        cls.tournament = Tournament.objects.create(name='Teszt bajnokság', start_date=datetime(2025, 2, 1).date())
+        rounds = [Round.objects.create(tournament=cls.tournament, number=number) for number in (1, 2)]
+        cls.round = rounds[0]
+
+        cls.rounds = rounds
+        teams = [cls.add_team(index) for index in range(6)]
+        cls.team = teams[0]
+        # Listed by /teams/inactive
+        cls.add_team(6, active=False)
+
+        timelines = []
+        for team1, team2 in ((teams[0], teams[1]), (teams[2], teams[3]), (teams[4], teams[5])):
+            match, events = cls.add_finished_match(team1, team2)
+            timelines.append(events)
+        # Events of teams[0]'s finished match, teams[0] plays the live match too
+        cls.goal, cls.yellow_card, cls.red_card = timelines[0][1], timelines[0][2], timelines[0][7]
+        cls.player = cls.goal.player
+        Profile.objects.create(user=User.objects.create_user('jatekos'), player=cls.player)
+
+        cls.live_match, events = cls.add_match(teams[0], teams[2], rounds[1], 'second_half', [
+            ('match_start', 1, None), ('goal', 1, teams[0]), ('yellow_card', 1, teams[2]),
+            ('half_time', 1, None), ('match_start', 2, None), ('goal', 2, teams[2]),
+        ])
+        cls.live_event = events[-1]
+        cls.half_time_match, _ = cls.add_match(teams[1], teams[3], rounds[1], 'half_time', [
+            ('match_start', 1, None), ('goal', 1, teams[1]), ('half_time', 1, None),
+        ])
+        cls.upcoming_match, _ = cls.add_match(teams[4], teams[5], rounds[1], 'not_started', [])
+        # Played right now, listed by /biro/live-matches and the referee dashboard
+        cls.add_today_match(teams[3], teams[5])
+
+        for priority in ('low', 'normal', 'high'):
+            cls.kozlemeny = Kozlemeny.objects.create(title=priority, content='Közlemény', priority=priority, author=cls.referee)
+        cls.sanction = Szankcio.objects.create(team=teams[1], tournament=cls.tournament, minus_points=1, reason='Teszt')
+        Szankcio.objects.create(team=teams[3], tournament=cls.tournament, minus_points=2)
+
+    @classmethod
+    def add_team(cls, index, active=True):
+        team = Team.objects.create(
+            tournament=cls.tournament, start_year=2021 + index // 2, tagozat='ABCDEFGH'[index % 8], active=active
+        )
+        team.players.add(*[
+            Player.objects.create(name=f'{team} játékos {number}', csk=number == 0) for number in range(6)
+        ])
+        return team
+
+    @classmethod
+    def add_match(cls, team1, team2, round_obj, phase, events, start=datetime(2025, 3, 1, 12, 0)):
+        match = Match.objects.create(
+            tournament=cls.tournament, round_obj=round_obj, team1=team1, team2=team2,
+            datetime=start, referee=cls.referee, phase=phase
+        )
+        match.photos.add(Photo.objects.create(url=f'https://example.com/meccs{match.id}.jpg'))
+        created = []
+        for minute, (event_type, half, team) in enumerate(events, start=1):
+            player = team.players.all()[minute % 6] if team else None
+            created.append(Event.objects.create(
+                match=match, event_type=event_type, half=half, minute=minute * 2, player=player,
+                exact_time=start + timedelta(minutes=minute * 2)
+            ))
+        return match, created
+
+    @classmethod
+    def add_finished_match(cls, team1, team2):
+        return cls.add_match(team1, team2, cls.rounds[0], 'finished', [
+            ('match_start', 1, None), ('goal', 1, team1), ('yellow_card', 1, team2), ('own_goal', 1, team2),
+            ('half_time', 1, None), ('match_start', 2, None), ('goal', 2, team2), ('red_card', 2, team1),
+            ('full_time', 2, None), ('match_end', 2, None),
+        ])
+
+    @classmethod
+    def add_today_match(cls, team1, team2):
+        return cls.add_match(team1, team2, cls.rounds[1], 'first_half', [
+            ('match_start', 1, None), ('goal', 1, team1), ('yellow_card', 1, team2),
+        ], start=timezone.now())
+
+    def grow_seed(self):
+        """Add teams, players, matches and events touching every listing the routes serve"""
+        teams = [self.add_team(index) for index in range(8, 12)]
+        self.add_team(12, active=False)
+        for team1, team2 in ((self.team, teams[0]), (teams[1], teams[2])):
+            self.add_finished_match(team1, team2)
+        self.add_match(teams[3], self.team, self.rounds[1], 'second_half', [
+            ('match_start', 1, None), ('goal', 1, teams[3]), ('half_time', 1, None), ('match_start', 2, None),
+        ])
+        self.add_today_match(teams[0], teams[2])
+        self.add_today_match(teams[1], teams[3])
+        Profile.objects.create(user=User.objects.create_user('biro2'), biro=True)
+        Szankcio.objects.create(team=teams[0], tournament=self.tournament, minus_points=1)
+        Kozlemeny.objects.create(title='újabb', content='Közlemény', priority='normal', author=self.referee)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        # With the long refresh intervals above, neither table is reloaded during the test
+        token_generations.reload()
+        revoked_tokens.is_revoked()
+        self.client = Client(HTTP_AUTHORIZATION=f"Bearer {JWTAuth.issue_token_pair(self.user)['token']}")
+
+    def path_params(self):
+        return {
+            'user_id': self.user.id,
+            'tournament_id': self.tournament.id,
+            'team_id': self.team.id,
+            'player_id': self.player.id,
+            'round_number': self.round.number,
+            'round_id': self.round.id,
+            'match_id': self.live_match.id,
+            'event_id': self.live_event.id,
+            'minute': self.live_event.minute - 1,
+            'goal_id': self.goal.id,
+            'card_id': self.yellow_card.id,
+            'profile_id': self.referee.id,
+            'kozlemeny_id': self.kozlemeny.id,
+            'priority': 'high',
+            'sanction_id': self.sanction.id,
+        }
+
+    def route_requests(self):
+        """(method, path) -> overrides of the request: path params, query, JSON body and headers"""
+        event = {'event_type': 'goal', 'minute': 20, 'half': 2, 'player_id': self.player.id}
+        # Logout and refresh revoke the tokens they are given, they get their own pairs
+        logout_token = JWTAuth.issue_token_pair(self.user)['token']
+        refresh_token = JWTAuth.issue_token_pair(self.user)['refresh_token']
+        return {
+            ('POST', '/api/auth/login'): {'body': {'username': 'biro', 'password': 'jelszo'}},
+            ('POST', '/api/auth/logout'): {'headers': {'HTTP_AUTHORIZATION': f'Bearer {logout_token}'}},
+            ('POST', '/api/auth/refresh'): {'body': {'refresh_token': refresh_token}},
+            ('GET', '/api/matches/timelines'): {'query': {'ids': ','.join(
+                str(match_id) for match_id in Match.objects.values_list('id', flat=True)
+            )}},
+            ('GET', '/api/red_cards/{card_id}'): {'params': {'card_id': self.red_card.id}},
+            ('PUT', '/api/admin/matches/{match_id}'): {'body': {'referee_id': self.referee.id}},
+            ('PATCH', '/api/admin/matches/{match_id}'): {'body': {'referee_id': self.referee.id}},
+            ('PUT', '/api/biro/matches/{match_id}'): {'body': {'referee_id': self.referee.id}},
+            ('POST', '/api/biro/matches/{match_id}/events'): {'body': event},
+            ('POST', '/api/biro/matches/{match_id}/events/batch'): {'body': {'events': [event, {**event, 'minute': 21}]}},
+            ('PUT', '/api/biro/matches/{match_id}/events/{event_id}'): {'body': {'minute': 19}},
+            ('POST', '/api/biro/matches/{match_id}/validate-event'): {'body': event},
+            ('GET', '/api/biro/matches/{match_id}/jegyzokonyv/print'): {'query': {'format': 'html'}},
+            ('GET', '/api/biro/rounds/{round_number}/jegyzokonyv/export'): {'query': {'format': 'html'}},
+            ('POST', '/api/biro/matches/{match_id}/start-match'): {'params': {'match_id': self.upcoming_match.id}},
+            ('POST', '/api/biro/matches/{match_id}/end-half'): {'body': {'half': 2, 'minute': 40}},
+            ('POST', '/api/biro/matches/{match_id}/start-second-half'): {'params': {'match_id': self.half_time_match.id}},
+            ('POST', '/api/biro/matches/{match_id}/end-match'): {'body': {'half': 2, 'minute': 40}},
+            ('POST', '/api/biro/matches/{match_id}/quick-goal'): {'body': {'player_id': self.player.id, 'minute': 20, 'half': 2}},
+            ('POST', '/api/biro/matches/{match_id}/quick-own-goal'): {'body': {'player_id': self.player.id, 'minute': 20, 'half': 2}},
+            ('POST', '/api/biro/matches/{match_id}/quick-card'): {
+                'body': {'player_id': self.player.id, 'minute': 20, 'half': 2, 'card_type': 'yellow'}
+            },
+            ('POST', '/api/biro/matches/{match_id}/extra-time'): {'body': {'extra_time_minutes': 2, 'half': 2}},
+        }
+
+    def routes(self):
+        for prefix, api_router in self.ROUTERS:
+            for path, path_view in api_router.path_operations.items():
+                for operation in path_view.operations:
+                    for method in operation.methods:
+                        # Path converters ({int:team_id}) are left out, the path is formatted with the param names
+                        yield method, prefix + re.sub(r'{\w+:(\w+)}', r'{\1}', path), operation.view_func
+
+    def call(self, method, path, request):
+        url = path.format(**{**self.path_params(), **request.get('params', {})})
+        if request.get('query'):
+            url += '?' + urlencode(request['query'])
+        body = json.dumps(request['body']) if 'body' in request else ''
+        response = self.client.generic(method, url, body, content_type='application/json', **request.get('headers', {}))
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def measure(self, method, path, request):
+        """Call a route in a rolled back transaction, returning the response, its content and the counted queries"""
+        cache.clear()
+        token_cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                response, content = self.call(method, path, request)
+            transaction.set_rollback(True)
+        return response, content, counted_queries(captured)
+
+    def test_routes_stay_within_query_budget(self):
+        requests = self.route_requests()
+        routes = list(self.routes())
+        self.assertGreater(len(routes), 90)
+
+        for method, path, view_func in routes:
+            with self.subTest(route=f'{method} {path}'):
+                budget = get_query_budget(view_func)
+                response, content, queries = self.measure(method, path, requests.get((method, path), {}))
+
+                self.assertLess(response.status_code, 400, f'{method} {path} failed: {content[:500]!r}')
+                self.assertIsNotNone(
+                    budget, f'{method} {path} has no @query_budget, it ran {len(queries)} queries'
+                )
+                self.assertLessEqual(len(queries), budget, '\n'.join(
+                    [f'{method} {path} ran {len(queries)} queries, its budget is {budget}:'] +
+                    [f'{number}. {sql}' for number, sql in enumerate(queries, start=1)]
+                ))
+
+    def test_query_counts_do_not_grow_with_the_data(self):
+        routes = list(self.routes())
+        requests = self.route_requests()
+        before = {
+            (method, path): len(self.measure(method, path, requests.get((method, path), {}))[2])
+            for method, path, view_func in routes
+        }
+
+        self.grow_seed()
+        requests = self.route_requests()
+        for method, path, view_func in routes:
+            with self.subTest(route=f'{method} {path}'):
+                response, content, queries = self.measure(method, path, requests.get((method, path), {}))
+                self.assertLess(response.status_code, 400, f'{method} {path} failed: {content[:500]!r}')
+                self.assertEqual(len(queries), before[(method, path)], '\n'.join(
+                    [f'{method} {path} ran {before[(method, path)]} queries, {len(queries)} on the larger seed:'] +
+                    [f'{number}. {sql}' for number, sql in enumerate(queries, start=1)]
+                ))
@@ -0,0 +1,173 @@
+"""
+Login throttling for /auth/login
+
+Every login attempt hashes the password (PBKDF2), which costs tens of milliseconds
+of CPU. Attempts are rate limited per client IP and per username + client IP pair
+before authenticate() runs. Keying the username limit on the IP too means nobody
+can lock a referee out by failing logins with their username from elsewhere.
+
+The limits behave like token buckets (`burst` attempts at once, refilled at
+`per_minute`), implemented as sliding window counters so the shared cache can
+update them atomically with add() and incr() instead of a racy get + set. All
+worker processes share them. If the cache is unavailable, the process falls
+back to its own buckets.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """
+    Rate limit per key: allows up to `burst` attempts at once and `per_minute` attempts a minute
+
+    The shared state is two attempt counters, one for the current window and one
+    for the previous one, a window being the time a bucket takes to refill. The
+    previous window's count is weighted by how much of it still overlaps the last
+    window length, which approximates a token bucket without read-modify-write.
+    """
+
+    def __init__(self, name: str, burst_setting: str, rate_setting: str):
+        self.name = name
+        self.burst_setting = burst_setting
+        self.rate_setting = rate_setting
+        self._lock = threading.Lock()
+        self._local_buckets = {}  # In-process fallback: key -> (tokens, updated_at)
+        self.counters = {'allowed': 0, 'rejected': 0, 'fallback': 0}
+
+    @property
+    def burst(self) -> int:
+        return getattr(settings, self.burst_setting)
+
+    @property
+    def per_second(self) -> float:
+        return getattr(settings, self.rate_setting) / 60
+
+    @property
+    def window(self) -> float:
+        """Seconds an empty bucket takes to refill"""
+        return self.burst / self.per_second
+
+    def _cache_key(self, key: str) -> str:
+        # Usernames may hold characters some cache backends do not allow in keys
+        return f"login_throttle:{self.name}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+    def _window_keys(self, cache_key: str, now: float) -> tuple[str, str, float]:
+        """Counter keys of the current and the previous window, and the seconds elapsed in the current one"""
+        index = int(now // self.window)
+        return f"{cache_key}:{index}", f"{cache_key}:{index - 1}", now - index * self.window
+
+    def _consume_shared(self, cache, cache_key: str, now: float) -> Optional[float]:
+        current_key, previous_key, elapsed = self._window_keys(cache_key, now)
+        # add() leaves an existing counter alone and incr() is atomic, so concurrent
+        # attempts all get counted. Rejected attempts count too.
+        cache.add(current_key, 0, timeout=int(2 * self.window) + 1)
+        attempts = cache.incr(current_key)
+        previous_weight = cache.get(previous_key, 0) * (1 - elapsed / self.window)
+
+        excess = previous_weight + attempts - self.burst
+        if excess <= 0:
+            return None
+        # The previous window's share shrinks linearly until the current window ends
+        if 0 < excess <= previous_weight:
+            return excess / previous_weight * (self.window - elapsed)
+        return self.window - elapsed
+
+    def _refill(self, bucket, now):
+        if bucket is None:
+            return float(self.burst)
+        tokens, updated_at = bucket
+        return min(float(self.burst), tokens + (now - updated_at) * self.per_second)
+
+    def _consume_local(self, cache_key: str, now: float) -> Optional[float]:
+        with self._lock:
+            self.counters['fallback'] += 1
+            tokens = self._refill(self._local_buckets.get(cache_key), now)
+            if tokens >= 1:
+                self._local_buckets[cache_key] = (tokens - 1, now)
+                return None
+            self._local_buckets[cache_key] = (tokens, now)
+        return (1 - tokens) / self.per_second
+
+    def consume(self, key: str) -> Optional[float]:
+        """
+        Count an attempt for key
+
+        Returns:
+            None if allowed, otherwise seconds until the next attempt is allowed
+        """
+        now = time.time()
+        cache_key = self._cache_key(key)
+        try:
+            wait = self._consume_shared(caches[getattr(settings, 'LOGIN_THROTTLE_CACHE', 'default')], cache_key, now)
+        except Exception:
+            logger.warning("Login throttle cache unavailable, using in-process buckets", exc_info=True)
+            wait = self._consume_local(cache_key, now)
+
+        with self._lock:
+            self.counters['allowed' if wait is None else 'rejected'] += 1
+        return wait
+
+    def reset(self, key: str) -> None:
+        cache_key = self._cache_key(key)
+        current_key, previous_key, _ = self._window_keys(cache_key, time.time())
+        try:
+            caches[getattr(settings, 'LOGIN_THROTTLE_CACHE', 'default')].delete_many([current_key, previous_key])
+        except Exception:
+            logger.warning("Login throttle cache unavailable, using in-process buckets", exc_info=True)
+        with self._lock:
+            self._local_buckets.pop(cache_key, None)
+
+
+ip_limiter = TokenBucketLimiter('ip', 'LOGIN_THROTTLE_IP_BURST', 'LOGIN_THROTTLE_IP_PER_MINUTE')
+username_limiter = TokenBucketLimiter('username', 'LOGIN_THROTTLE_USERNAME_BURST', 'LOGIN_THROTTLE_USERNAME_PER_MINUTE')
+
+
+def get_client_ip(request) -> str:
+    if getattr(settings, 'LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR', False):
+        forwarded_for = request.headers.get('X-Forwarded-For')
+        if forwarded_for:
+            return forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _username_key(request, username: str) -> str:
+    return f"{username.strip().lower()}\n{get_client_ip(request)}"
+
+
+def check_login_throttle(request, username: str) -> Optional[float]:
+    """
+    Charge a login attempt to the client IP and the username + client IP buckets
+
+    Returns:
+        None if the attempt may go ahead, otherwise seconds to wait before retrying
+    """
+    if not getattr(settings, 'LOGIN_THROTTLE_ENABLED', True):
+        return None
+    waits = [
+        ip_limiter.consume(get_client_ip(request)),
+        username_limiter.consume(_username_key(request, username)),
+    ]
+    waits = [wait for wait in waits if wait is not None]
+    return max(waits) if waits else None
+
+
+def reset_username_throttle(request, username: str) -> None:
+    """Give a username its full bucket back on the client IP after a successful login"""
+    username_limiter.reset(_username_key(request, username))
+
+
+def get_throttle_counters() -> dict:
+    """Allowed / rejected / fallback counts of each limiter since the process started"""
+    return {
+        limiter.name: dict(limiter.counters)
+        for limiter in (ip_limiter, username_limiter)
+    }
@@ -0,0 +1,201 @@
+"""
+High-precision time synchronisation for referee devices
+
+The sync endpoint is served directly by the WSGI/ASGI entry points, in front of
+the Django middleware stack, so the server timestamps are not skewed by
+session, CSRF or CORS processing. Only GET requests are answered there, anything
+else (e.g. a CORS preflight) goes through Django as usual. The CORS headers of
+the response follow the django-cors-headers settings. Clients run an NTP-style
+exchange against it:
+
+    t0 = client time when the request is sent (passed as ?t0=)
+    t1 = server time when the request is received  ("receive")
+    t2 = server time when the response is sent      ("transmit")
+    t3 = client time when the response arrives
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2   (server clock - client clock)
+    delay  = (t3 - t0) - (t2 - t1)          (network round trip)
+
+Clients take several samples and keep the offset of the one with the lowest
+delay (see estimate_clock_offset), then send it along with their local event
+timestamps so the server can correct them (see resolve_event_time).
+"""
+import json
+import re
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+from urllib.parse import parse_qs
+
+from corsheaders.conf import conf as cors_conf
+from django.utils import timezone
+
+
+TIME_SYNC_PATH = '/api/time/sync'
+
+# Corrected client timestamps further from the server clock than this are not trusted
+MAX_EVENT_TIME_AGE = 6 * 60 * 60  # seconds, queued offline events may be a few hours old
+MAX_EVENT_TIME_AHEAD = 5  # seconds
+
+
+def server_time() -> float:
+    """
+    Get the current server time as a unix timestamp
+
+    This is the only clock the sync exchange and the event time correction read,
+    so offsets measured against it apply to resolve_event_time unchanged, in
+    every worker process.
+    """
+    return time.time()
+
+
+def time_sync_payload(originate: Optional[float], receive: float) -> bytes:
+    """
+    Build the JSON body of a time sync response
+
+    Args:
+        originate: Client send time (t0) echoed back, if given
+        receive: Server receive time (t1)
+
+    Returns:
+        Encoded JSON body, the transmit time (t2) is taken as late as possible
+    """
+    return json.dumps({
+        'originate': originate,
+        'receive': round(receive, 6),
+        'transmit': round(server_time(), 6),
+    }).encode()
+
+
+def _parse_originate(query_string: str) -> Optional[float]:
+    values = parse_qs(query_string).get('t0')
+    if not values:
+        return None
+    try:
+        return float(values[0])
+    except ValueError:
+        return None
+
+
+_RESPONSE_HEADERS = [
+    ('Content-Type', 'application/json'),
+    ('Cache-Control', 'no-store'),
+]
+
+
+def _cors_headers(origin: Optional[str]) -> List[tuple]:
+    """
+    Get the CORS headers CorsMiddleware would add to a simple GET response
+
+    Args:
+        origin: Origin header of the request, if any
+
+    Returns:
+        List of (name, value) header tuples, empty if the origin is not allowed
+    """
+    if not origin:
+        return []
+    headers = [('Vary', 'Origin')]
+    allowed = (
+        cors_conf.CORS_ALLOW_ALL_ORIGINS
+        or origin in cors_conf.CORS_ALLOWED_ORIGINS
+        or any(re.match(pattern, origin) for pattern in cors_conf.CORS_ALLOWED_ORIGIN_REGEXES)
+    )
+    if not allowed:
+        return headers
+    if cors_conf.CORS_ALLOW_ALL_ORIGINS and not cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers.append(('Access-Control-Allow-Origin', '*'))
+    else:
+        headers.append(('Access-Control-Allow-Origin', origin))
+    if cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers.append(('Access-Control-Allow-Credentials', 'true'))
+    return headers
+
+
+def wsgi_time_sync(application):
+    """
+    Wrap a WSGI application so TIME_SYNC_PATH is answered before Django sees the request
+    """
+    def time_sync_application(environ, start_response):
+        if environ.get('PATH_INFO') != TIME_SYNC_PATH or environ.get('REQUEST_METHOD') != 'GET':
+            return application(environ, start_response)
+
+        receive = server_time()
+        body = time_sync_payload(_parse_originate(environ.get('QUERY_STRING', '')), receive)
+        headers = _RESPONSE_HEADERS + _cors_headers(environ.get('HTTP_ORIGIN'))
+        start_response('200 OK', headers + [('Content-Length', str(len(body)))])
+        return [body]
+
+    return time_sync_application
+
+
+def asgi_time_sync(application):
+    """
+    Wrap an ASGI application so TIME_SYNC_PATH is answered before Django sees the request
+    """
+    async def time_sync_application(scope, receive, send):
+        if scope['type'] != 'http' or scope.get('path') != TIME_SYNC_PATH or scope.get('method') != 'GET':
+            return await application(scope, receive, send)
+
+        receive_time = server_time()
+        body = time_sync_payload(_parse_originate(scope.get('query_string', b'').decode()), receive_time)
+        origin = dict(scope.get('headers', [])).get(b'origin')
+        headers = [
+            (name.lower().encode(), value.encode())
+            for name, value in _RESPONSE_HEADERS + _cors_headers(origin.decode('latin-1') if origin else None)
+        ]
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    return time_sync_application
+
+
+def estimate_clock_offset(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    """
+    Estimate the client clock offset from several sync samples
+
+    Reference implementation of the client side of the exchange: the sample
+    with the lowest round trip delay has the least asymmetric network noise.
+
+    Args:
+        samples: List of dictionaries with t0, t1, t2 and t3 timestamps
+
+    Returns:
+        Dictionary with the chosen 'offset' and its 'delay', in seconds
+    """
+    if not samples:
+        raise ValueError("At least one sample is required")
+
+    best = None
+    for sample in samples:
+        offset = ((sample['t1'] - sample['t0']) + (sample['t2'] - sample['t3'])) / 2
+        delay = (sample['t3'] - sample['t0']) - (sample['t2'] - sample['t1'])
+        if best is None or delay < best['delay']:
+            best = {'offset': offset, 'delay': delay}
+    return best
+
+
+def resolve_event_time(client_time: Optional[float] = None, clock_offset: Optional[float] = None) -> datetime:
+    """
+    Get the exact time to store for an event
+
+    Args:
+        client_time: Unix timestamp of the event on the client clock
+        clock_offset: Client clock offset estimated from the sync exchange (server - client)
+
+    Returns:
+        Corrected event time, or the current server time if no (plausible) client time was given
+    """
+    now = timezone.now()
+    if client_time is None:
+        return now
+
+    corrected = client_time + (clock_offset or 0)
+    age = server_time() - corrected
+    if age > MAX_EVENT_TIME_AGE or age < -MAX_EVENT_TIME_AHEAD:
+        return now
+
+    if timezone.is_aware(now):
+        return datetime.fromtimestamp(corrected, tz=now.tzinfo)
+    return datetime.fromtimestamp(corrected)
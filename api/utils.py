@@ -1,4 +1,6 @@
-from .models import Match, Tournament, Szankcio
+from .models import Match, Team, Tournament, Szankcio
+from .referee_utils import get_match_scores, aget_match_scores
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.db import models
 
@@ -61,7 +63,8 @@ def get_team_rank(bajnoksag, keresett_csapat_nev):
 
     return None
 
-def get_goal_scorers(events, team_filter=None):
+def get_goal_scorers(events, team_filter=None, scorer_teams=None):
+    # scorer_teams: előre betöltött játékos id -> csapat (lásd get_first_teams), különben játékosonként lekérdezzük
     goal_scorers = []
 
     # Only regular goals, not own goals
@@ -72,7 +75,10 @@ def get_goal_scorers(events, team_filter=None):
         scorer_name = scorer.name
 
         # játékos csapata (feltételezve, hogy mindig pontosan 1 team tagja)
-        scorer_team = scorer.team_set.first()  # M2M miatt .team_set.all() lenne több is
+        if scorer_teams is not None:
+            scorer_team = scorer_teams.get(scorer.id)
+        else:
+            scorer_team = scorer.team_set.first()  # M2M miatt .team_set.all() lenne több is
 
         if team_filter and (not scorer_team or scorer_team.tagozat != team_filter):
             continue
@@ -113,6 +119,33 @@ def get_goal_scorers(events, team_filter=None):
     return ranked_scorers
 
 
+def _first_team_rows(player_ids):
+    return Team.players.through.objects.filter(
+        player_id__in=set(player_ids)
+    ).select_related('team').order_by('team_id')
+
+
+def get_first_teams(player_ids):
+    """
+    Minden játékos első csapata (ahogy player.team_set.first()), egy lekérdezéssel
+
+    Returns:
+        játékos id -> Team
+    """
+    first_teams = {}
+    for row in _first_team_rows(player_ids):
+        first_teams.setdefault(row.player_id, row.team)
+    return first_teams
+
+
+async def aget_first_teams(player_ids):
+    """Async version of get_first_teams, using the async ORM"""
+    first_teams = {}
+    async for row in _first_team_rows(player_ids):
+        first_teams.setdefault(row.player_id, row.team)
+    return first_teams
+
+
 def get_player_rank(goals, student):
     scorers = get_goal_scorers(goals)
 
@@ -123,39 +156,39 @@ def get_player_rank(goals, student):
     return None
 
 
-def process_matches(tournament):
-    csapatok = {}
-
+def _standings_matches(tournament):
     # Csak az adott bajnokság meccsei
     # AHOL VANNAK A MATCHNEK EVENTJEI IS
     # Kizárjuk a törölt meccseket
-    meccsek = Match.objects.filter(
+    return Match.objects.filter(
         tournament=tournament, 
         events__isnull=False
     ).exclude(
         models.Q(status='cancelled_new_date') | models.Q(status='cancelled_no_date')
-    ).distinct()
+    ).distinct().select_related('team1', 'team2')
+
+
+def build_standings(meccsek, scores, sanctions):
+    """
+    Tabella a meccsekből és az eredményeikből
+
+    Args:
+        meccsek: Match objektumok (team1, team2 betöltve)
+        scores: meccs id -> (team1 gólok, team2 gólok), lásd get_match_scores
+        sanctions: (csapat id, levont pontok) párok
+    """
+    csapatok = {}
 
     for meccs in meccsek:
-        # Meccsen belül gólok számolása Event alapján
-        # Regular goals for each team
-        team1_goals = meccs.events.filter(event_type='goal', player__in=meccs.team1.players.all()).count()
-        team2_goals = meccs.events.filter(event_type='goal', player__in=meccs.team2.players.all()).count()
-        
-        # Own goals count for the opponent team
-        team1_own_goals = meccs.events.filter(event_type='own_goal', player__in=meccs.team1.players.all()).count()
-        team2_own_goals = meccs.events.filter(event_type='own_goal', player__in=meccs.team2.players.all()).count()
-        
         # Team1's total goals include their goals + team2's own goals
-        team1_total = team1_goals + team2_own_goals
-        team2_total = team2_goals + team1_own_goals
+        team1_total, team2_total = scores[meccs.id]
 
         # Pontkiosztás
         csapat_pontkiosztas(csapatok, meccs.team1, team1_total, team2_total)
         csapat_pontkiosztas(csapatok, meccs.team2, team2_total, team1_total)
 
     # Apply sanctions (subtract points for each team)
-    apply_sanctions(csapatok, tournament)
+    apply_sanctions(csapatok, sanctions)
 
     # Rendezés: pont, gólkülönbség, lőtt gól
     csapatok = sorted(
@@ -166,6 +199,23 @@ def process_matches(tournament):
     return csapatok
 
 
+def process_matches(tournament):
+    meccsek = list(_standings_matches(tournament))
+    scores = get_match_scores(meccsek)
+    sanctions = Szankcio.objects.filter(tournament=tournament).values_list('team_id', 'minus_points')
+    return build_standings(meccsek, scores, sanctions)
+
+
+async def aprocess_matches(tournament):
+    """Async version of process_matches, using the async ORM"""
+    meccsek = [meccs async for meccs in _standings_matches(tournament)]
+    scores = await aget_match_scores(meccsek)
+    sanctions = [
+        row async for row in Szankcio.objects.filter(tournament=tournament).values_list('team_id', 'minus_points')
+    ]
+    return build_standings(meccsek, scores, sanctions)
+
+
 def csapat_pontkiosztas(csapatok, csapat, lott, kapott):
     if csapat.id not in csapatok:
         csapatok[csapat.id] = {
@@ -198,19 +248,17 @@ def csapat_pontkiosztas(csapatok, csapat, lott, kapott):
         team['losses'] += 1
 
 
-def apply_sanctions(csapatok, tournament):
+def apply_sanctions(csapatok, sanctions):
     """
     Apply sanctions (point deductions) to teams in the tournament.
     Subtracts minus_points from each team's total points.
+
+    sanctions: (team id, minus_points) pairs of the tournament's Szankcio rows
     """
-    # Get all sanctions for this tournament
-    sanctions = Szankcio.objects.filter(tournament=tournament)
-    
-    for sanction in sanctions:
-        team_id = sanction.team.id
+    for team_id, minus_points in sanctions:
         if team_id in csapatok:
             # Subtract sanction points from team's total points
-            csapatok[team_id]['points'] -= sanction.minus_points
+            csapatok[team_id]['points'] -= minus_points
             # Ensure points don't go below 0
             if csapatok[team_id]['points'] < 0:
                 csapatok[team_id]['points'] = 0
@@ -242,3 +290,11 @@ def get_latest_tournament():
         raise get_object_or_404(Tournament, id=0)  # This will always raise 404
 
 
+async def aget_latest_tournament():
+    """Async version of get_latest_tournament, using the async ORM"""
+    tournament = await Tournament.objects.filter(start_date__isnull=False).order_by('-start_date').afirst()
+    if tournament is None:
+        tournament = await Tournament.objects.order_by('-id').afirst()
+    if tournament is None:
+        raise Http404("No Tournament matches the given query.")
+    return tournament
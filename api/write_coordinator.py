@@ -0,0 +1,153 @@
+"""
+In-process write coordinator for referee (bíró) writes
+
+SQLite allows a single writer. When several referee devices write at the same time,
+every request opens its own write transaction and the losers fail with
+"database is locked". The coordinator queues writes per match instead: the first
+request of a match becomes the leader, waits a few milliseconds for concurrent
+writes to the same match to arrive, then runs the whole batch in one transaction
+(each write in its own savepoint) and hands the results back to the waiting requests.
+On SQLite the batches of different matches are serialized too.
+"""
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+class _Write:
+    __slots__ = ('func', 'wake', 'promoted', 'finished', 'result', 'error')
+
+    def __init__(self, func):
+        self.func = func
+        self.wake = threading.Event()
+        self.promoted = False
+        self.finished = False
+        self.result = None
+        self.error = None
+
+
+class MatchWriteCoordinator:
+    """
+    Serializes the writes of each match and commits writes arriving together in one transaction
+    """
+
+    def __init__(self, batch_window=None, max_batch_size=None):
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        # match id -> pending writes; a match has a leader while it has a queue
+        self._queues = {}
+        # SQLite has a single writer per database, batches of different matches take turns
+        self._sqlite_write_lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'writes': 0, 'batches': 0}
+
+    def _settings(self):
+        batch_window = self.batch_window
+        if batch_window is None:
+            batch_window = getattr(settings, 'MATCH_WRITE_BATCH_WINDOW', 0.002)
+        max_batch_size = self.max_batch_size
+        if max_batch_size is None:
+            max_batch_size = getattr(settings, 'MATCH_WRITE_MAX_BATCH_SIZE', 50)
+        return batch_window, max_batch_size
+
+    def submit(self, match_id, func):
+        """
+        Run func as a write to the given match and return its result
+
+        Blocks until the batch func ended up in is committed. Exceptions raised by
+        func, or by the commit, are re-raised in the calling thread.
+        """
+        if getattr(self._local, 'in_batch', False):
+            # Already running inside a batch (e.g. one write calling another)
+            return func()
+
+        write = _Write(func)
+        with self._lock:
+            leader = match_id not in self._queues
+            self._queues.setdefault(match_id, []).append(write)
+
+        if leader:
+            self._lead(match_id)
+        while not write.finished:
+            write.wake.wait()
+            write.wake.clear()
+            if write.promoted and not write.finished:
+                write.promoted = False
+                self._lead(match_id)
+
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _lead(self, match_id):
+        """Collect the pending writes of a match, run them, then hand over to the next waiting write"""
+        batch_window, max_batch_size = self._settings()
+        if batch_window:
+            time.sleep(batch_window)
+
+        with self._lock:
+            queue = self._queues[match_id]
+            writes = queue[:max_batch_size]
+            del queue[:len(writes)]
+
+        try:
+            self._run_batch(writes)
+        finally:
+            with self._lock:
+                if queue:
+                    queue[0].promoted = True
+                    queue[0].wake.set()
+                else:
+                    del self._queues[match_id]
+
+    def _run_batch(self, writes):
+        write_lock = self._sqlite_write_lock if connection.vendor == 'sqlite' else nullcontext()
+        self._local.in_batch = True
+        try:
+            with write_lock:
+                try:
+                    with transaction.atomic():
+                        for write in writes:
+                            try:
+                                # A failing write only rolls back its own savepoint
+                                with transaction.atomic():
+                                    write.result = write.func()
+                            except Exception as exc:
+                                write.error = exc
+                except Exception as exc:
+                    # The commit failed, none of the writes were stored
+                    for write in writes:
+                        if write.error is None:
+                            write.result = None
+                            write.error = exc
+        finally:
+            self._local.in_batch = False
+            with self._lock:
+                self.stats['writes'] += len(writes)
+                self.stats['batches'] += 1
+            for write in writes:
+                write.finished = True
+                write.wake.set()
+
+
+write_coordinator = MatchWriteCoordinator()
+
+
+def serialize_match_writes(view_func):
+    """
+    Decorator running a biro mutation endpoint through the per-match write coordinator
+
+    The endpoint must take a match_id argument.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return write_coordinator.submit(
+            kwargs['match_id'], lambda: view_func(request, *args, **kwargs)
+        )
+
+    return wrapper
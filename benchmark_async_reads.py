@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the sync and async versions of the public read endpoints under concurrency
+
+Each endpoint's data is built the way it is served under ASGI:
+- sync:  the sync version wrapped in sync_to_async, which is how Django runs a sync view
+         under ASGI (all sync views share one thread)
+- async: the async version, on the event loop with the async ORM
+
+Only reads, so it can run against the development database:
+    python benchmark_async_reads.py --requests 200 --concurrency 20
+    python benchmark_async_reads.py --token <JWT>   # also biro_auth vs async_biro_auth and /biro/my-matches
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import django
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'focibackend.settings')
+django.setup()
+
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory
+
+from api.auth import biro_auth, async_biro_auth
+from api.public_reads import (
+    get_tournament_matches, aget_tournament_matches,
+    get_tournament_teams, aget_tournament_teams,
+    get_tournament_top_scorers, aget_tournament_top_scorers,
+    get_assigned_matches, aget_assigned_matches,
+)
+from api.utils import process_matches, aprocess_matches, get_latest_tournament, aget_latest_tournament
+
+
+def endpoints():
+    """name -> (sync callable, async callable), both taking no arguments"""
+    def sync_reader(build):
+        return lambda: build(get_latest_tournament())
+
+    def async_reader(build):
+        async def read():
+            return await build(await aget_latest_tournament())
+        return read
+
+    return {
+        '/standings': (sync_reader(process_matches), async_reader(aprocess_matches)),
+        '/matches': (sync_reader(get_tournament_matches), async_reader(aget_tournament_matches)),
+        '/teams': (sync_reader(get_tournament_teams), async_reader(aget_tournament_teams)),
+        '/topscorers': (sync_reader(get_tournament_top_scorers), async_reader(aget_tournament_top_scorers)),
+    }
+
+
+async def run(call, requests, concurrency):
+    """Run call `requests` times, at most `concurrency` at once; returns (requests per second, latencies)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started), latencies
+
+
+def report(name, mode, throughput, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<17} {mode:<6} {throughput:>9.1f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:>8.2f} ms   p95 {p95 * 1000:>8.2f} ms")
+
+
+async def benchmark(requests, concurrency, token):
+    cases = endpoints()
+    if token:
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        cases['biro_auth'] = (lambda: biro_auth(request), lambda: async_biro_auth(request))
+
+        async def async_my_matches():
+            return await aget_assigned_matches((await async_biro_auth(request)).profile)
+        cases['/biro/my-matches'] = (lambda: get_assigned_matches(biro_auth(request).profile), async_my_matches)
+
+    print(f"{requests} requests, concurrency {concurrency}\n")
+    for name, (sync_call, async_call) in cases.items():
+        # Warm up caches and connections, so neither mode pays for the first request
+        await sync_to_async(sync_call)()
+        await async_call()
+
+        report(name, 'sync', *await run(sync_to_async(sync_call), requests, concurrency))
+        report(name, 'async', *await run(async_call, requests, concurrency))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--token', help='JWT of a referee, to benchmark the auth classes and /biro/my-matches too')
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.requests, args.concurrency, args.token))
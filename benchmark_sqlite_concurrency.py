@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Read throughput of the public endpoints while referee writes are in flight,
+with SQLite's default pragmas and with the tuned ones from settings.SQLITE_PRAGMAS
+
+Each configuration runs in its own process on a fresh temporary database:
+reader threads build /standings and /matches in a loop while writer threads
+keep adding events to the matches, the way referee devices do during a round.
+
+    python benchmark_sqlite_concurrency.py --seconds 10 --readers 8 --writers 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# SQLite's own defaults, as used before the connection-init pragmas
+DEFAULT_PRAGMAS = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_BUSY_TIMEOUT_MS': '5000',  # sqlite3.connect's default timeout
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_MMAP_SIZE': '0',
+    'SQLITE_CACHE_SIZE': '-2000',
+    'SQLITE_TRANSACTION_MODE': 'DEFERRED',
+    'DB_CONN_MAX_AGE': '0',
+}
+
+
+def create_fixture():
+    from datetime import datetime
+    from api.models import Tournament, Round, Team, Player, Match, Event
+
+    tournament = Tournament.objects.create(name='Benchmark', start_date=datetime.now().date())
+    round_obj = Round.objects.create(tournament=tournament, number=1)
+    teams = []
+    for index in range(8):
+        team = Team.objects.create(tournament=tournament, start_year=2020 + index // 4, tagozat='ABCD'[index % 4])
+        team.players.add(*[Player.objects.create(name=f'Player {index}-{number}') for number in range(10)])
+        teams.append(team)
+
+    matches = []
+    for first in range(len(teams)):
+        for second in range(first + 1, len(teams)):
+            match = Match.objects.create(
+                tournament=tournament, round_obj=round_obj, datetime=datetime.now(),
+                team1=teams[first], team2=teams[second]
+            )
+            Event.objects.create(match=match, event_type='match_start', half=1, minute=1)
+            matches.append(match)
+    return matches
+
+
+def run_worker(seconds, readers, writers):
+    """Runs in the child process, prints the results as JSON"""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'focibackend.settings')
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from api.models import Event
+    from api.public_reads import get_tournament_matches
+    from api.utils import process_matches, get_latest_tournament
+
+    call_command('migrate', verbosity=0)
+    matches = create_fixture()
+    connection.close()
+
+    counts = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def reader():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                tournament = get_latest_tournament()
+                process_matches(tournament)
+                get_tournament_matches(tournament)
+            except Exception:
+                with lock:
+                    counts['read_errors'] += 1
+                continue
+            with lock:
+                counts['reads'] += 1
+                latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    def writer(offset):
+        index = offset
+        while time.monotonic() < deadline:
+            match = matches[index % len(matches)]
+            index += writers
+            try:
+                with transaction.atomic():
+                    player = match.team1.players.first()
+                    Event.objects.create(match=match, event_type='goal', half=1, minute=10, player=player)
+            except Exception:
+                with lock:
+                    counts['write_errors'] += 1
+                continue
+            with lock:
+                counts['writes'] += 1
+            time.sleep(0.005)  # Referee devices do not write back to back
+        connection.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(offset,)) for offset in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    counts['p95_ms'] = round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2) if latencies else None
+    print(json.dumps(counts))
+
+
+def run_configuration(name, env_overrides, args):
+    with tempfile.TemporaryDirectory() as directory:
+        # Tuned runs use the defaults of settings.SQLITE_PRAGMAS, not the pragmas of this environment
+        env = {key: value for key, value in os.environ.items() if key not in DEFAULT_PRAGMAS}
+        env.update(env_overrides, SQLITE_PATH=os.path.join(directory, 'benchmark.sqlite3'))
+        output = subprocess.run(
+            [sys.executable, __file__, '--worker', '--seconds', str(args.seconds),
+             '--readers', str(args.readers), '--writers', str(args.writers)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    print(f"{name:<8} reads {result['reads'] / args.seconds:>8.1f}/s (p95 {result['p95_ms']} ms, "
+          f"{result['read_errors']} errors)   writes {result['writes'] / args.seconds:>7.1f}/s "
+          f"({result['write_errors']} errors)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.seconds, args.readers, args.writers)
+    else:
+        print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g} s each\n")
+        run_configuration('default', DEFAULT_PRAGMAS, args)
+        run_configuration('tuned', {}, args)
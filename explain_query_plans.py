@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN QUERY PLAN of the queries behind the hot endpoints, without and with the
+indexes of migration 0020_hot_query_indexes
+
+Runs on a temporary database filled with a small tournament, so the development
+database is left alone. Every endpoint is called once to record its queries;
+then each query's plan is printed with the indexes dropped ("before") and
+recreated ("after"). The database is not ANALYZEd: without statistics SQLite
+plans as if the tables were large, which is the case the indexes are for.
+
+    python explain_query_plans.py
+    python explain_query_plans.py /api/standings /api/biro/my-matches   # only these endpoints
+"""
+import atexit
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import django
+
+# Set up Django environment on a throwaway database
+database_directory = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, database_directory, ignore_errors=True)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'focibackend.settings')
+os.environ['SQLITE_PATH'] = os.path.join(database_directory, 'explain.sqlite3')
+django.setup()
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+
+from api.auth import JWTAuth
+from api.models import Profile, Match, Kozlemeny, Szankcio
+from benchmark_sqlite_concurrency import create_fixture
+
+ENDPOINTS = [
+    '/api/standings',
+    '/api/matches',
+    '/api/topscorers',
+    '/api/goals',
+    '/api/rounds/1/matches',
+    '/api/profiles/{referee_id}/matches',
+    '/api/sanctions',
+    '/api/teams/{team_id}/sanctions',
+    '/api/kozlemenyek/active',
+    '/api/kozlemenyek/priority/high',
+    '/api/biro/my-matches',
+    '/api/biro/live-matches',
+    '/api/biro/dashboard',
+]
+
+
+def setup_data():
+    call_command('migrate', verbosity=0)
+    matches = create_fixture()
+
+    user = User.objects.create_user('explain', password='explain', is_staff=True)
+    referee = Profile.objects.create(user=user, biro=True)
+    Match.objects.filter(id__in=[match.id for match in matches[::2]]).update(referee=referee)
+    Match.objects.filter(id=matches[1].id).update(status='cancelled_no_date')
+    team = matches[0].team1
+    Szankcio.objects.create(team=team, tournament=team.tournament, minus_points=1, reason='Benchmark')
+    for priority in ('low', 'normal', 'high'):
+        Kozlemeny.objects.create(title=priority, content='', priority=priority, author=referee)
+
+    token = JWTAuth.encode_token(user.id, user.username, JWTAuth.role_claims(user))
+    return Client(HTTP_AUTHORIZATION=f'Bearer {token}'), {'referee_id': referee.id, 'team_id': team.id}
+
+
+def record_queries(client, path):
+    """(sql, params) of every query the endpoint runs"""
+    queries = []
+
+    def recorder(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(recorder):
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response.status_code, queries
+
+
+def migration_indexes():
+    """(model, index) pairs added by the index migration"""
+    migration = importlib.import_module('api.migrations.0020_hot_query_indexes').Migration
+    return [
+        (apps.get_model('api', operation.model_name), operation.index)
+        for operation in migration.operations
+    ]
+
+
+def set_indexes(present):
+    with connection.schema_editor() as editor:
+        for model, index in migration_indexes():
+            if present:
+                editor.add_index(model, index)
+            else:
+                editor.remove_index(model, index)
+
+
+def query_plan(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def main(paths):
+    client, ids = setup_data()
+
+    recorded = []
+    for path in paths:
+        path = path.format(**ids)
+        status, queries = record_queries(client, path)
+        # Transaction statements and repeated queries have nothing new to show
+        seen = set()
+        selects = []
+        for sql, params in queries:
+            if sql.lstrip().upper().startswith('SELECT') and sql not in seen:
+                seen.add(sql)
+                selects.append((sql, params))
+        recorded.append((path, status, selects))
+
+    plans = {}
+    for state, present in (('before', False), ('after', True)):
+        set_indexes(present)
+        for path, status, selects in recorded:
+            for sql, params in selects:
+                plans[(state, sql)] = query_plan(sql, params)
+
+    for path, status, selects in recorded:
+        print(f"\n{'=' * 100}\n{path} ({status}, {len(selects)} distinct queries)")
+        for sql, params in selects:
+            print(f"\n  {sql[:300]}{'...' if len(sql) > 300 else ''}")
+            for state in ('before', 'after'):
+                print(f"    {state}:")
+                for line in plans[(state, sql)]:
+                    print(f"      {line}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ENDPOINTS)
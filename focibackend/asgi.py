@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'focibackend.settings')
+# Persistent database connections are WSGI only (see CONN_MAX_AGE in settings)
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
+
+# Answer referee time sync requests before the middleware stack
+from api.timesync import asgi_time_sync  # noqa: E402
+
+application = asgi_time_sync(application)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -63,6 +64,8 @@ CORS_ALLOWED_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
+    'if-match',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -86,6 +89,66 @@ CSRF_TRUSTED_ORIGINS = [
     'http://127.0.0.1:8000',
 ]
 
+# How long (in seconds) a referee write's Idempotency-Key is remembered for retries,
+# and how long a claim without a stored response blocks retries (the original request may have died)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_CLAIM_LEASE = 60
+
+# Printable jegyzőkönyv rendering: worker processes for round exports and cache lifetime (in seconds)
+JEGYZOKONYV_RENDER_WORKERS = 4
+JEGYZOKONYV_RENDER_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# How long (in seconds) the referee dashboard, shared by all referees, is served from cache
+REFEREE_DASHBOARD_CACHE_TTL = 10
+
+# How long (in seconds) a match's player id -> team index is cached, team membership changes drop it earlier.
+# With a per-process cache the other workers never see the drop, so the index expires after the local timeout
+MATCH_ROSTER_CACHE_TIMEOUT = 24 * 60 * 60
+MATCH_ROSTER_LOCAL_CACHE_TIMEOUT = 30
+
+# Referee writes to a match arriving within this many seconds are committed in one transaction
+MATCH_WRITE_BATCH_WINDOW = 0.002
+MATCH_WRITE_MAX_BATCH_SIZE = 50
+
+# Verified JWT cache: largest number of tokens kept and how long (in seconds) an entry is trusted
+AUTH_TOKEN_CACHE_SIZE = 1024
+AUTH_TOKEN_CACHE_TTL = 60
+
+# How often (in seconds) the in-memory token generation table is reloaded, i.e. how long a role change takes to apply
+AUTH_TOKEN_GENERATION_REFRESH = 5
+
+# Token lifetimes (in seconds): short-lived access tokens, refresh tokens rotated at /api/auth/refresh
+JWT_ACCESS_TOKEN_LIFETIME = 15 * 60
+JWT_REFRESH_TOKEN_LIFETIME = 7 * 24 * 60 * 60
+
+# How often (in seconds) new token revocations are picked up from the database
+AUTH_REVOCATION_REFRESH = 5
+
+# Login throttling (checked before the password is hashed), per client IP and per username + client IP:
+# burst size and refill per minute
+LOGIN_THROTTLE_ENABLED = True
+LOGIN_THROTTLE_CACHE = 'default'  # Shared between workers when it is a shared backend (Redis, Memcached)
+LOGIN_THROTTLE_IP_BURST = 30  # Schools share an IP, so the IP bucket is larger than the username one
+LOGIN_THROTTLE_IP_PER_MINUTE = 30
+LOGIN_THROTTLE_USERNAME_BURST = 5
+LOGIN_THROTTLE_USERNAME_PER_MINUTE = 5
+LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR = False  # Only enable behind a reverse proxy that sets the header
+
+# Auth tracing: decode/verify outcome counters, latency and sampled log records on the 'api.auth' logger
+AUTH_TRACE_ENABLED = False
+AUTH_TRACE_SAMPLE_RATE = 0.01  # Share of traced calls that also emit a log record
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.auth': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 # Exempt API endpoints from CSRF protection since we're using JWT
 CSRF_EXEMPT_URLS = [
     r'^/api/',
@@ -115,10 +178,40 @@ WSGI_APPLICATION = 'focibackend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite tuning, run on every new connection; each value can be overridden from the environment
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),  # Readers no longer block the writer and vice versa
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),  # Wait this long (ms) for a lock instead of failing
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),  # Durable with WAL, fsyncs only at checkpoints
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # Bytes of the file read through mmap
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),  # Page cache per connection, negative means KiB
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Keep connections (and their page cache) between requests. Only under WSGI:
+        # ASGI requests run in varying threads, so persistent connections are not
+        # reused there and just pile up (asgi.py sets SERVER_INTERFACE=asgi)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if os.environ.get('SERVER_INTERFACE') == 'asgi' else 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock when a transaction starts, so busy_timeout applies instead of
+            # failing with "database is locked" when a read transaction tries to become a write
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+        },
+    }
+}
+
+# Cache shared by the worker processes, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and CACHE_LOCATION=redis://127.0.0.1:6379. The default LocMemCache is per process: a deletion
+# only reaches the process that made it (see MATCH_ROSTER_LOCAL_CACHE_TIMEOUT)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
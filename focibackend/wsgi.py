@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'focibackend.settings')
 
 application = get_wsgi_application()
+
+# Answer referee time sync requests before the middleware stack
+from api.timesync import wsgi_time_sync  # noqa: E402
+
+application = wsgi_time_sync(application)